@@ -1,7 +1,12 @@
+import os
+import sys
 import vtk
 from collections import defaultdict
 import random
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'visualisation_app', 'backend', 'scripts'))
+from network import read_edge_list
+
 
 def read_positions(file_path):
     """Read neuron positions from the given file."""
@@ -35,20 +40,12 @@ def read_positions(file_path):
 
 
 def read_network_connections(file_path):
-    """Read network connections (either in or out) from the given file."""
-    connections = []
-    try:
-        with open(file_path, 'r') as file:
-            for line in file:
-                if line.startswith('#') or not line.strip():
-                    continue
-                data = line.strip().split()
-                source_id = int(data[1])
-                target_id = int(data[3])
-                connections.append((source_id, target_id))
-    except FileNotFoundError:
-        print(f"File {file_path} not found.")
+    """Read network connections (either in or out) from the given file, using the binary edge cache."""
+    edges = read_edge_list(file_path)
+    if edges is None:
         return None
+    source_ids, target_ids, _ = edges
+    connections = list(zip(source_ids.tolist(), target_ids.tolist()))
     return connections
 
 
@@ -1,112 +1,56 @@
 import pandas as pd
 import os
-from tqdm import tqdm  
+import sys
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'visualisation_app', 'backend', 'scripts'))
+from monitors import snapshot_frame
+from network import degree_snapshot, load_degree_series
+from registry import NeuronRegistry
 
 
-def read_csv_safely(file_path):
-    """
-    Reads a CSV file with predefined column names and adds a global step column.
-    Attempts to convert certain columns to numeric, coercing errors.
-    """
-    column_names = [
-        "step", "fired", "fired_fraction", "activity", "dampening", 
-        "current_calcium", "target_calcium", "synaptic_input", 
-        "background_input", "grown_axons", "connected_axons", 
-        "grown_dendrites", "connected_dendrites"
-    ]
 
-    try:
-        df = pd.read_csv(file_path, delimiter=';', header=None, names=column_names, engine='python')
-        df['step'] = pd.to_numeric(df['step'], errors='coerce')
-        # Convert the growth and connection columns to numeric
-        numeric_cols = ["fired_fraction", "current_calcium", "target_calcium", "synaptic_input",
-                        "background_input", "grown_axons", "connected_axons", "grown_dendrites", "connected_dendrites"]
-        for col in numeric_cols:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
-
-        # Drop rows that have NaN in critical columns if needed
-        # (e.g. grown_axons and grown_dendrites must be numeric)
-        df = df.dropna(subset=["grown_axons", "grown_dendrites"])
-
-        df['global_step'] = df.index * 100
-        return df
-    except Exception as e:
-        print(f"Error reading file {file_path}: {e}")
-        return None
-
-def parse_positions_file(positions_file):
+def extract_neuron_properties(data_dir, target_step, registry, degrees=None):
     """
-    Parses the positions file to map neuron IDs to their corresponding areas.
+    Extracts calcium, growth, and connectivity properties for each neuron at the target step.
+    With a precomputed degree series (network.py degrees), the real in/out degree of each
+    neuron in the network snapshot is added.
+    Only one row per neuron is read. Neurons with non-numeric growth values are skipped.
     """
-    neuron_area_map = {}
-    with open(positions_file, "r") as file:
-        for line in file:
-            if line.startswith("#") or not line.strip():
-                continue
-            parts = line.split()
-            neuron_id = parts[0]  # Local ID
-            area = parts[4]       # Area
-            neuron_area_map[neuron_id] = area
-    return neuron_area_map
-
+    columns = ["current_calcium", "fired_fraction", "grown_axons", "connected_axons",
+               "grown_dendrites", "connected_dendrites"]
+    step_data = snapshot_frame(data_dir, target_step, registry, columns)
 
+    # Check if the columns needed are numeric
+    invalid = step_data['grown_axons'].isna() | step_data['grown_dendrites'].isna()
+    if invalid.any():
+        print(f"Invalid numeric data for {int(invalid.sum())} neurons at global_step {target_step}, skipping.")
+        step_data = step_data[~invalid]
 
-
-def extract_neuron_properties(data_dir, target_step, neuron_area_map):
-    """
-    Extracts calcium, growth, and connectivity properties for each neuron, with a progress bar.
-    Handles non-numeric values by skipping those neurons.
-    """
-    records = []
-
-    for neuron_id, area in tqdm(neuron_area_map.items(), desc="Processing Neurons", unit="neuron"):
-        file_path = os.path.join(data_dir, f"0_{neuron_id}.csv")
-        if not os.path.exists(file_path):
-            print(f"File not found: {file_path}")
-            continue
-
-        df = read_csv_safely(file_path)
-        if df is None or df.empty:
-            print(f"No data found in file for Neuron {neuron_id}")
-            continue
-
-        # Filter for the target global step
-        step_data = df[df['global_step'] == target_step]
-
-        if step_data.empty:
-            print(f"No data for Neuron {neuron_id} at global_step {target_step}")
-            continue
-
-        # Extract the row for the target step
-        row = step_data.iloc[0]
-
-        # Check if the columns needed are numeric
-        if pd.isna(row['grown_axons']) or pd.isna(row['grown_dendrites']):
-            print(f"Invalid numeric data for Neuron {neuron_id} at global_step {target_step}, skipping.")
-            continue
-
-        records.append({
-            'Area': int(area.split('_')[1]),
-            'Neuron_ID': neuron_id,
-            'Global Step': target_step,
-            'Calcium': row['current_calcium'],
-            'Firing Rate': row['fired_fraction'],
-            'Grown Axons': row['grown_axons'],
-            'Connected Axons': row['connected_axons'],
-            'Grown Dendrites': row['grown_dendrites'],
-            'Connected Dendrites': row['connected_dendrites'],
-            'Total Growth': float(row['grown_axons']) + float(row['grown_dendrites']),
-            'Total Connections': float(row['connected_axons']) + float(row['connected_dendrites'])
-        })
-
-    if not records:
+    if step_data.empty:
         print("No data found for the specified global step.")
-    return pd.DataFrame(records)
+        return pd.DataFrame()
+
+    neuron_df = pd.DataFrame({
+        'Area': step_data['Area'].str.split('_').str[1].astype(int),
+        'Neuron_ID': step_data['Neuron_ID'],
+        'Global Step': target_step,
+        'Calcium': step_data['current_calcium'],
+        'Firing Rate': step_data['fired_fraction'],
+        'Grown Axons': step_data['grown_axons'],
+        'Connected Axons': step_data['connected_axons'],
+        'Grown Dendrites': step_data['grown_dendrites'],
+        'Connected Dendrites': step_data['connected_dendrites'],
+        'Total Growth': step_data['grown_axons'] + step_data['grown_dendrites'],
+        'Total Connections': step_data['connected_axons'] + step_data['connected_dendrites']
+    }).reset_index(drop=True)
 
+    if degrees is not None and target_step in degrees['steps']:
+        neuron_df['Out Degree'] = degree_snapshot(degrees, target_step, neuron_df['Neuron_ID'], 'out_degree')
+        neuron_df['In Degree'] = degree_snapshot(degrees, target_step, neuron_df['Neuron_ID'], 'in_degree')
+    return neuron_df
 
 
 
@@ -126,6 +70,7 @@ def plot_combined_parallel_and_box(neuron_df, target_step, simulation, output_di
 
     # Select only numeric columns for averaging
     numeric_columns = ['Calcium', 'Firing Rate', 'Grown Axons', 'Grown Dendrites']
+    numeric_columns += [col for col in ('Out Degree', 'In Degree') if col in neuron_df]
     avg_df = neuron_df.groupby('Area', as_index=False)[numeric_columns].mean()
 
     # Create the box plot
@@ -283,15 +228,17 @@ def plot_combined_parallel_and_box(neuron_df, target_step, simulation, output_di
 target_step = 0
 simulation = 'stimulus'
 data_dir = f'/Volumes/Extreme SSD/SciVis Project 2023/SciVisContest23/viz-{simulation}/monitors'
-positions_file = f'/Volumes/Extreme SSD/SciVis Project 2023/SciVisContest23/viz-{simulation}/positions/rank_0_positions.txt'
+simulation_path = f'/Volumes/Extreme SSD/SciVis Project 2023/SciVisContest23/viz-{simulation}'
 
 # Change to your desired global step
 
-# Parse positions file to create neuron-to-area mapping
-neuron_area_map = parse_positions_file(positions_file)
+# Load the neuron registry (cached after the first parse of the positions)
+registry = NeuronRegistry.load(simulation_path)
+# Real network degrees, if precomputed with "network.py degrees"
+degrees = load_degree_series(simulation_path, build=False)
 
 # Extract neuron properties as a DataFrame
-neuron_df = extract_neuron_properties(data_dir, target_step, neuron_area_map)
+neuron_df = extract_neuron_properties(data_dir, target_step, registry, degrees)
 print(neuron_df.head(), neuron_df.tail())
 plot_combined_parallel_and_box(neuron_df, target_step,simulation)
 
@@ -1,103 +1,29 @@
 import os
+import sys
 import pandas as pd
 import numpy as np
-from tqdm import tqdm
 import plotly.graph_objects as go
-from collections import defaultdict
 
-def parse_positions_file(positions_file):
-    """
-    Parses the positions file to map neuron IDs to their corresponding areas.
-    """
-    neuron_area_map = {}
-    with open(positions_file, "r") as file:
-        for line in file:
-            if line.startswith("#") or not line.strip():
-                continue
-            parts = line.split()
-            neuron_id = parts[0]  # Local neuron ID
-            area = parts[4]       # e.g., "area_8"
-            neuron_area_map[neuron_id] = area
-    return neuron_area_map
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'visualisation_app', 'backend', 'scripts'))
+from network import load_connectivity_tensor, area_totals
 
-def parse_network_file(network_file, neuron_area_map):
-    """
-    Parses the network_out file and returns a dictionary mapping each area (int)
-    to its total number of connections at this time step.
-
-    For each connection:
-    - Extract the two areas involved.
-    - Increment the connection count for both areas by 1.
-
-    Returns:
-       area_connection_counts: dict {area_int: connection_count}
-    """
-    if not os.path.exists(network_file):
-        return None
-
-    def area_key(a):
-        # Convert 'area_x' to an integer x
-        return int(a.split('_')[1]) if '_' in a and a.split('_')[1].isdigit() else a
-
-    area_connection_counts = defaultdict(int)
-
-    with open(network_file, "r") as f:
-        for line in f:
-            if line.startswith("#") or not line.strip():
-                continue
-            parts = line.split()
-            target_id = parts[1]  # Target neuron ID
-            source_id = parts[3]  # Source neuron ID
-
-            target_area = neuron_area_map.get(target_id)
-            source_area = neuron_area_map.get(source_id)
-
-            if target_area and source_area:
-                a1 = area_key(source_area)
-                a2 = area_key(target_area)
-                # Each connection increments both involved areas
-                area_connection_counts[a1] += 1
-                area_connection_counts[a2] += 1
-
-    return area_connection_counts
 
 # ----------------------------------------------------
 # Main execution
 # ----------------------------------------------------
 simulation = 'calcium'  # Adjust if needed
-positions_file = f'/Users/joanacostaesilva/Desktop/Scientific Visualization and Virtual Reality /Project SVVR/viz-{simulation}/positions/rank_0_positions.txt'
-neuron_area_map = parse_positions_file(positions_file)
-
-# Determine the time steps to process
-time_steps = range(0, 1000001, 10000)  # Adjust as needed
-
-# We'll track all areas as we discover them at time steps
-all_areas = set()
-
-# First pass: identify all areas
-for area_name in neuron_area_map.values():
-    # Convert area_x to int
-    area_id = int(area_name.split('_')[1])
-    all_areas.add(area_id)
-
-# Initialize a dictionary to store time-series data for all areas
-results_all_areas = {area: [] for area in all_areas}
-timesteps_used = []
-
-for t in tqdm(time_steps, desc="Processing Time Steps"):
-    network_file = f'/Users/joanacostaesilva/Desktop/Scientific Visualization and Virtual Reality /Project SVVR/viz-{simulation}/network/rank_0_step_{t}_out_network.txt'
-    area_connection_counts = parse_network_file(network_file, neuron_area_map)
-
-    if area_connection_counts is None:
-        # If the file doesn't exist or can't be parsed, skip this timestep
-        continue
-
-    # Record results for all areas. If an area isn't present in area_connection_counts,
-    # it means no connections were found for that area this step, so we record 0.
-    for area in all_areas:
-        results_all_areas[area].append(area_connection_counts.get(area, 0))
-
-    timesteps_used.append(t)
+simulation_path = f'/Users/joanacostaesilva/Desktop/Scientific Visualization and Virtual Reality /Project SVVR/viz-{simulation}'
+
+# Load the area x area x time connectivity tensor (built from the network files on first use)
+tensor = load_connectivity_tensor(simulation_path)
+
+# Total connections per area at every time step: each connection counts for both of its areas
+totals = area_totals(tensor["directed"])
+results_all_areas = {
+    int(area_name.split('_')[1]): totals[:, i].tolist()
+    for i, area_name in enumerate(tensor["areas"])
+}
+timesteps_used = tensor["steps"].tolist()
 
 # ----------------------------------------------------
 # Plotting
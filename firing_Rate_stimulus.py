@@ -1,72 +1,29 @@
 import pandas as pd
 import os
+import sys
 from tqdm import tqdm  
 import plotly.graph_objects as go
 import numpy as np
 
-def read_csv_safely(file_path):
-    """
-    Reads a CSV file with predefined column names and adds a global step column.
-    """
-    column_names = [
-        "step", "fired", "fired_fraction", "activity", "dampening", 
-        "current_calcium", "target_calcium", "synaptic_input", 
-        "background_input", "grown_axons", "connected_axons", 
-        "grown_dendrites", "connected_dendrites"
-    ]
-
-    try:
-        df = pd.read_csv(file_path, delimiter=';', header=None, names=column_names, engine='python')
-        df['step'] = df['step'].astype(int)
-        df['global_step'] = df.index * 100
-        return df
-    except Exception as e:
-        print(f"Error reading file {file_path}: {e}")
-        return None
-
-def parse_positions_file(positions_file):
-    """
-    Parses the positions file to map neuron IDs to their corresponding areas.
-    """
-    neuron_area_map = {}
-    with open(positions_file, "r") as file:
-        for line in file:
-            if line.startswith("#") or not line.strip():
-                continue
-            parts = line.split()
-            neuron_id = parts[0]  # Local ID
-            area = parts[4]       # Area (e.g., "area_8")
-            neuron_area_map[neuron_id] = area
-    return neuron_area_map
-
-def extract_neuron_properties(data_dir, target_step, neuron_area_map):
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'visualisation_app', 'backend', 'scripts'))
+from monitors import snapshot_frame
+from registry import NeuronRegistry
+
+def extract_neuron_properties(data_dir, target_step, registry):
     """
     Extracts firing rate and activity properties for each neuron at the given global step.
     """
-    records = []
-    for neuron_id, area in neuron_area_map.items():
-        file_path = os.path.join(data_dir, f"0_{neuron_id}.csv")
-        if not os.path.exists(file_path):
-            continue
-
-        df = read_csv_safely(file_path)
-        if df is None or df.empty:
-            continue
-
-        step_data = df[df['global_step'] == target_step]
-        if step_data.empty:
-            continue
-
-        row = step_data.iloc[0]
-        records.append({
-            'Area': int(area.split('_')[1]),
-            'Neuron_ID': neuron_id,
-            'Global Step': target_step,
-            'Activity': row['activity'],
-            'Firing Rate': row['fired_fraction']
-        })
-
-    return pd.DataFrame(records)
+    step_data = snapshot_frame(data_dir, target_step, registry, ["activity", "fired_fraction"])
+    if step_data.empty:
+        return pd.DataFrame()
+
+    return pd.DataFrame({
+        'Area': step_data['Area'].str.split('_').str[1].astype(int),
+        'Neuron_ID': step_data['Neuron_ID'],
+        'Global Step': target_step,
+        'Activity': step_data['activity'],
+        'Firing Rate': step_data['fired_fraction']
+    })
 
 def plot_firing_rate_activity_over_time(results, simulation, output_dir="plots"):
     """
@@ -123,8 +80,8 @@ def plot_firing_rate_activity_over_time(results, simulation, output_dir="plots")
 # Main execution
 simulation = 'stimulus'
 data_dir = f'/Users/joanacostaesilva/Desktop/Scientific Visualization and Virtual Reality /Project SVVR/viz-{simulation}/monitors_test'
-positions_file = f'/Users/joanacostaesilva/Desktop/Scientific Visualization and Virtual Reality /Project SVVR/viz-{simulation}/positions/rank_0_positions.txt'
-neuron_area_map = parse_positions_file(positions_file)
+simulation_path = f'/Users/joanacostaesilva/Desktop/Scientific Visualization and Virtual Reality /Project SVVR/viz-{simulation}'
+registry = NeuronRegistry.load(simulation_path)
 
 # Define the time steps you want to iterate over (adjust as needed)
 time_steps = range(0, 1000001, 100000)  # e.g., from 0 to 1,000,000 in steps of 10,000
@@ -138,7 +95,7 @@ activity_results = {area: [] for area in target_areas}
 valid_time_steps = []
 
 for t in tqdm(time_steps, desc="Processing Time Steps"):
-    neuron_df = extract_neuron_properties(data_dir, t, neuron_area_map)
+    neuron_df = extract_neuron_properties(data_dir, t, registry)
     if neuron_df.empty:
         # No data at this time step, append NaNs or skip
         # For clarity, let's append NaN to keep array lengths consistent
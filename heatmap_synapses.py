@@ -1,73 +1,30 @@
+import os
+import sys
 import pandas as pd
 import numpy as np
 import matplotlib.colors as mcolors
 import plotly.graph_objects as go
-from tqdm import tqdm
 
-def parse_positions_file(positions_file):
-    """
-    Parses the positions file to map neuron IDs to their corresponding areas.
-    """
-    neuron_area_map = {}
-    with open(positions_file, "r") as file:
-        for line in file:
-            if line.startswith("#") or not line.strip():
-                continue
-            parts = line.split()
-            neuron_id = parts[0]  # Local neuron ID
-            area = parts[4]       # Area name
-            neuron_area_map[neuron_id] = area
-    return neuron_area_map
-
-def parse_network_file(network_file, neuron_area_map):
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'visualisation_app', 'backend', 'scripts'))
+from network import symmetric_counts
+from connectivity import load_adjacency, area_indicator, area_matrix
+from registry import NeuronRegistry
+
+def area_connections_at(simulation_path, time_step, registry):
     """
-    Parses the network_out file to count the number of connections between areas.
+    Counts the number of connections between areas in the network_out snapshot of all
+    ranks, as the sparse product of the neuron connectivity with the area indicator.
     This version makes the connection matrix symmetrical.
     """
-    from collections import defaultdict
-    area_connections = defaultdict(int)
-
-    with open(network_file, "r") as f:
-        for line in tqdm(f, desc="Parsing network file", unit="line"):
-            if line.startswith("#") or not line.strip():
-                continue
-            parts = line.split()
-            target_id = parts[1]  # Extract target neuron ID directly
-            source_id = parts[3]  # Extract source neuron ID directly
-
-            if target_id not in neuron_area_map:
-                print(f"Warning: Target neuron ID {target_id} is not in the area map.")
-            if source_id not in neuron_area_map:
-                print(f"Warning: Source neuron ID {source_id} is not in the area map.")
-
-            target_area = neuron_area_map.get(target_id)
-            source_area = neuron_area_map.get(source_id)
-
-            if target_area and source_area:
-                # Create a key that doesn't depend on direction
-                def area_key(a):
-                    return int(a.split('_')[1]) if '_' in a and a.split('_')[1].isdigit() else a
-
-                if area_key(source_area) < area_key(target_area):
-                    key = (source_area, target_area)
-                else:
-                    key = (target_area, source_area)
-                area_connections[key] += 1
-
-    # Sort the areas
-    areas = sorted(
-        set(neuron_area_map.values()),
-        key=lambda x: int(x.split('_')[1]) if '_' in x and x.split('_')[1].isdigit() else x
-    )
-
-    connection_matrix = pd.DataFrame(0, index=areas, columns=areas, dtype=int)
+    adjacency = load_adjacency(simulation_path, time_step, registry=registry)
+    if adjacency is None:
+        return None
+    counts = area_matrix(adjacency, area_indicator(registry))
+    areas = registry.areas
 
     # Fill the matrix symmetrically
-    for (a1, a2), count in area_connections.items():
-        connection_matrix.loc[a1, a2] = count
-        connection_matrix.loc[a2, a1] = count
+    return pd.DataFrame(symmetric_counts(counts), index=areas, columns=areas)
 
-    return connection_matrix
 
 
 
@@ -172,11 +129,10 @@ def plot_correlation_matrix_ordered(connection_matrix, time_step, simulation, ou
 # Main execution
 time_step = 0
 simulation = 'no-network'
-positions_file = f'/Users/joanacostaesilva/Desktop/Scientific Visualization and Virtual Reality /Project SVVR/viz-{simulation}/positions/rank_0_positions.txt'
-network_file = f'/Users/joanacostaesilva/Desktop/Scientific Visualization and Virtual Reality /Project SVVR/viz-{simulation}/network/rank_0_step_{time_step}_out_network.txt'
+simulation_path = f'/Users/joanacostaesilva/Desktop/Scientific Visualization and Virtual Reality /Project SVVR/viz-{simulation}'
 
-neuron_area_map = parse_positions_file(positions_file)
-connection_matrix = parse_network_file(network_file, neuron_area_map)
+registry = NeuronRegistry.load(simulation_path)
+connection_matrix = area_connections_at(simulation_path, time_step, registry)
 output_file = f"correlation_matrix_{simulation}_timestep_{time_step}.html"
 
 plot_correlation_matrix_ordered(connection_matrix, time_step, simulation, output_file)
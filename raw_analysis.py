@@ -1,34 +1,17 @@
 import plotly.graph_objects as go
 import plotly.subplots as sp
-import numpy as np
-
-def read_neurons_with_std(file_path):
-    steps = []
-    calcium_avg, calcium_std = [], []
-    axons_avg, axons_std = [], []
-    axons_c_avg, axons_c_std = [], []
-    den_ex_avg, den_ex_std = [], []
-    try:
-        with open(file_path, 'r') as file:
-            for line in file:
-                if line.startswith('#') or not line.strip():
-                    continue
-                data = line.strip().split()
-                steps.append(int(data[0]))
-                calcium_avg.append(float(data[1]))
-                calcium_std.append(float(data[5]))
-                axons_avg.append(float(data[6]))
-                axons_std.append(float(data[10]))
-                axons_c_avg.append(float(data[11]))
-                axons_c_std.append(float(data[15]))
-                den_ex_avg.append(float(data[16]))
-                den_ex_std.append(float(data[20]))
-    except FileNotFoundError:
-        print(f"File {file_path} not found.")
-        return None, None, None, None, None, None, None, None, None
-    return steps, calcium_avg, calcium_std, axons_avg, axons_std, axons_c_avg, axons_c_std, den_ex_avg, den_ex_std
-
-def plot_neuron_properties(neurons_data, output_file):
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'visualisation_app', 'backend', 'scripts'))
+from ranks import read_overview
+
+def plot_neuron_properties(neurons_data, output_file, band="std"):
+    """
+    Plots the average of four overview properties per simulation, with a band of
+    average +- std (band="std") or from minimum to maximum (band="range").
+    neurons_data maps a simulation label to its read_overview table.
+    """
     # Vibrant colors contrasting with dark background
     colors = {
         'no-network': 'rgba(0, 255, 255, 1)',  # Cyan
@@ -58,6 +41,12 @@ def plot_neuron_properties(neurons_data, output_file):
         "Connected Axons": (2, 1),
         "Dendrites": (2, 2)
     }
+    metric_properties = {
+        "Calcium": "calcium",
+        "Axons": "axons",
+        "Connected Axons": "connected_axons",
+        "Dendrites": "excitatory_dendrites"
+    }
 
     simulations = list(neurons_data.keys())
 
@@ -66,30 +55,29 @@ def plot_neuron_properties(neurons_data, output_file):
 
         for i, sim in enumerate(simulations):
             data = neurons_data[sim]
-            if data[0] is None:
+            if data is None:
                 continue
 
-            steps, calcium_avg, calcium_std, axons_avg, axons_std, axons_c_avg, axons_c_std, den_ex_avg, den_ex_std = data
-            avg, std = (
-                (calcium_avg, calcium_std) if metric == "Calcium" else
-                (axons_avg, axons_std) if metric == "Axons" else
-                (axons_c_avg, axons_c_std) if metric == "Connected Axons" else
-                (den_ex_avg, den_ex_std)
-            )
+            prop = metric_properties[metric]
+            steps = data["step"].tolist()
+            avg = data[f"{prop}_average"].to_numpy()
+            if band == "range":
+                lower, upper = data[f"{prop}_minimum"].to_numpy(), data[f"{prop}_maximum"].to_numpy()
+            else:
+                std = data[f"{prop}_std"].to_numpy()
+                lower, upper = avg - std, avg + std
 
             fig.add_trace(go.Scatter(
-                x=steps, y=avg, mode='lines',
+                x=steps, y=avg.tolist(), mode='lines',
                 line=dict(color=colors[sim], width=3),
                 legendgroup=sim,
                 name=sim if metric == "Calcium" else None,
                 showlegend=(metric == "Calcium")  
             ), row=row, col=col)
 
-            upper = (np.array(avg) + np.array(std)).tolist()
-            lower = (np.array(avg) - np.array(std)).tolist()
             fig.add_trace(go.Scatter(
                 x=steps + steps[::-1],
-                y=upper + lower[::-1],
+                y=upper.tolist() + lower[::-1].tolist(),
                 fill='toself',
                 fillcolor=colors[sim].replace("1)", "0.2)"),
                 line=dict(width=0),
@@ -138,7 +126,6 @@ simulations = {
 }
 neurons_data = {}
 for label, path in simulations.items():
-    neurons_file = f"{path}rank_0_neurons_overview.txt"
-    neurons_data[label] = read_neurons_with_std(neurons_file)
+    neurons_data[label] = read_overview(path)
 
 plot_neuron_properties(neurons_data, "neuron_properties_overview.html")
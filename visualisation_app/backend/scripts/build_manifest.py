@@ -0,0 +1,153 @@
+import hashlib
+import json
+import os
+from functools import lru_cache
+
+# Every output directory keeps a .build_manifest.json recording, per output file, the
+# fingerprints of the inputs it was built from and the version (code + config digest)
+# that built it. An output is rebuilt only when one of those changed or it is missing.
+
+BUILD_MANIFEST_NAME = ".build_manifest.json"
+HASH_CHUNK = 1 << 20
+
+
+def build_manifest_path(output_dir):
+    """The manifest of an output directory: <output_dir>/.build_manifest.json."""
+    return os.path.join(output_dir, BUILD_MANIFEST_NAME)
+
+
+def load_build_manifest(output_dir):
+    """Reads the manifest of output_dir; an empty one if it is missing or unreadable."""
+    manifest_file = build_manifest_path(output_dir)
+    if os.path.exists(manifest_file):
+        try:
+            with open(manifest_file, 'r') as f:
+                manifest = json.load(f)
+            if isinstance(manifest.get("outputs"), dict):
+                return manifest
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Ignoring unreadable build manifest {manifest_file}: {e}")
+    return {"outputs": {}}
+
+
+def save_build_manifest(output_dir, manifest):
+    """Writes the manifest of output_dir; failures only print a warning."""
+    manifest_file = build_manifest_path(output_dir)
+    tmp_file = manifest_file + ".tmp"
+    try:
+        os.makedirs(output_dir, exist_ok=True)
+        with open(tmp_file, 'w') as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp_file, manifest_file)
+    except OSError as e:
+        print(f"Could not write build manifest {manifest_file}: {e}")
+
+
+@lru_cache(maxsize=4096)
+def _file_digest(path, size, mtime_ns):
+    """blake2b digest of a file's content, memoized on its (path, size, mtime)."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def fingerprint(path, content_hash=False, previous=None):
+    """
+    Fingerprint of an input: size and mtime, plus a content digest with content_hash
+    (reused from the previous fingerprint while size and mtime match). A directory is
+    fingerprinted by its file count, total size and newest mtime of its direct entries;
+    hidden entries (the .edge_cache, .csr_cache, ... sidecars) are left out.
+    None if the path does not exist.
+    """
+    if not os.path.exists(path):
+        return None
+    if os.path.isdir(path):
+        stat = os.stat(path)
+        files, size, mtime_ns = 0, 0, stat.st_mtime_ns
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.name.startswith('.'):
+                    continue
+                entry_stat = entry.stat()
+                files += 1
+                size += entry_stat.st_size
+                mtime_ns = max(mtime_ns, entry_stat.st_mtime_ns)
+        return {"files": files, "size": size, "mtime_ns": mtime_ns}
+
+    stat = os.stat(path)
+    result = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    if content_hash:
+        if previous and "digest" in previous and all(previous.get(k) == result[k] for k in ("size", "mtime_ns")):
+            result["digest"] = previous["digest"]
+        else:
+            result["digest"] = _file_digest(path, stat.st_size, stat.st_mtime_ns)
+    return result
+
+
+def same_fingerprint(recorded, current):
+    """Inputs are unchanged if their digests match, or without digests their size and mtime."""
+    if recorded is None or current is None:
+        return recorded is current
+    if "digest" in recorded and "digest" in current:
+        return recorded["digest"] == current["digest"]
+    return all(recorded.get(k) == current.get(k) for k in ("files", "size", "mtime_ns"))
+
+
+def recorded_inputs(manifest):
+    """The most recent fingerprint of every input named in the manifest, to reuse digests."""
+    known = {}
+    for record in manifest["outputs"].values():
+        known.update(record.get("inputs", {}))
+    return known
+
+
+def input_fingerprints(inputs, content_hash=False, manifest=None):
+    """{absolute path: fingerprint} of the inputs (see fingerprint); missing inputs map to None."""
+    known = recorded_inputs(manifest) if manifest is not None and content_hash else {}
+    fingerprints = {}
+    for path in inputs:
+        path = os.path.abspath(path)
+        fingerprints[path] = fingerprint(path, content_hash, known.get(path))
+    return fingerprints
+
+
+def code_version(source_files, config=None):
+    """
+    Digest of the source files that produce an output and of the config that shapes
+    it (any JSON-serialisable value), so changing either rebuilds the output.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for source_file in source_files:
+        with open(source_file, 'rb') as f:
+            digest.update(f.read())
+    digest.update(json.dumps(config, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+def output_key(output_dir, output_file):
+    return os.path.relpath(os.path.abspath(output_file), os.path.abspath(output_dir))
+
+
+def is_stale(manifest, output_dir, output_file, fingerprints, version):
+    """
+    True if output_file must be rebuilt: it is missing or changed since it was
+    recorded, it was built by another version, or its inputs differ.
+    """
+    record = manifest["outputs"].get(output_key(output_dir, output_file))
+    if record is None or record.get("version") != version:
+        return True
+    if not same_fingerprint(record.get("output"), fingerprint(output_file)):
+        return True
+    inputs = record.get("inputs", {})
+    return (set(inputs) != set(fingerprints) or
+            not all(same_fingerprint(inputs[path], fp) for path, fp in fingerprints.items()))
+
+
+def record_build(manifest, output_dir, output_file, fingerprints, version, info=None):
+    """Records that output_file was built from the fingerprinted inputs by version (plus optional info)."""
+    record = {"version": version, "inputs": fingerprints, "output": fingerprint(output_file)}
+    if info is not None:
+        record["info"] = info
+    manifest["outputs"][output_key(output_dir, output_file)] = record
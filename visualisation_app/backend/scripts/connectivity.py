@@ -0,0 +1,158 @@
+import os
+
+import numpy as np
+import scipy.sparse as sp
+
+from network import NETWORK_STEPS, network_file_path, read_global_edges, snapshot_archive_path
+from ranks import discover_ranks
+from registry import NeuronRegistry
+
+ADJACENCY_CACHE_VERSION = 1
+
+
+def adjacency_cache_path(simulation_path, step, direction='out'):
+    """Sparse matrix cache of a snapshot: <sim>/network/.csr_cache/step_<t>_<direction>.npz."""
+    return os.path.join(simulation_path, "network", ".csr_cache", f"step_{step}_{direction}.npz")
+
+
+def adjacency_cache_key(simulation_path, step, direction, num_neurons):
+    """Cache version, step and neuron count, then the size and mtime of every file the snapshot is read from."""
+    sources = [network_file_path(simulation_path, step, direction, rank)
+               for rank in discover_ranks(simulation_path) or [0]]
+    sources.append(snapshot_archive_path(simulation_path, direction))
+    key = [ADJACENCY_CACHE_VERSION, step, num_neurons]
+    for source in sources:
+        if os.path.exists(source):
+            stat = os.stat(source)
+            key += [stat.st_size, stat.st_mtime_ns]
+    return np.array(key, dtype=np.int64)
+
+
+def adjacency_matrix(source_ids, target_ids, weights, registry):
+    """
+    Neuron x neuron CSR matrix of one snapshot, indexed [source row, target row] in
+    registry order, holding the summed edge weights. Edges to unknown neurons are dropped.
+    """
+    source_rows, target_rows = registry.rows(source_ids), registry.rows(target_ids)
+    known = (source_rows >= 0) & (target_rows >= 0)
+    if not known.all():
+        print(f"Warning: {int((~known).sum())} connections reference neuron IDs that are not in the registry.")
+    n = len(registry)
+    matrix = sp.coo_matrix((np.asarray(weights, dtype=np.float32)[known],
+                            (source_rows[known], target_rows[known])), shape=(n, n))
+    return matrix.tocsr()  # duplicate entries are summed
+
+
+def load_adjacency(simulation_path, step, direction='out', registry=None, use_cache=True):
+    """
+    Loads the <direction> snapshot at step as a CSR matrix (see adjacency_matrix),
+    from its cache when that matches the network files, else from the edge files
+    (or the snapshot archive) of all ranks, writing the cache. Returns None if missing.
+    """
+    if registry is None:
+        registry = NeuronRegistry.load(simulation_path)
+    if registry is None:
+        return None
+    cache_file = adjacency_cache_path(simulation_path, step, direction)
+    key = adjacency_cache_key(simulation_path, step, direction, len(registry))
+
+    if use_cache and os.path.exists(cache_file):
+        try:
+            with np.load(cache_file) as cached:
+                if np.array_equal(cached["key"], key):
+                    return sp.csr_matrix((cached["data"], cached["indices"], cached["indptr"]),
+                                         shape=tuple(cached["shape"]))
+        except Exception as e:
+            print(f"Ignoring unreadable adjacency cache {cache_file}: {e}")
+
+    edges = read_global_edges(simulation_path, step, direction, registry.offsets)
+    if edges is None:
+        return None
+    matrix = adjacency_matrix(*edges, registry)
+
+    if use_cache:
+        tmp_file = cache_file + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            with open(tmp_file, 'wb') as f:
+                np.savez(f, key=key, data=matrix.data, indices=matrix.indices, indptr=matrix.indptr,
+                         shape=np.array(matrix.shape, dtype=np.int64))
+            os.replace(tmp_file, cache_file)
+        except OSError as e:
+            print(f"Could not write adjacency cache {cache_file}: {e}")
+    return matrix
+
+
+def area_indicator(registry):
+    """Sparse neurons x areas matrix P with P[i, a] = 1 if neuron row i is in area a."""
+    n = len(registry)
+    return sp.csr_matrix((np.ones(n), (np.arange(n), registry.area_index.astype(np.int64))),
+                         shape=(n, len(registry.areas)))
+
+
+def area_matrix(adjacency, indicator, weighted=False):
+    """
+    Area x area connections as the sparse product Pᵀ·A·P, indexed [source area, target area].
+    Counts connections unless weighted, in which case the edge weights are summed.
+    """
+    if not weighted:
+        adjacency = adjacency.copy()
+        adjacency.data = np.ones_like(adjacency.data)
+    counts = (indicator.T @ adjacency @ indicator).toarray()
+    return counts if weighted else counts.astype(np.int64)
+
+
+def out_degrees(adjacency, weighted=False):
+    """Outgoing connections (or summed weights) of every neuron row."""
+    if weighted:
+        return np.asarray(adjacency.sum(axis=1)).ravel()
+    return np.diff(adjacency.tocsr().indptr)
+
+
+def in_degrees(adjacency, weighted=False):
+    """Incoming connections (or summed weights) of every neuron row."""
+    if weighted:
+        return np.asarray(adjacency.sum(axis=0)).ravel()
+    return np.diff(adjacency.tocsc().indptr)
+
+
+def postsynaptic(adjacency, registry, neuron_id):
+    """(neuron ids, weights) of the neurons neuron_id projects to."""
+    row = registry.rows([neuron_id])[0]
+    if row < 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    adjacency = adjacency.tocsr()
+    span = slice(adjacency.indptr[row], adjacency.indptr[row + 1])
+    return registry.ids[adjacency.indices[span]], adjacency.data[span]
+
+
+def presynaptic(adjacency, registry, neuron_id):
+    """(neuron ids, weights) of the neurons projecting to neuron_id."""
+    return postsynaptic(adjacency.T, registry, neuron_id)
+
+
+def area_degree_distribution(adjacency, registry, area, direction='out'):
+    """Degrees (direction 'out' or 'in') of the neurons of one area, as (neuron ids, degrees)."""
+    degrees = out_degrees(adjacency) if direction == 'out' else in_degrees(adjacency)
+    members = registry.area_index == registry.areas.index(area)
+    return registry.ids[members], degrees[members]
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Cache the network snapshots of simulations as sparse matrices.")
+    parser.add_argument('simulations', nargs='+', help='Simulation directories (viz-<name>)')
+    parser.add_argument('--direction', choices=['out', 'in'], default='out', help='Snapshot direction (default: out)')
+    args = parser.parse_args()
+
+    for simulation_path in args.simulations:
+        registry = NeuronRegistry.load(simulation_path)
+        if registry is None:
+            continue
+        cached = sum(load_adjacency(simulation_path, t, args.direction, registry) is not None
+                     for t in NETWORK_STEPS)
+        print(f"Cached {cached} {args.direction} snapshots of {simulation_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+import argparse
+import json
+import os
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from build_manifest import (code_version, input_fingerprints, is_stale, load_build_manifest, output_key,
+                            record_build, save_build_manifest)
+from monitors import (MONITOR_COLUMNS, ROW_STEP, default_store_dir, list_monitor_files, load_monitor_block,
+                      stream_area_stats, area_labels, file_order_areas, group_stats)
+from registry import NeuronRegistry
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CONFIG = os.path.join(SCRIPTS_DIR, 'simulations.json')
+# Source files whose code shapes the JSON artefacts, part of their build version
+EXPORT_SOURCES = ["export_area_data.py", "monitors.py"]
+
+
+def load_simulation_config(config_file=DEFAULT_CONFIG):
+    """
+    Reads the simulation config: monitor and output paths per simulation, the series
+    of its data JSON and its metadata (disabled areas, stimulation periods).
+    Returns None if the file cannot be read.
+    """
+    try:
+        with open(config_file, 'r') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Error loading simulation config {config_file}: {e}")
+        return None
+
+
+def load_area_registry(area_info_file):
+    """
+    Neuron registry of area-info.txt (or a positions file), restricted to the
+    'area_<n>' areas. Returns None if the file cannot be read.
+    """
+    registry = NeuronRegistry.load(area_info_file)
+    if registry is None:
+        return None
+    return registry.select_areas(lambda area: area.startswith('area_'))
+
+
+def rounded(values):
+    """Values rounded to 4 decimal places, NaN as None."""
+    return [None if np.isnan(v) else round(float(v), 4) for v in values]
+
+
+def in_file_order(area_ids, stats, neuron_indices, registry):
+    """Reorders the areas (and the rows of every statistic) as the original exporters listed them."""
+    position = {area_id: k for k, area_id in enumerate(area_ids)}
+    order = [position[area_id] for area_id in file_order_areas(neuron_indices, registry) if area_id in position]
+    return [area_ids[k] for k in order], {name: values[order] for name, values in stats.items()}
+
+
+def scan_simulation(monitors_dir, registry, step_size, streaming=False, workers=1):
+    """
+    Reads every monitor column of a simulation once (every step_size-th step) and
+    reduces it to per-area statistics. Returns (timesteps, area_ids, stats) or None.
+    Values are parsed as float64 from the CSVs and areas keep the order of the original
+    exporters (see monitors.file_order_areas), so their JSON output is unchanged.
+    With streaming, neurons are folded into running accumulators one at a time
+    (split over workers processes) instead of loading the block; no quantiles then.
+    """
+    if streaming:
+        result = stream_area_stats(monitors_dir, registry, row_stride=step_size // ROW_STEP,
+                                   workers=workers, dtype=np.float64)
+        if result is None:
+            return None
+        area_ids, stats = in_file_order(*result, list_monitor_files(monitors_dir)[0], registry)
+        timesteps = [r * step_size for r in range(stats["mean"].shape[1])]
+        return timesteps, area_ids, stats
+
+    neuron_indices, block, total_rows = load_monitor_block(monitors_dir, row_stride=step_size // ROW_STEP,
+                                                           dtype=np.float64)
+    if block is None:
+        return None
+    print(f"Loaded {len(neuron_indices)} CSV files from {monitors_dir}")
+
+    labels, area_ids = area_labels(neuron_indices, registry)
+    stats = group_stats(block, labels, len(area_ids))
+    area_ids, stats = in_file_order(area_ids, stats, neuron_indices, registry)
+
+    max_timestep = (total_rows - 1) * ROW_STEP  # -1 because we start at 0
+    timesteps = list(range(0, max_timestep + 1, step_size))
+    return timesteps, area_ids, stats
+
+
+def build_area_data(timesteps, area_ids, stats, sim_config):
+    """
+    The <simulation>_data.json structure the viewer reads: the configured series of
+    per-area mean levels, target calcium and neuron count, plus the simulation metadata.
+    """
+    metadata = sim_config.get("metadata", {})
+    column = {name: i for i, name in enumerate(MONITOR_COLUMNS)}
+
+    data = {"timesteps": [round(float(t), 4) for t in timesteps], "areas": {}}
+    data.update(metadata)
+    for k, area_id in enumerate(area_ids):
+        entry = {key: rounded(stats["mean"][k, :, column[name]])
+                 for key, name in sim_config.get("series", {}).items()}
+        entry["target_calcium"] = round(float(stats["mean"][k, 0, column["target_calcium"]]), 4)
+        entry["neuron_count"] = int(stats["count"][k])
+        if "disabled_areas" in metadata:
+            entry["is_disabled"] = area_id in metadata["disabled_areas"]
+        data["areas"][area_id] = entry
+    return data
+
+
+def build_area_stats(timesteps, area_ids, stats):
+    """All per-area statistics of every monitor column, as {area: {column: {statistic: series}}}."""
+    statistics = [name for name in stats if name != "count"]
+    areas = {}
+    for k, area_id in enumerate(area_ids):
+        areas[area_id] = {"neuron_count": int(stats["count"][k])}
+        for j, name in enumerate(MONITOR_COLUMNS):
+            areas[area_id][name] = {stat: rounded(stats[stat][k, :, j]) for stat in statistics}
+    return {
+        "timesteps": timesteps,
+        "columns": MONITOR_COLUMNS,
+        "statistics": statistics,
+        "areas": areas,
+    }
+
+
+PYRAMID_LEVELS = [100, 1000, 10000]
+PYRAMID_COLUMNS = ["current_calcium", "activity", "fired_fraction"]
+
+
+def downsample(series, bucket_size):
+    """
+    Min, mean and max of every bucket_size consecutive values along the last axis,
+    stacked as (..., buckets, 3). The last bucket may be partial.
+    """
+    num_buckets = -(-series.shape[-1] // bucket_size)
+    padded = np.full(series.shape[:-1] + (num_buckets * bucket_size,), np.nan)
+    padded[..., :series.shape[-1]] = series
+    buckets = padded.reshape(series.shape[:-1] + (num_buckets, bucket_size))
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)  # all-NaN buckets stay NaN
+        return np.stack([np.nanmin(buckets, axis=-1), np.nanmean(buckets, axis=-1),
+                         np.nanmax(buckets, axis=-1)], axis=-1)
+
+
+def pyramid_files(output_dir, columns, levels=PYRAMID_LEVELS):
+    """Paths of the pyramid/<column>_<level>.bin files of the levels that are multiples of ROW_STEP."""
+    return {(level, column): os.path.join(output_dir, "pyramid", f"{column}_{level}.bin")
+            for level in levels if level % ROW_STEP == 0 for column in columns}
+
+
+def write_area_pyramid(output_dir, area_ids, means, columns, levels=PYRAMID_LEVELS):
+    """
+    Writes the per-area time series as a multi-resolution pyramid under <output_dir>/pyramid.
+    Every level (bucket width in steps) and column gets one raw little-endian float32
+    file of shape (areas x buckets x [min, mean, max]); bucket b covers steps
+    [b * level, (b + 1) * level). pyramid/index.json describes the files.
+    Returns the paths of the index and of every level file written.
+    """
+    pyramid_dir = os.path.join(output_dir, "pyramid")
+    os.makedirs(pyramid_dir, exist_ok=True)
+
+    index = {
+        "areas": area_ids,
+        "columns": columns,
+        "statistics": ["min", "mean", "max"],
+        "dtype": "float32",
+        "byte_order": "little",
+        "layout": "areas x buckets x statistics",
+        "levels": [],
+    }
+    level_files = pyramid_files(output_dir, columns, levels)
+    for level in levels:
+        if level % ROW_STEP:
+            print(f"Skipping pyramid level {level}: not a multiple of {ROW_STEP} steps")
+            continue
+        files = {}
+        for j, column in enumerate(columns):
+            data = downsample(means[:, :, j], level // ROW_STEP).astype('<f4')
+            data.tofile(level_files[level, column])
+            files[column] = f"pyramid/{os.path.basename(level_files[level, column])}"
+        index["levels"].append({"step": level, "buckets": int(data.shape[1]), "files": files})
+
+    index_file = os.path.join(pyramid_dir, "index.json")
+    with open(index_file, 'w') as f:
+        json.dump(index, f, indent=2)
+    return [index_file] + list(level_files.values())
+
+
+def simulation_outputs(sim_config, pyramid=None):
+    """The files export_simulation writes for a simulation."""
+    output_dir = sim_config["output_dir"]
+    outputs = [os.path.join(output_dir, "area_stats.json")]
+    if sim_config.get("json_file"):
+        outputs.append(os.path.join(output_dir, sim_config["json_file"]))
+    if pyramid is not None:
+        outputs.append(os.path.join(output_dir, "pyramid", "index.json"))
+        outputs += pyramid_files(output_dir, pyramid.get("columns", PYRAMID_COLUMNS),
+                                 pyramid.get("levels", PYRAMID_LEVELS)).values()
+    return outputs
+
+
+def export_simulation(name, sim_config, registry, step_size=10000, pyramid=None,
+                      streaming=False, workers=1, force=False):
+    """
+    Scans one simulation and writes all of its JSON artefacts: area_stats.json and,
+    if the config names one, its data JSON. With a pyramid config ({'columns', 'levels'})
+    a second, streaming pass at full resolution writes the downsampling pyramid.
+    streaming and workers are passed on to scan_simulation and the pyramid pass.
+    Nothing is rescanned if the build manifest of the output directory records all
+    artefacts as built from the current monitors, neurons, config and code (unless force).
+    Returns a summary dict, or None on failure.
+    """
+    monitors_dir = sim_config["monitors"]
+    if not os.path.exists(monitors_dir):
+        print(f"Input directory does not exist: {monitors_dir}")
+        return None
+
+    output_dir = sim_config["output_dir"]
+    outputs = simulation_outputs(sim_config, pyramid)
+    manifest = load_build_manifest(output_dir)
+    fingerprints = input_fingerprints([monitors_dir, os.path.join(default_store_dir(monitors_dir), "manifest.json")])
+    version = code_version([os.path.join(SCRIPTS_DIR, source) for source in EXPORT_SOURCES], {
+        "simulation": sim_config, "step_size": step_size, "pyramid": pyramid, "streaming": streaming,
+        "neurons": registry.digest(),
+    })
+    record = manifest["outputs"].get(output_key(output_dir, outputs[0]), {})
+    if not force and "info" in record and not any(
+            is_stale(manifest, output_dir, output_file, fingerprints, version) for output_file in outputs):
+        print(f"{name} is up to date: {', '.join(outputs)}")
+        return dict(record["info"], files=outputs, seconds=0.0, skipped=True)
+
+    start = time.perf_counter()
+    print(f"Scanning {name}: {monitors_dir}")
+    scan = scan_simulation(monitors_dir, registry, step_size, streaming, workers)
+    if scan is None:
+        print(f"No CSV files found for {name}!")
+        return None
+    timesteps, area_ids, stats = scan
+
+    os.makedirs(output_dir, exist_ok=True)
+    written = []
+
+    stats_file = os.path.join(output_dir, "area_stats.json")
+    with open(stats_file, 'w') as f:
+        json.dump(build_area_stats(timesteps, area_ids, stats), f)
+    written.append(stats_file)
+
+    if sim_config.get("json_file"):
+        data_file = os.path.join(output_dir, sim_config["json_file"])
+        with open(data_file, 'w') as f:
+            json.dump(build_area_data(timesteps, area_ids, stats, sim_config), f)
+        written.append(data_file)
+
+    if pyramid is not None:
+        columns = pyramid.get("columns", PYRAMID_COLUMNS)
+        series = stream_area_stats(monitors_dir, registry, columns, workers=workers)
+        if series is not None:
+            written.extend(write_area_pyramid(output_dir, series[0], series[1]["mean"], columns,
+                                              pyramid.get("levels", PYRAMID_LEVELS)))
+
+    info = {
+        "simulation": name,
+        "areas": len(area_ids),
+        "neurons": int(stats["count"].sum()),
+        "timesteps": len(timesteps),
+    }
+    for output_file in written:
+        record_build(manifest, output_dir, output_file, fingerprints, version, info)
+    save_build_manifest(output_dir, manifest)
+    return dict(info, files=written, seconds=time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compute per-area statistics of all monitor columns and write the JSON artefacts, one scan per simulation."
+    )
+    parser.add_argument('--config', default=DEFAULT_CONFIG, help='Simulation config (default: simulations.json)')
+    parser.add_argument('--sim', nargs='+', help='Simulations to process (default: all in the config)')
+    parser.add_argument('--workers', type=int, default=4,
+                        help='Simulations processed concurrently; with a single simulation, processes sharing its neurons')
+    parser.add_argument('--streaming', action='store_true',
+                        help='Aggregate with running accumulators in O(areas x timesteps) memory (no quantiles)')
+    parser.add_argument('--pyramid', action='store_true',
+                        help='Also write the full-resolution downsampling pyramid of the per-area time series')
+    parser.add_argument('--force', action='store_true',
+                        help='Rescan simulations whose artefacts are up to date')
+    args = parser.parse_args()
+
+    config = load_simulation_config(args.config)
+    if config is None:
+        return
+    simulations = config["simulations"]
+    names = args.sim or list(simulations)
+    unknown = [name for name in names if name not in simulations]
+    if unknown:
+        print(f"Unknown simulation(s): {unknown}. Available: {list(simulations)}")
+        return
+
+    registry = load_area_registry(config["area_info"])
+    if registry is None:
+        return
+
+    step_size = config.get("step_size", 10000)
+    pyramid = config.get("pyramid", {}) if args.pyramid else None
+    summaries = []
+    if len(names) == 1:
+        # A single simulation spreads its neurons over the workers instead
+        summary = export_simulation(names[0], simulations[names[0]], registry, step_size, pyramid,
+                                    args.streaming, args.workers, args.force)
+        summaries = [summary] if summary is not None else []
+    else:
+        with ProcessPoolExecutor(max_workers=max(1, min(args.workers, len(names)))) as pool:
+            futures = [pool.submit(export_simulation, name, simulations[name], registry, step_size,
+                                   pyramid, args.streaming, force=args.force) for name in names]
+            for future in as_completed(futures):
+                summary = future.result()
+                if summary is not None:
+                    summaries.append(summary)
+                    print(f"Finished {summary['simulation']} in {summary['seconds']:.1f}s")
+
+    print("\nProcessing complete!")
+    for summary in sorted(summaries, key=lambda s: names.index(s["simulation"])):
+        print(f"{summary['simulation']}: {summary['areas']} areas, {summary['neurons']} neurons, "
+              f"{summary['timesteps']} timesteps -> {', '.join(summary['files'])}"
+              f"{' (up to date)' if summary.get('skipped') else ''}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,186 +1,92 @@
 import vtk
-from collections import defaultdict
+import numpy as np
 import random
 import os
 
+from network import read_global_edges
+from registry import NeuronRegistry
+from vtp import cells_from_array, data_array, export_to_vtp, points_from_array
 
-def read_positions(file_path):
-    """Read neuron positions from the given file."""
-    points = vtk.vtkPoints()
-    areas = set()
-    area_to_id = {}
-    point_areas = []
-    try:
-        with open(file_path, 'r') as file:
-            for line in file:
-                if line.startswith('#') or not line.strip():
-                    continue
-                data = line.strip().split()
-                local_id = int(data[0])
-                x, y, z = float(data[1]), float(data[2]), float(data[3])
-                area = data[4]  # Assuming the area is in the 5th column
-                if not area.startswith('area_'):
-                    continue
-                points.InsertNextPoint(x, y, z)
-                areas.add(area)
-                point_areas.append(area)  # Store the original area name
-    except FileNotFoundError:
-        print(f"File {file_path} not found.")
+
+def read_positions(simulation_path):
+    """
+    Read neuron positions of all ranks of a simulation from its neuron registry.
+    Returns (coordinates, area_ids, areas, registry): a float32 (N, 3) array, the index of each
+    neuron's area in areas, the area names sorted by their numeric part and the registry
+    of these neurons, to map neuron ids to areas.
+    """
+    registry = NeuronRegistry.load(simulation_path)
+    if registry is None:
         return None, None, None, None
 
-    # Sort the areas by their numeric part, then assign the IDs
-    sorted_areas = sorted(areas, key=lambda x: int(x.split('_')[1]))
-    area_to_id = {area: idx for idx, area in enumerate(sorted_areas)}
-
-    return points, areas, point_areas, area_to_id
-
-
-def read_network_connections(file_path):
-    """Read network connections (either in or out) from the given file."""
-    connections = []
-    try:
-        with open(file_path, 'r') as file:
-            for line in file:
-                if line.startswith('#') or not line.strip():
-                    continue
-                data = line.strip().split()
-                source_id = int(data[1])
-                target_id = int(data[3])
-                connections.append((source_id, target_id))
-    except FileNotFoundError:
-        print(f"File {file_path} not found.")
-        return None
-    return connections
+    # Only neurons in an 'area_<n>' area
+    registry = registry.select_areas(lambda area: area.startswith('area_'))
+    return registry.positions, registry.area_index.astype(np.int64), registry.areas, registry
+
 
+def read_network_connections(simulation_path, timestep, direction):
+    """
+    Read the network connections (either in or out) of all ranks at a timestep as
+    (source_ids, target_ids) arrays of global ids, using the binary edge cache.
+    """
+    edges = read_global_edges(simulation_path, timestep, direction)
+    if edges is None:
+        return None
+    source_ids, target_ids, _ = edges
+    return source_ids, target_ids
 
-def calculate_area_centroids(points, point_areas):
-    """Calculate centroids for each area."""
-    area_points = defaultdict(list)
-    for i in range(points.GetNumberOfPoints()):
-        x, y, z = points.GetPoint(i)
-        area_id = point_areas[i]
-        area_points[area_id].append((x, y, z))
 
-    centroids = {}
-    for area_id, area_points_list in area_points.items():
-        xs, ys, zs = zip(*area_points_list)
-        centroids[area_id] = (sum(xs) / len(xs), sum(ys) / len(ys), sum(zs) / len(zs))
-    return centroids
+def calculate_area_centroids(coordinates, area_ids, num_areas):
+    """Calculate the centroid of each area as a (num_areas, 3) array."""
+    counts = np.bincount(area_ids, minlength=num_areas).astype(np.float64)
+    sums = np.stack([np.bincount(area_ids, weights=coordinates[:, axis], minlength=num_areas)
+                     for axis in range(3)], axis=1)
+    return sums / np.maximum(counts, 1)[:, None]
 
 
-def create_neurons_polydata(points, point_areas, area_to_id, num_areas):
+def create_neurons_polydata(coordinates, area_ids, num_areas):
     """Create vtkPolyData for neurons with area-based colors."""
     polydata = vtk.vtkPolyData()
-    polydata.SetPoints(points)
-
-    # Create vertices (points)
-    vertices = vtk.vtkCellArray()
-    for i in range(points.GetNumberOfPoints()):
-        vertices.InsertNextCell(1)
-        vertices.InsertCellPoint(i)
-    
-    # Add vertices to polydata
-    polydata.SetVerts(vertices)
+    polydata.SetPoints(points_from_array(coordinates))
 
-    # Add area-based colors
-    colors = vtk.vtkUnsignedCharArray()
-    colors.SetName("Colors")
-    colors.SetNumberOfComponents(3)
-
-    # Create lookup table for area colors
-    lut = vtk.vtkLookupTable()
-    lut.SetNumberOfTableValues(num_areas)
-    lut.Build()
+    # One vertex cell per point
+    polydata.SetVerts(cells_from_array(np.arange(len(coordinates)), 1))
 
     # Assign random colors to each area
-    for i in range(num_areas):
-        lut.SetTableValue(i, random.random(), random.random(), random.random(), 1.0)
+    lut = np.array([[random.random(), random.random(), random.random()] for _ in range(num_areas)])
+    colors = (255 * lut + 0.5).astype(np.uint8)
 
     # Set colors for each point based on its area
-    for area_id in point_areas:
-        index = area_to_id[area_id]
-        rgb = lut.GetTableValue(index)
-        colors.InsertNextTuple3(int(255 * rgb[0]), int(255 * rgb[1]), int(255 * rgb[2]))
-
-    polydata.GetPointData().SetScalars(colors)
+    polydata.GetPointData().SetScalars(data_array(colors[area_ids], "Colors"))
+    polydata.GetPointData().AddArray(data_array(area_ids.astype(np.uint16), "AreaId"))
     return polydata
 
 
-def create_connections_polydata(area_centroids, in_connections, out_connections, point_areas):
+def connection_lines(connections, registry):
+    """Area endpoints of every connection between two neurons of the registry, as an (M, 2) array."""
+    source_areas, target_areas = (registry.area_of(ids) for ids in connections)
+    valid = (source_areas >= 0) & (target_areas >= 0)
+    return np.stack([source_areas[valid], target_areas[valid]], axis=1).astype(np.int64)
+
+
+def create_connections_polydata(area_centroids, in_connections, out_connections, registry):
     """Create vtkPolyData for area-level connections with separate in/out colors."""
-    points = vtk.vtkPoints()
-    lines = vtk.vtkCellArray()
-    
-    # Create array for connection types (0 for in, 1 for out)
-    connectionTypes = vtk.vtkUnsignedCharArray()
-    connectionTypes.SetName("ConnectionType")
-    connectionTypes.SetNumberOfComponents(1)
-    
-    # Map area IDs to point indices
-    area_id_to_point_id = {}
-    for area_id, centroid in area_centroids.items():
-        area_id_to_point_id[area_id] = points.InsertNextPoint(centroid)
-
-    # Process in connections
-    for source_id, target_id in in_connections:
-        if source_id < len(point_areas) and target_id < len(point_areas):
-            area1 = point_areas[source_id]
-            area2 = point_areas[target_id]
-            
-            # Create line
-            line = vtk.vtkLine()
-            line.GetPointIds().SetId(0, area_id_to_point_id[area1])
-            line.GetPointIds().SetId(1, area_id_to_point_id[area2])
-            lines.InsertNextCell(line)
-            
-            # Mark as in connection (0)
-            connectionTypes.InsertNextValue(0)
-
-    # Process out connections
-    for source_id, target_id in out_connections:
-        if source_id < len(point_areas) and target_id < len(point_areas):
-            area1 = point_areas[source_id]
-            area2 = point_areas[target_id]
-            
-            # Create line
-            line = vtk.vtkLine()
-            line.GetPointIds().SetId(0, area_id_to_point_id[area1])
-            line.GetPointIds().SetId(1, area_id_to_point_id[area2])
-            lines.InsertNextCell(line)
-            
-            # Mark as out connection (1)
-            connectionTypes.InsertNextValue(1)
-
-    # Create the polydata
+    in_lines = connection_lines(in_connections, registry)
+    out_lines = connection_lines(out_connections, registry)
+
     polydata = vtk.vtkPolyData()
-    polydata.SetPoints(points)
-    polydata.SetLines(lines)
-    
-    # Add the connection types to cell data
-    polydata.GetCellData().AddArray(connectionTypes)
+    polydata.SetPoints(points_from_array(area_centroids))
+    polydata.SetLines(cells_from_array(np.concatenate([in_lines, out_lines]), 2))
+
+    # Connection types: 0 for in, 1 for out
+    connection_types = np.concatenate([np.zeros(len(in_lines), dtype=np.uint8),
+                                       np.ones(len(out_lines), dtype=np.uint8)])
+    polydata.GetCellData().AddArray(data_array(connection_types, "ConnectionType"))
     polydata.GetCellData().SetActiveScalars('ConnectionType')
 
     return polydata
 
 
-def export_to_vtp(polydata, filename):
-    """Export polydata to VTP file with proper formatting."""
-    # Create the writer
-    writer = vtk.vtkXMLPolyDataWriter()
-    writer.SetFileName(filename)
-    writer.SetInputData(polydata)
-    
-    # Set data mode to ASCII for human-readable output
-    writer.SetDataModeToAscii()
-    
-    # Ensure all arrays are written
-    writer.SetEncodeAppendedData(0)
-    writer.SetCompressorTypeToNone()
-    
-    # Write the file
-    writer.Write()
-
-
 def main():
     # File paths
     base_path = '/Volumes/Extreme SSD/SciVis Project 2023/SciVisContest23/viz-no-network'
@@ -191,17 +97,16 @@ def main():
     os.makedirs(sim1_dir, exist_ok=True)
 
     # Read positions data (constant across timesteps)
-    positions_file = f'{base_path}/positions/rank_0_positions.txt'
-    points, areas, point_areas, area_to_id = read_positions(positions_file)
-    if points is None:
+    coordinates, area_ids, areas, registry = read_positions(base_path)
+    if coordinates is None:
         print("Unable to load positions data. Exiting.")
         return
 
     # Calculate area centroids (constant across timesteps)
-    area_centroids = calculate_area_centroids(points, point_areas)
+    area_centroids = calculate_area_centroids(coordinates, area_ids, len(areas))
 
     # Create neurons VTP (constant across timesteps)
-    neurons_polydata = create_neurons_polydata(points, point_areas, area_to_id, len(areas))
+    neurons_polydata = create_neurons_polydata(coordinates, area_ids, len(areas))
     export_to_vtp(neurons_polydata, os.path.join(sim1_dir, 'neurons.vtp'))
 
     # Process each timestep
@@ -209,11 +114,8 @@ def main():
         print(f"Processing timestep {timestep}...")
         
         # Read network connections for this timestep
-        in_network_file = f'{base_path}/network/rank_0_step_{timestep}_in_network.txt'
-        out_network_file = f'{base_path}/network/rank_0_step_{timestep}_out_network.txt'
-        
-        in_connections = read_network_connections(in_network_file)
-        out_connections = read_network_connections(out_network_file)
+        in_connections = read_network_connections(base_path, timestep, 'in')
+        out_connections = read_network_connections(base_path, timestep, 'out')
         
         if in_connections is None or out_connections is None:
             print(f"Skipping timestep {timestep} due to missing network data.")
@@ -221,7 +123,7 @@ def main():
 
         # Create and export connections VTP for this timestep
         connections_polydata = create_connections_polydata(
-            area_centroids, in_connections, out_connections, point_areas
+            area_centroids, in_connections, out_connections, registry
         )
         connections_filename = os.path.join(sim1_dir, f'connections_{timestep:07d}.vtp')
         export_to_vtp(connections_polydata, connections_filename)
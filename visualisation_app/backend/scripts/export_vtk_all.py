@@ -1,115 +1,54 @@
 import vtk
+import numpy as np
 from collections import defaultdict
-import random
 import os
-import math
-
-
-def read_positions(file_path):
-    """Read neuron positions from the given file."""
-    points = vtk.vtkPoints()
-    areas = set()
-    area_to_id = {}
-    point_areas = []
-    try:
-        with open(file_path, 'r') as file:
-            for line in file:
-                if line.startswith('#') or not line.strip():
-                    continue
-                data = line.strip().split()
-                local_id = int(data[0])
-                x, y, z = float(data[1]), float(data[2]), float(data[3])
-                area = data[4]  # Assuming the area is in the 5th column
-                if not area.startswith('area_'):
-                    continue
-                points.InsertNextPoint(x, y, z)
-                areas.add(area)
-                point_areas.append(area)  # Store the original area name
-    except FileNotFoundError:
-        print(f"File {file_path} not found.")
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from build_manifest import (code_version, input_fingerprints, is_stale, load_build_manifest, record_build,
+                            save_build_manifest)
+from monitors import MONITOR_ID_OFFSET, ROW_STEP, default_store_dir, load_monitor_block
+from network import connectivity_tensor_path, load_connectivity_tensor
+from registry import NeuronRegistry, registry_sources
+from vtp import (add_area_table, add_vtp_arguments, cells_from_array, data_array,
+                 export_to_vtp, points_from_array, vtp_options)
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+# Source files whose code shapes the exported files, part of their build version
+VTK_SOURCES = ["export_vtk_all.py", "vtp.py"]
+
+
+def read_positions(simulation_path):
+    """
+    Read neuron positions of all ranks of a simulation from its neuron registry.
+    Returns (coordinates, area_ids, areas, neuron_ids): a float32 (N, 3) array, the
+    index of each neuron's area in areas, the area names sorted by their numeric part,
+    and the global id of each neuron.
+    """
+    registry = NeuronRegistry.load(simulation_path)
+    if registry is None:
         return None, None, None, None
 
-    # Sort the areas by their numeric part, then assign the IDs
-    sorted_areas = sorted(areas, key=lambda x: int(x.split('_')[1]))
-    area_to_id = {area: idx for idx, area in enumerate(sorted_areas)}
-
-    return points, areas, point_areas, area_to_id
-
-
-def read_network_connections(file_path):
-    """Read network connections (either in or out) from the given file."""
-    connections = []
-    try:
-        with open(file_path, 'r') as file:
-            for line in file:
-                if line.startswith('#') or not line.strip():
-                    continue
-                # Clean the data by removing null bytes and extra whitespace
-                cleaned_line = line.strip().replace('\x00', '').strip()
-                data = cleaned_line.split()
-                
-                try:
-                    # Make sure we have enough valid data
-                    if len(data) >= 4:
-                        source_id = int(data[1])
-                        target_id = int(data[3])
-                        connections.append((source_id, target_id))
-                except (ValueError, IndexError) as e:
-                    print(f"Warning: Skipping malformed line in {file_path}: {cleaned_line}")
-                    continue
-                    
-    except FileNotFoundError:
-        print(f"File {file_path} not found.")
-        return None
-    except Exception as e:
-        print(f"Error reading file {file_path}: {str(e)}")
-        return None
-        
-    print(f"Read {len(connections)} connections from {file_path}")
-    return connections
-
+    # Only neurons in an 'area_<n>' area
+    registry = registry.select_areas(lambda area: area.startswith('area_'))
+    return registry.positions, registry.area_index.astype(np.int64), registry.areas, registry.ids
 
-def calculate_area_centroids(points, point_areas):
-    """Calculate centroids for each area."""
-    area_points = defaultdict(list)
-    for i in range(points.GetNumberOfPoints()):
-        x, y, z = points.GetPoint(i)
-        area_id = point_areas[i]
-        area_points[area_id].append((x, y, z))
 
-    centroids = {}
-    for area_id, area_points_list in area_points.items():
-        xs, ys, zs = zip(*area_points_list)
-        centroids[area_id] = (sum(xs) / len(xs), sum(ys) / len(ys), sum(zs) / len(zs))
-    return centroids
+def calculate_area_centroids(coordinates, area_ids, num_areas):
+    """Calculate the centroid of each area as a (num_areas, 3) array."""
+    counts = np.bincount(area_ids, minlength=num_areas).astype(np.float64)
+    sums = np.stack([np.bincount(area_ids, weights=coordinates[:, axis], minlength=num_areas)
+                     for axis in range(3)], axis=1)
+    return sums / np.maximum(counts, 1)[:, None]
 
 
-def create_neurons_polydata(points, point_areas, area_to_id, num_areas):
-    """Create vtkPolyData for neurons with area-based colors and labels."""
-    polydata = vtk.vtkPolyData()
-    polydata.SetPoints(points)
-
-    # Create vertices (points)
-    vertices = vtk.vtkCellArray()
-    for i in range(points.GetNumberOfPoints()):
-        vertices.InsertNextCell(1)
-        vertices.InsertCellPoint(i)
-    
-    polydata.SetVerts(vertices)
-
-    # Add area-based colors
-    colors = vtk.vtkUnsignedCharArray()
-    colors.SetName("Colors")
-    colors.SetNumberOfComponents(3)
-
-    # Define a color mapping for each area
-    unique_areas = sorted(set(point_areas))
-    area_color_map = {}
-    
-    # Generate distinct colors for each area
-    for i, area in enumerate(unique_areas):
+def area_colors(num_areas):
+    """Distinct rainbow colors, one uint8 RGB row per area."""
+    colors = np.zeros((num_areas, 3), dtype=np.uint8)
+    for i in range(num_areas):
         # Create a rainbow color scheme
-        hue = i / len(unique_areas)
+        hue = i / num_areas
         # Convert HSV to RGB (assuming S=1, V=1)
         if hue < 1/6:
             rgb = (255, int(255 * 6 * hue), 0)
@@ -123,111 +62,187 @@ def create_neurons_polydata(points, point_areas, area_to_id, num_areas):
             rgb = (int(255 * (6 * hue - 4)), 0, 255)
         else:
             rgb = (255, 0, int(255 * (6 - 6 * hue)))
-        area_color_map[area] = rgb
+        colors[i] = rgb
+    return colors
 
-    # Add area labels as a string array
-    areaLabels = vtk.vtkStringArray()
-    areaLabels.SetName("AreaLabels")
-    areaLabels.SetNumberOfComponents(1)
 
-    # Set colors and labels for each point based on its area
-    for area_id in point_areas:
-        rgb = area_color_map[area_id]
-        colors.InsertNextTuple3(rgb[0], rgb[1], rgb[2])
-        areaLabels.InsertNextValue(area_id)  # Store the original area name
+def create_neurons_polydata(coordinates, area_ids, areas):
+    """
+    Create vtkPolyData for neurons with area-based colors and labels, straight from
+    NumPy buffers. Labels are an integer 'AreaId' point array; the names and colors
+    it indexes are stored once in the field data.
+    """
+    polydata = vtk.vtkPolyData()
+    polydata.SetPoints(points_from_array(coordinates))
 
-    polydata.GetPointData().SetScalars(colors)
-    polydata.GetPointData().AddArray(areaLabels)
-    
-    return polydata
+    # One vertex cell per point
+    polydata.SetVerts(cells_from_array(np.arange(len(coordinates)), 1))
 
+    colors = area_colors(len(areas))
+    polydata.GetPointData().SetScalars(data_array(colors[area_ids], "Colors"))
+    polydata.GetPointData().AddArray(data_array(area_ids.astype(np.uint16), "AreaId"))
+    add_area_table(polydata, areas, colors)
 
-def create_connections_polydata(area_centroids, in_connections, out_connections, point_areas):
-    """Create basic vtkPolyData for area-level connections with weights."""
-    points = vtk.vtkPoints()
-    lines = vtk.vtkCellArray()
-    
-    # Create array for connection weights
-    connectionWeights = vtk.vtkFloatArray()
-    connectionWeights.SetName("ConnectionWeight")
-    connectionWeights.SetNumberOfComponents(1)
-    
-    # Map area IDs to point indices
-    area_id_to_point_id = {}
-    for area_id, centroid in area_centroids.items():
-        area_id_to_point_id[area_id] = points.InsertNextPoint(centroid)
+    return polydata
 
-    # Count connections between areas
-    connection_counts = defaultdict(int)
-    
-    # Process connections as undirected (combine in and out)
-    all_connections = in_connections + out_connections
-    for source_id, target_id in all_connections:
-        if source_id >= len(point_areas) or target_id >= len(point_areas):
-            continue
-            
-        area1 = point_areas[source_id]
-        area2 = point_areas[target_id]
-        
-        # Create a sorted tuple to treat connections as undirected
-        area_pair = tuple(sorted([area1, area2]))
-        connection_counts[area_pair] += 1
 
+def create_connections_polydata(area_centroids, connection_counts):
+    """
+    Create basic vtkPolyData for area-level connections with weights.
+    connection_counts is the symmetric (areas x areas) matrix of one timestep; each
+    connected pair of distinct areas becomes one line between their centroids.
+    """
     # Find max connection count for normalization
-    max_count = max(connection_counts.values()) if connection_counts else 1
-
-    print("\nConnection counts between areas:")
-    for (area1, area2), count in connection_counts.items():
-        normalized = count / max_count
-        print(f"Areas {area1} <-> {area2}: {count} connections (normalized: {normalized:.3f})")
+    max_count = connection_counts.max() if connection_counts.size and connection_counts.max() > 0 else 1
     print(f"Maximum connections between any two areas: {max_count}")
 
-    # Create lines with explicit normalization
-    for (area1, area2), count in connection_counts.items():
-        if area1 == area2:
-            continue  # Skip self-connections
-            
-        line = vtk.vtkLine()
-        line.GetPointIds().SetId(0, area_id_to_point_id[area1])
-        line.GetPointIds().SetId(1, area_id_to_point_id[area2])
-        lines.InsertNextCell(line)
-        
-        # Ensure normalization is exactly between 0 and 1
-        normalized_weight = count / max_count
-        connectionWeights.InsertNextValue(normalized_weight)
-
-    # Create the polydata
+    # Upper triangle only: one line per undirected pair, self-connections skipped
+    area1, area2 = np.nonzero(np.triu(connection_counts, k=1))
+
     polydata = vtk.vtkPolyData()
-    polydata.SetPoints(points)
-    polydata.SetLines(lines)
-    
-    # Add weights to cell data
-    polydata.GetCellData().AddArray(connectionWeights)
+    polydata.SetPoints(points_from_array(area_centroids))
+    polydata.SetLines(cells_from_array(np.stack([area1, area2], axis=1), 2))
+
+    # Ensure normalization is exactly between 0 and 1
+    weights = (connection_counts[area1, area2] / max_count).astype(np.float32)
+    polydata.GetCellData().AddArray(data_array(weights, "ConnectionWeight"))
     polydata.GetCellData().SetActiveScalars("ConnectionWeight")
     
     return polydata
 
 
-def export_to_vtp(polydata, filename):
-    """Export polydata to VTP file with proper formatting."""
-    # Create the writer
-    writer = vtk.vtkXMLPolyDataWriter()
-    writer.SetFileName(filename)
-    writer.SetInputData(polydata)
-    
-    # Set data mode to ASCII for human-readable output
-    writer.SetDataModeToAscii()
+def export_timestep(timestep, sim_dir, area_centroids, tensor, vtp_kwargs=None):
+    """
+    Export the connections VTP of a single timestep from the connectivity tensor,
+    encoded as set by vtp_kwargs.
+    Returns a small report dict, or None if the network data is missing.
+    """
+    start = time.perf_counter()
     
-    # Ensure all arrays are written
-    writer.SetEncodeAppendedData(0)
-    writer.SetCompressorTypeToNone()
-    
-    # Write the file
-    writer.Write()
+    index = np.searchsorted(tensor["steps"], timestep)
+    if index == len(tensor["steps"]) or tensor["steps"][index] != timestep:
+        print(f"Skipping timestep {timestep} due to missing network data.")
+        return None
+
+    connections_polydata = create_connections_polydata(area_centroids, tensor["undirected"][index])
 
+    connections_filename = os.path.join(sim_dir, f'connections_{timestep:07d}.vtp')
+    written = export_to_vtp(connections_polydata, connections_filename, **(vtp_kwargs or {}))
 
-def process_simulation(sim_name, base_path):
-    """Process a single simulation and export VTP files."""
+    return {
+        'timestep': timestep,
+        'file': connections_filename,
+        'connections': int(tensor["directed"][index].sum()),
+        'bytes': written['bytes'],
+        'encode_seconds': written['seconds'],
+        'seconds': time.perf_counter() - start,
+        'worker': os.getpid(),
+    }
+
+
+FRAME_COLUMNS = ["current_calcium", "activity", "fired_fraction", "grown_axons"]
+
+
+def export_attribute_frames(sim_dir, base_path, neuron_ids, timesteps, columns=FRAME_COLUMNS):
+    """
+    Writes the per-neuron monitor values of each timestep as one small attribute frame
+    for the static neurons.vtp geometry: raw little-endian float32, one block of
+    len(neuron_ids) values per column, in neurons.vtp point order (NaN where a neuron
+    has no monitor data). frames/index.json maps each timestep to its frame file.
+    """
+    step_size = timesteps[1] - timesteps[0] if len(timesteps) > 1 else ROW_STEP
+    monitor_indices, block, num_rows = load_monitor_block(
+        os.path.join(base_path, 'monitors'), columns=columns, row_stride=step_size // ROW_STEP
+    )
+    if block is None:
+        print(f"No monitor data for {base_path}, skipping attribute frames.")
+        return None
+
+    monitor_ids = monitor_indices + MONITOR_ID_OFFSET
+    row_of = np.full(max(int(monitor_ids.max()), int(neuron_ids.max())) + 1, -1, dtype=np.int64)
+    row_of[monitor_ids] = np.arange(len(monitor_indices))
+    point_rows = row_of[neuron_ids]
+    has_data = point_rows >= 0
+
+    frames_dir = os.path.join(sim_dir, 'frames')
+    os.makedirs(frames_dir, exist_ok=True)
+
+    frames = []
+    start = time.perf_counter()
+    for timestep in timesteps:
+        row = timestep // step_size
+        if timestep % step_size or row >= block.shape[1]:
+            print(f"Skipping frame {timestep}: no monitor row for this step.")
+            continue
+
+        frame = np.full((len(columns), len(neuron_ids)), np.nan, dtype='<f4')
+        frame[:, has_data] = block[point_rows[has_data], row, :].T
+
+        frame_file = f'frames/frame_{timestep:07d}.bin'
+        frame.tofile(os.path.join(sim_dir, frame_file))
+        frames.append({'timestep': int(timestep), 'file': frame_file})
+
+    index = {
+        'geometry': 'neurons.vtp',
+        'num_points': int(len(neuron_ids)),
+        'dtype': 'float32',
+        'byte_order': 'little',
+        'arrays': list(columns),
+        'frames': frames,
+    }
+    index_file = os.path.join(frames_dir, 'index.json')
+    with open(index_file, 'w') as f:
+        json.dump(index, f, indent=2)
+
+    frame_bytes = len(columns) * len(neuron_ids) * 4
+    print(f"Wrote {len(frames)} attribute frames of {frame_bytes / 1e3:.1f} kB "
+          f"in {time.perf_counter() - start:.1f}s, index: {index_file}")
+    return index
+
+
+# Per-process state shared with pool workers, set once by _init_worker
+_worker_context = {}
+
+
+def _init_worker(sim_dir, area_centroids, tensor, vtp_kwargs):
+    """Receive the centroids and connectivity tensor once per worker process."""
+    _worker_context.update(
+        sim_dir=sim_dir, area_centroids=area_centroids, tensor=tensor, vtp_kwargs=vtp_kwargs
+    )
+
+
+def _export_timestep_in_worker(timestep):
+    return export_timestep(timestep, **_worker_context)
+
+
+def print_export_report(sim_name, timesteps, reports, elapsed, up_to_date=0):
+    """Print one summary of all exported timesteps, grouped per worker process."""
+    written = [r for r in reports.values() if r is not None]
+    print(f"\nExport report for {sim_name}:")
+    print(f"  Timesteps up to date: {up_to_date}")
+    print(f"  Timesteps written: {len(written)} / {len(timesteps)} "
+          f"(skipped: {len(timesteps) - len(written)})")
+    print(f"  Connections: {sum(r['connections'] for r in written)}")
+    print(f"  Bytes written: {sum(r['bytes'] for r in written) / 1e6:.2f} MB "
+          f"(encoding took {sum(r['encode_seconds'] for r in written):.1f}s)")
+    print(f"  Wall time: {elapsed:.1f}s")
+
+    per_worker = defaultdict(list)
+    for r in written:
+        per_worker[r['worker']].append(r['seconds'])
+    for worker, seconds in sorted(per_worker.items()):
+        print(f"  Worker {worker}: {len(seconds)} timesteps, {sum(seconds):.1f}s busy, "
+              f"{sum(seconds) / len(seconds):.2f}s per timestep")
+
+
+def process_simulation(sim_name, base_path, workers=1, vtp_kwargs=None, frames=False, force=False):
+    """
+    Process a single simulation and export VTP files, optionally across a pool of worker processes.
+    vtp_kwargs selects the VTP encoding (see vtp.export_to_vtp). With frames, the per-timestep
+    neuron attributes are also written as frames for the static neuron geometry.
+    Files the build manifest of the output directory records as built from the current
+    inputs, encoding and code are not exported again, unless force is set.
+    """
     print(f"Processing simulation: {sim_name}")
     
     # Create output directory
@@ -236,42 +251,86 @@ def process_simulation(sim_name, base_path):
     os.makedirs(sim_dir, exist_ok=True)
 
     # Read positions data
-    positions_file = f'{base_path}/positions/rank_0_positions.txt'
-    print(f"Reading positions from: {positions_file}")  # Debug log
+    print(f"Reading positions from: {base_path}/positions")  # Debug log
     
-    points, areas, point_areas, area_to_id = read_positions(positions_file)
-    if points is None:
+    coordinates, area_ids, areas, neuron_ids = read_positions(base_path)
+    if coordinates is None:
         print(f"Unable to load positions data for {sim_name}. Skipping.")
         return
 
+    # Inputs and version of every file written below, for the build manifest
+    manifest = load_build_manifest(sim_dir)
+    version = code_version([os.path.join(SCRIPTS_DIR, source) for source in VTK_SOURCES], {"vtp": vtp_kwargs})
+    positions = input_fingerprints(registry_sources(base_path))
+
     # Create neurons VTP
-    neurons_polydata = create_neurons_polydata(points, point_areas, area_to_id, len(areas))
     neurons_file = os.path.join(sim_dir, 'neurons.vtp')
-    print(f"Exporting neurons to: {neurons_file}")  # Debug log
-    export_to_vtp(neurons_polydata, neurons_file)
-
-    # Process each timestep
-    for timestep in range(0, 1000001, 10000):
-        print(f"Processing timestep {timestep}...")
-        
-        # Read network connections
-        in_network_file = f'{base_path}/network/rank_0_step_{timestep}_in_network.txt'
-        out_network_file = f'{base_path}/network/rank_0_step_{timestep}_out_network.txt'
-        
-        in_connections = read_network_connections(in_network_file)
-        out_connections = read_network_connections(out_network_file)
-        
-        if in_connections is None or out_connections is None:
-            print(f"Skipping timestep {timestep} due to missing network data.")
-            continue
-
-        area_centroids = calculate_area_centroids(points, point_areas)
-        connections_polydata = create_connections_polydata(
-            area_centroids, in_connections, out_connections, point_areas
-        )
+    if force or is_stale(manifest, sim_dir, neurons_file, positions, version):
+        neurons_polydata = create_neurons_polydata(coordinates, area_ids, areas)
+        print(f"Exporting neurons to: {neurons_file}")  # Debug log
+        written = export_to_vtp(neurons_polydata, neurons_file, **(vtp_kwargs or {}))
+        print(f"Wrote {written['bytes'] / 1e6:.2f} MB in {written['seconds']:.2f}s")
+        record_build(manifest, sim_dir, neurons_file, positions, version)
+        save_build_manifest(sim_dir, manifest)
+    else:
+        print(f"{neurons_file} is up to date")
+
+    # Area x area x time connection counts (rebuilt when the network files changed)
+    tensor = load_connectivity_tensor(base_path)
+
+    # Centroids don't change across timesteps, so compute them once, in the tensor's area order
+    centroids = calculate_area_centroids(coordinates, area_ids, len(areas))
+    area_index = {area: i for i, area in enumerate(areas)}
+    area_centroids = centroids[[area_index[str(area)] for area in tensor["areas"]]]
+
+    timesteps = list(range(0, 1000001, 10000))
+
+    if frames:
+        monitors_dir = os.path.join(base_path, 'monitors')
+        frame_inputs = input_fingerprints([monitors_dir, os.path.join(default_store_dir(monitors_dir), "manifest.json")]
+                                          + registry_sources(base_path))
+        frame_version = code_version([os.path.join(SCRIPTS_DIR, source) for source in VTK_SOURCES],
+                                     {"columns": FRAME_COLUMNS, "timesteps": timesteps})
+        frames_index = os.path.join(sim_dir, 'frames', 'index.json')
+        if force or is_stale(manifest, sim_dir, frames_index, frame_inputs, frame_version):
+            if export_attribute_frames(sim_dir, base_path, neuron_ids, timesteps) is not None:
+                record_build(manifest, sim_dir, frames_index, frame_inputs, frame_version)
+                save_build_manifest(sim_dir, manifest)
+        else:
+            print(f"{frames_index} is up to date")
+
+    # Only timesteps whose connections file is missing or outdated are exported. The tensor was
+    # rebuilt above if the network snapshots changed; the network directory is tracked as well.
+    connection_inputs = input_fingerprints([connectivity_tensor_path(base_path), os.path.join(base_path, "network")]
+                                           + registry_sources(base_path))
+    all_timesteps = timesteps
+    timesteps = [t for t in all_timesteps if force or is_stale(
+        manifest, sim_dir, os.path.join(sim_dir, f'connections_{t:07d}.vtp'), connection_inputs, version)]
+
+    reports = {}
+    start = time.perf_counter()
+
+    if workers > 1:
+        print(f"Exporting {len(timesteps)} timesteps with {workers} workers...")
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(sim_dir, area_centroids, tensor, vtp_kwargs)) as pool:
+            futures = {pool.submit(_export_timestep_in_worker, t): t for t in timesteps}
+            for done, future in enumerate(as_completed(futures), 1):
+                timestep = futures[future]
+                reports[timestep] = future.result()
+                print(f"[{done}/{len(timesteps)}] Timestep {timestep} "
+                      f"{'done' if reports[timestep] else 'skipped'}")
+    else:
+        for timestep in timesteps:
+            print(f"Processing timestep {timestep}...")
+            reports[timestep] = export_timestep(timestep, sim_dir, area_centroids, tensor, vtp_kwargs)
 
-        connections_filename = os.path.join(sim_dir, f'connections_{timestep:07d}.vtp')
-        export_to_vtp(connections_polydata, connections_filename)
+    for report in reports.values():
+        if report is not None:
+            record_build(manifest, sim_dir, report['file'], connection_inputs, version)
+    save_build_manifest(sim_dir, manifest)
+    print_export_report(sim_name, timesteps, reports, time.perf_counter() - start,
+                        len(all_timesteps) - len(timesteps))
 
 
 def create_empty_connections_polydata():
@@ -309,18 +368,26 @@ def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--sim', choices=list(simulations.keys()), 
                        help='Specific simulation to process')
+    parser.add_argument('--workers', type=int, default=1,
+                       help='Number of processes exporting timesteps in parallel')
+    parser.add_argument('--frames', action='store_true',
+                       help='Also write per-timestep neuron attribute frames for the static neurons.vtp')
+    parser.add_argument('--force', action='store_true',
+                       help='Export files that are up to date again')
+    add_vtp_arguments(parser)
     args = parser.parse_args()
 
     if args.sim:
         # Process single simulation
         if args.sim in simulations:
-            process_simulation(args.sim, simulations[args.sim])
+            process_simulation(args.sim, simulations[args.sim], args.workers, vtp_options(args), args.frames,
+                               args.force)
         else:
             print(f"Unknown simulation: {args.sim}")
     else:
         # Process all simulations
         for sim_name, sim_path in simulations.items():
-            process_simulation(sim_name, sim_path)
+            process_simulation(sim_name, sim_path, args.workers, vtp_options(args), args.frames, args.force)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,665 @@
+import argparse
+import glob
+import json
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from ranks import rank_offsets
+
+# Column layout of the monitors/0_<id>.csv files written by the simulator
+MONITOR_COLUMNS = [
+    "step", "fired", "fired_fraction", "activity", "dampening",
+    "current_calcium", "target_calcium", "synaptic_input",
+    "background_input", "grown_axons", "connected_axons",
+    "grown_dendrites", "connected_dendrites"
+]
+
+ROW_STEP = 100  # Each row represents 100 timesteps
+MONITOR_ID_OFFSET = 1  # Monitor file 0_<i>.csv holds the neuron with id i + 1 in the positions files
+MONITOR_CHUNK_ROWS = 10000  # CSV rows parsed at a time
+
+
+def list_monitor_files(input_dir):
+    """
+    Lists the monitor CSV files in a directory, sorted by their numeric neuron index.
+    Returns (neuron_indices, file_paths), where the index is the number after '<rank>_'.
+    Files of ranks other than 0 get global indices (see ranks.py), using the
+    positions files of the simulation directory that holds input_dir.
+    """
+    entries = []
+    for csv_file in glob.glob(os.path.join(input_dir, "*.csv")):
+        try:
+            rank, index = (int(part) for part in Path(csv_file).stem.split('_')[:2])
+            entries.append((rank, index, csv_file))
+        except ValueError:
+            print(f"Skipping file with unexpected name: {csv_file}")
+
+    if any(rank for rank, _, _ in entries):
+        offsets = rank_offsets(os.path.dirname(os.path.normpath(input_dir)))
+        entries = [(0, int(offsets[rank]) + index, csv_file) for rank, index, csv_file in entries]
+    entries.sort()
+    return np.array([e[1] for e in entries], dtype=np.int64), [e[2] for e in entries]
+
+
+def column_indices(columns=None):
+    """Translate column names (or None for all) into positional monitor column indices."""
+    if columns is None:
+        return list(range(len(MONITOR_COLUMNS)))
+    return [MONITOR_COLUMNS.index(c) if isinstance(c, str) else int(c) for c in columns]
+
+
+def count_rows(file_path):
+    """Count the lines of a file without parsing it."""
+    with open(file_path, 'rb') as f:
+        return sum(1 for _ in f)
+
+
+def iter_monitor_chunks(file_path, columns=None, row_stride=1, dtype=np.float32, chunk_rows=MONITOR_CHUNK_ROWS):
+    """
+    Parses one monitor CSV with the pandas C engine, about chunk_rows rows at a time, and
+    yields (row, values): values holds every row_stride-th row of the chunk (row 0 of the
+    file included) as a (kept rows x columns) array of dtype, row is the strided index of
+    its first row. Only one chunk of the file is in memory at a time.
+    Non-numeric cells are coerced to NaN.
+    """
+    usecols = column_indices(columns)
+    # Whole multiples of row_stride, so every chunk starts on a kept row
+    chunk_rows = row_stride * max(1, chunk_rows // row_stride)
+    row = 0
+    with pd.read_csv(file_path, sep=';', header=None, usecols=usecols, engine='c',
+                     chunksize=chunk_rows) as reader:
+        for df in reader:
+            df = df[usecols][::row_stride]
+            for col in usecols:
+                if not pd.api.types.is_numeric_dtype(df[col]):
+                    df[col] = pd.to_numeric(df[col], errors='coerce')
+            values = df.to_numpy(dtype=dtype)
+            yield row, values
+            row += len(values)
+
+
+def read_monitor_file(file_path, columns=None, row_stride=1, dtype=np.float32):
+    """
+    Parses one monitor CSV into a (rows x columns) array of dtype, keeping only every
+    row_stride-th row (row 0 included). The file is read in chunks (see iter_monitor_chunks),
+    so only the kept rows of the whole file are held at once.
+    """
+    chunks = [values for _, values in iter_monitor_chunks(file_path, columns, row_stride, dtype)]
+    if not chunks:
+        return np.empty((0, len(column_indices(columns))), dtype=dtype)
+    return np.concatenate(chunks) if len(chunks) > 1 else chunks[0]
+
+
+def iter_monitor_files(csv_files, columns=None, row_stride=1, num_strided=None, dtype=np.float32):
+    """
+    Yields (position, values) for every monitor file that parses to num_strided rows.
+    Unreadable files and files with a different row count are reported and skipped.
+    """
+    for i, csv_file in enumerate(csv_files):
+        try:
+            values = read_monitor_file(csv_file, columns, row_stride, dtype)
+        except Exception as e:
+            print(f"Error reading file {csv_file}: {e}")
+            continue
+        if num_strided is not None and values.shape[0] != num_strided:
+            print(f"Warning: {csv_file} has {values.shape[0]} strided rows instead of {num_strided}")
+            continue
+        yield i, values
+
+
+def load_monitor_block(input_dir, columns=None, row_stride=1, neuron_indices=None, dtype=np.float32):
+    """
+    Parses every monitor file in input_dir once into a single typed block.
+
+    Returns (neuron_indices, block, num_rows) where block is an array of dtype (float32 by
+    default) and shape (neurons x strided rows x columns) and num_rows is the full row count of a file.
+    Files whose row count differs from the first file are skipped with a warning,
+    so neuron_indices only lists the neurons present in the block.
+    If a monitor store built with build_monitor_store exists next to input_dir
+    and covers the request, the block is read from it instead of the CSVs (see
+    open_store_for: a float32 store only serves float32 blocks).
+    """
+    manifest = open_store_for(input_dir, dtype)
+    if manifest is not None:
+        result = load_block_from_store(manifest, columns, row_stride, neuron_indices, dtype)
+        if result is not None:
+            return result
+
+    indices, csv_files = list_monitor_files(input_dir)
+    if neuron_indices is not None:
+        keep = np.isin(indices, neuron_indices)
+        indices = indices[keep]
+        csv_files = [f for f, k in zip(csv_files, keep) if k]
+    if not csv_files:
+        print(f"No CSV files found in {input_dir}")
+        return indices, None, 0
+
+    num_rows = count_rows(csv_files[0])
+    num_strided = len(range(0, num_rows, row_stride))
+    block = np.empty((len(csv_files), num_strided, len(column_indices(columns))), dtype=dtype)
+
+    valid = np.zeros(len(csv_files), dtype=bool)
+    for i, values in iter_monitor_files(csv_files, columns, row_stride, num_strided, dtype):
+        block[i] = values
+        valid[i] = True
+
+    if not valid.all():
+        block = block[valid]
+    return indices[valid], block, num_rows
+
+
+def default_store_dir(input_dir):
+    """The monitor store for <sim>/monitors lives in <sim>/monitors_store."""
+    return os.path.normpath(input_dir) + "_store"
+
+
+def monitor_sources_key(input_dir):
+    """[files, total size, newest mtime] of the CSV files of a monitors directory."""
+    files = size = mtime_ns = 0
+    with os.scandir(input_dir) as entries:
+        for entry in entries:
+            if entry.name.endswith(".csv"):
+                stat = entry.stat()
+                files, size, mtime_ns = files + 1, size + stat.st_size, max(mtime_ns, stat.st_mtime_ns)
+    return [files, size, mtime_ns]
+
+
+def build_monitor_store(input_dir, columns=None, row_stride=1, dtype=np.float32):
+    """
+    Converts a monitors directory into a memory-mappable store in default_store_dir(input_dir),
+    the only place the readers look for it.
+
+    Every column is written to <store_dir>/<column>.npy as a (neurons x rows) array of
+    dtype, filled file by file so the CSVs never need to fit in memory at once.
+    neuron_indices.npy lists the monitor index of each store row and manifest.json
+    holds the column names, the dtype, the row -> global step mapping and the
+    monitor_sources_key of the CSVs it was built from.
+    """
+    store_dir = default_store_dir(input_dir)
+    sources = monitor_sources_key(input_dir)
+    indices, csv_files = list_monitor_files(input_dir)
+    if not csv_files:
+        print(f"No CSV files found in {input_dir}")
+        return None
+
+    col_names = [MONITOR_COLUMNS[c] for c in column_indices(columns)]
+    num_rows = count_rows(csv_files[0])
+    num_strided = len(range(0, num_rows, row_stride))
+    os.makedirs(store_dir, exist_ok=True)
+
+    # Invalidate any previous store until the new one is complete
+    manifest_file = os.path.join(store_dir, "manifest.json")
+    if os.path.exists(manifest_file):
+        os.remove(manifest_file)
+
+    print(f"Building monitor store for {len(csv_files)} files in {store_dir}")
+    arrays = {
+        name: np.lib.format.open_memmap(os.path.join(store_dir, f"{name}.npy"), mode='w+',
+                                        dtype=dtype, shape=(len(csv_files), num_strided))
+        for name in col_names
+    }
+    valid = np.zeros(len(csv_files), dtype=bool)
+    for i, values in iter_monitor_files(csv_files, col_names, row_stride, num_strided, dtype):
+        for j, name in enumerate(col_names):
+            arrays[name][i] = values[:, j]
+        valid[i] = True
+
+    for name in col_names:
+        column = arrays.pop(name)
+        column.flush()
+        if not valid.all():
+            # Compact away the rows of skipped files
+            compacted = np.asarray(column)[valid]
+            del column
+            np.save(os.path.join(store_dir, f"{name}.npy"), compacted)
+    np.save(os.path.join(store_dir, "neuron_indices.npy"), indices[valid])
+
+    manifest = {
+        "columns": col_names,
+        "dtype": np.dtype(dtype).name,
+        "num_neurons": int(valid.sum()),
+        "num_rows": num_rows,
+        "row_stride": row_stride,
+        "global_steps": [r * ROW_STEP for r in range(0, num_rows, row_stride)],
+        "sources": sources,
+    }
+    with open(manifest_file, 'w') as f:
+        json.dump(manifest, f)
+    print(f"Monitor store written: {manifest['num_neurons']} neurons x {num_strided} rows x {len(col_names)} columns")
+    return open_monitor_store(store_dir)
+
+
+def open_monitor_store(store_dir, input_dir=None):
+    """
+    Returns the manifest of a monitor store (with its directory under 'store_dir'), or None.
+    Given the monitors directory it was built from, a store whose recorded CSV count, size
+    or newest mtime no longer match the CSVs is ignored with a warning (None), so callers
+    read the CSVs until it is rebuilt. A directory without CSVs left keeps using its store.
+    """
+    manifest_file = os.path.join(store_dir, "manifest.json")
+    if not os.path.exists(manifest_file):
+        return None
+    with open(manifest_file, 'r') as f:
+        manifest = json.load(f)
+    if input_dir is not None and os.path.isdir(input_dir):
+        sources = monitor_sources_key(input_dir)
+        if sources[0] and manifest.get("sources") != sources:
+            print(f"Monitor store {store_dir} is out of date, reading the CSVs "
+                  f"(rebuild it with: python monitors.py {input_dir})")
+            return None
+    manifest["store_dir"] = store_dir
+    return manifest
+
+
+def open_store_for(input_dir, dtype=np.float32):
+    """
+    The current monitor store of input_dir if it can serve values of dtype, else None.
+    A store only serves readers asking for at most its own precision: the default float32
+    store serves the float32 readers (plots, snapshots, VTK), the JSON exporters read
+    float64 and only use a store built with --dtype float64.
+    """
+    manifest = open_monitor_store(default_store_dir(input_dir), input_dir)
+    if manifest is None or np.dtype(manifest.get("dtype", "float32")).itemsize < np.dtype(dtype).itemsize:
+        return None
+    return manifest
+
+
+def store_column(manifest, column):
+    """Memory-maps one (neurons x rows) column of a monitor store."""
+    return np.load(os.path.join(manifest["store_dir"], f"{column}.npy"), mmap_mode='r')
+
+
+def store_neuron_indices(manifest):
+    """Monitor index (the <id> in 0_<id>.csv) of every store row."""
+    return np.load(os.path.join(manifest["store_dir"], "neuron_indices.npy"))
+
+
+def store_rows(manifest, global_steps):
+    """Maps global steps to store row positions; steps not in the store map to -1."""
+    steps = np.asarray(manifest["global_steps"])
+    global_steps = np.atleast_1d(np.asarray(global_steps))
+    rows = np.searchsorted(steps, global_steps)
+    rows = np.minimum(rows, len(steps) - 1)
+    return np.where(steps[rows] == global_steps, rows, -1)
+
+
+def load_block_from_store(manifest, columns=None, row_stride=1, neuron_indices=None, dtype=np.float32):
+    """
+    Reads a (neurons x strided rows x columns) block from a monitor store.
+    Returns None if the store lacks a column or its row stride does not divide row_stride.
+    """
+    col_names = [MONITOR_COLUMNS[c] for c in column_indices(columns)]
+    if any(name not in manifest["columns"] for name in col_names):
+        return None
+    if row_stride % manifest["row_stride"]:
+        return None
+
+    indices = store_neuron_indices(manifest)
+    keep = slice(None) if neuron_indices is None else np.isin(indices, neuron_indices)
+    step = row_stride // manifest["row_stride"]
+    block = np.stack([store_column(manifest, name)[keep, ::step] for name in col_names], axis=-1)
+    return indices[keep], np.ascontiguousarray(block, dtype=dtype), manifest["num_rows"]
+
+
+def iter_neuron_values(input_dir, columns=None, row_stride=1, part=None, dtype=np.float32):
+    """
+    Streams (neuron_index, values) one neuron at a time, values being a (strided rows x columns)
+    array of dtype, so only one neuron is ever held in memory.
+    Reads from the monitor store when it covers the request, else from the CSVs, each parsed
+    once a chunk of rows at a time (see read_monitor_file); files whose row count differs from
+    the first file are skipped with a warning, as in load_monitor_block.
+    part=(i, n) only yields every n-th neuron starting at the i-th, to split the
+    neurons between n workers.
+    """
+    first, every = part if part is not None else (0, 1)
+    col_names = [MONITOR_COLUMNS[c] for c in column_indices(columns)]
+    manifest = open_store_for(input_dir, dtype)
+    if (manifest is not None and all(name in manifest["columns"] for name in col_names)
+            and row_stride % manifest["row_stride"] == 0):
+        step = row_stride // manifest["row_stride"]
+        arrays = [store_column(manifest, name) for name in col_names]
+        neuron_indices = store_neuron_indices(manifest)
+        for i in range(first, len(neuron_indices), every):
+            neuron_index = neuron_indices[i]
+            yield int(neuron_index), np.stack([a[i, ::step] for a in arrays], axis=-1).astype(dtype)
+        return
+
+    indices, csv_files = list_monitor_files(input_dir)
+    if not csv_files:
+        print(f"No CSV files found in {input_dir}")
+        return
+    num_strided = len(range(0, count_rows(csv_files[0]), row_stride))
+    indices, csv_files = indices[first::every], csv_files[first::every]
+    for i, values in iter_monitor_files(csv_files, col_names, row_stride, num_strided, dtype):
+        yield int(indices[i]), values
+
+
+def build_step_major_store(store_dir, chunk_size=4096):
+    """
+    Adds a transposed (rows x neurons) copy of every column to a monitor store,
+    so that all neurons of one step are contiguous on disk.
+    """
+    manifest = open_monitor_store(store_dir)
+    if manifest is None:
+        print(f"No monitor store found in {store_dir}")
+        return None
+
+    for name in manifest["columns"]:
+        src = store_column(manifest, name)
+        dst = np.lib.format.open_memmap(os.path.join(store_dir, f"{name}.by_step.npy"), mode='w+',
+                                        dtype=src.dtype, shape=(src.shape[1], src.shape[0]))
+        for start in range(0, src.shape[0], chunk_size):
+            dst[:, start:start + chunk_size] = src[start:start + chunk_size].T
+        dst.flush()
+        del dst
+
+    manifest["step_major"] = True
+    with open(os.path.join(store_dir, "manifest.json"), 'w') as f:
+        json.dump({k: v for k, v in manifest.items() if k != "store_dir"}, f)
+    print(f"Step-major copy written for {len(manifest['columns'])} columns")
+    return manifest
+
+
+def monitors_dir_of(simulation):
+    """Accepts a simulation directory (viz-<name>) or a monitors directory."""
+    candidate = os.path.join(simulation, "monitors")
+    return candidate if os.path.isdir(candidate) else simulation
+
+
+def get_step_snapshot(simulation, global_step, columns=None):
+    """
+    Returns (neuron_indices, values) for a single global step, where values is a
+    float32 (neurons x columns) array.
+
+    Reads one row per column from the monitor store when it holds the step
+    (contiguous if the step-major copy exists). Otherwise every CSV is read
+    up to the requested row only. Neurons without that row get NaN values.
+    """
+    input_dir = monitors_dir_of(simulation)
+    col_names = [MONITOR_COLUMNS[c] for c in column_indices(columns)]
+
+    manifest = open_monitor_store(default_store_dir(input_dir), input_dir)
+    if manifest is not None and all(name in manifest["columns"] for name in col_names):
+        row = store_rows(manifest, global_step)[0]
+        if row >= 0:
+            if manifest.get("step_major"):
+                values = [np.load(os.path.join(manifest["store_dir"], f"{name}.by_step.npy"), mmap_mode='r')[row]
+                          for name in col_names]
+            else:
+                values = [store_column(manifest, name)[:, row] for name in col_names]
+            return store_neuron_indices(manifest), np.stack(values, axis=1).astype(np.float32)
+
+    if global_step % ROW_STEP:
+        print(f"Global step {global_step} is not a multiple of {ROW_STEP}")
+        return None, None
+    row = global_step // ROW_STEP
+    usecols = column_indices(col_names)
+    indices, csv_files = list_monitor_files(input_dir)
+    values = np.full((len(csv_files), len(usecols)), np.nan, dtype=np.float32)
+    for i, csv_file in enumerate(csv_files):
+        try:
+            df = pd.read_csv(csv_file, sep=';', header=None, usecols=usecols,
+                             skiprows=row, nrows=1, engine='c')
+        except Exception:
+            continue  # File shorter than the requested row
+        if not df.empty:
+            values[i] = df[usecols].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float32)[0]
+    return indices, values
+
+
+def snapshot_frame(simulation, global_step, registry, columns, id_offset=MONITOR_ID_OFFSET):
+    """
+    Builds a DataFrame with one row per neuron of the registry (registry.NeuronRegistry)
+    holding the given monitor columns at global_step, plus 'Neuron_ID' and 'Area'.
+    Neuron id i + id_offset is read from monitor file 0_<i>.csv.
+    Neurons without a monitor file or without data at that step are dropped.
+    """
+    neuron_indices, values = get_step_snapshot(simulation, global_step, columns)
+    frame = pd.DataFrame({'Neuron_ID': registry.ids, 'Area': registry.area_names()})
+    if values is None or len(neuron_indices) == 0:
+        return frame.iloc[0:0]
+
+    monitor_ids = neuron_indices + id_offset
+    ids = registry.ids
+    pos = np.minimum(np.searchsorted(monitor_ids, ids), len(monitor_ids) - 1)
+    found = monitor_ids[pos] == ids
+    if not found.all():
+        print(f"No monitor file for {int((~found).sum())} neurons")
+
+    data = pd.DataFrame(values[pos], columns=list(columns))
+    frame = pd.concat([frame, data], axis=1)[found]
+    missing = frame[list(columns)].isna().all(axis=1)
+    if missing.any():
+        print(f"No data for {int(missing.sum())} neurons at global_step {global_step}")
+    return frame[~missing].reset_index(drop=True)
+
+
+def group_mean(values, groups, num_groups):
+    """
+    Averages per-neuron values (neurons x ...) over integer group labels.
+    Neurons with a negative label are ignored. Returns (means, counts); empty groups are NaN.
+    """
+    mask = groups >= 0
+    groups = groups[mask]
+    values = np.asarray(values, dtype=np.float64)[mask]
+    sums = np.zeros((num_groups,) + values.shape[1:], dtype=np.float64)
+    np.add.at(sums, groups, values)
+    counts = np.bincount(groups, minlength=num_groups)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = sums / counts.reshape((-1,) + (1,) * (values.ndim - 1))
+    return means, counts
+
+
+QUANTILES = (0.25, 0.5, 0.75)
+
+
+def group_stats(values, groups, num_groups, quantiles=QUANTILES):
+    """
+    Per-group statistics of per-neuron values (neurons x ...), ignoring NaN and
+    neurons with a negative label. Returns a dict of (num_groups x ...) arrays:
+    'mean', 'std', 'min', 'max', one 'q<percent>' per quantile, and 'count'.
+    """
+    means, counts = group_mean(values, groups, num_groups)
+    shape = (num_groups,) + np.shape(values)[1:]
+    stats = {"mean": means, "std": np.full(shape, np.nan), "min": np.full(shape, np.nan),
+             "max": np.full(shape, np.nan)}
+    for q in quantiles:
+        stats[f"q{int(round(q * 100))}"] = np.full(shape, np.nan)
+
+    order = np.argsort(groups, kind='stable')
+    bounds = np.searchsorted(groups[order], np.arange(num_groups + 1))
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)  # all-NaN slices stay NaN
+        for k in range(num_groups):
+            members = values[order[bounds[k]:bounds[k + 1]]]
+            if len(members) == 0:
+                continue
+            stats["std"][k] = np.nanstd(members, axis=0, dtype=np.float64)
+            stats["min"][k] = np.nanmin(members, axis=0)
+            stats["max"][k] = np.nanmax(members, axis=0)
+            for q, qs in zip(quantiles, np.nanquantile(members, quantiles, axis=0)):
+                stats[f"q{int(round(q * 100))}"][k] = qs
+    stats["count"] = counts
+    return stats
+
+
+def new_area_accumulator(num_areas, num_rows, num_columns):
+    """
+    Streaming per-area statistics of (rows x columns) neuron values, updated with
+    Welford's algorithm: per (area, row, column) the count of non-NaN values, running
+    mean, sum of squared deviations (m2), min and max. 'neurons' counts the neurons
+    added per area and 'first' holds the lowest neuron index seen in each area.
+    """
+    shape = (num_areas, num_rows, num_columns)
+    return {
+        "count": np.zeros(shape, dtype=np.int64),
+        "mean": np.zeros(shape),
+        "m2": np.zeros(shape),
+        "min": np.full(shape, np.inf),
+        "max": np.full(shape, -np.inf),
+        "neurons": np.zeros(num_areas, dtype=np.int64),
+        "first": np.full(num_areas, np.iinfo(np.int64).max),
+    }
+
+
+def update_area_accumulator(acc, area, values, neuron_index=0):
+    """Adds one neuron's (rows x columns) values to an area of the accumulator in place; NaN is skipped."""
+    valid = ~np.isnan(values)
+    x = np.where(valid, values, 0.0)
+    count, mean, m2 = acc["count"][area], acc["mean"][area], acc["m2"][area]
+
+    count += valid
+    delta = np.where(valid, x - mean, 0.0)
+    mean += np.divide(delta, count, out=np.zeros_like(delta), where=count > 0)
+    m2 += delta * np.where(valid, x - mean, 0.0)
+
+    np.fmin(acc["min"][area], values, out=acc["min"][area])
+    np.fmax(acc["max"][area], values, out=acc["max"][area])
+    acc["neurons"][area] += 1
+    acc["first"][area] = min(acc["first"][area], neuron_index)
+
+
+def merge_area_accumulators(a, b):
+    """
+    Combines two accumulators over disjoint sets of neurons (Chan et al.), giving the
+    same statistics as a single accumulator over all of them.
+    """
+    count = a["count"] + b["count"]
+    delta = b["mean"] - a["mean"]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        weight = np.where(count > 0, b["count"] / count, 0.0)
+        mean = a["mean"] + delta * weight
+        m2 = a["m2"] + b["m2"] + delta ** 2 * a["count"] * weight
+    return {
+        "count": count,
+        "mean": mean,
+        "m2": m2,
+        "min": np.fmin(a["min"], b["min"]),
+        "max": np.fmax(a["max"], b["max"]),
+        "neurons": a["neurons"] + b["neurons"],
+        "first": np.minimum(a["first"], b["first"]),
+    }
+
+
+def area_accumulator_stats(acc):
+    """
+    Final statistics of an accumulator in the layout of group_stats (without quantiles):
+    'mean', 'std' (population), 'min', 'max' per (area, row, column) and 'count' neurons per area.
+    """
+    empty = acc["count"] == 0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        std = np.sqrt(acc["m2"] / acc["count"])
+    return {
+        "mean": np.where(empty, np.nan, acc["mean"]),
+        "std": np.where(empty, np.nan, std),
+        "min": np.where(empty, np.nan, acc["min"]),
+        "max": np.where(empty, np.nan, acc["max"]),
+        "count": acc["neurons"],
+    }
+
+
+def accumulate_area_part(input_dir, neuron_areas, num_areas, columns=None, row_stride=1, part=None,
+                         dtype=np.float32):
+    """
+    Streams the neurons of one part of a monitors directory into a new accumulator.
+    neuron_areas is a dense array mapping a monitor index to its area position (-1 to
+    skip the neuron). Values are read as dtype. Returns None if no neuron was added.
+    """
+    acc = None
+    for neuron_index, values in iter_neuron_values(input_dir, columns, row_stride, part, dtype):
+        area = neuron_areas[neuron_index] if 0 <= neuron_index < len(neuron_areas) else -1
+        if area < 0:
+            continue
+        if acc is None:
+            acc = new_area_accumulator(num_areas, *values.shape)
+        update_area_accumulator(acc, area, values, neuron_index)
+    return acc
+
+
+def stream_area_stats(input_dir, registry, columns=None, row_stride=1, workers=1, id_offset=MONITOR_ID_OFFSET,
+                      dtype=np.float32):
+    """
+    Per-area mean/std/min/max of monitor values at every row_stride-th row in one
+    streaming pass: memory is O(areas x rows x columns) however many neurons there are,
+    as the monitor files are parsed a chunk of rows at a time and folded in one neuron at
+    a time (see iter_neuron_values). Values are read as dtype (float64 for the JSON exports).
+    Neurons are mapped to areas with a registry.NeuronRegistry.
+    With workers > 1 the neurons are split over processes and the partial results merged.
+    Returns (area_names, stats) with areas ordered as in area_labels, or None.
+    """
+    areas = registry.areas
+    neuron_areas = registry.area_lookup()[id_offset:]
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(accumulate_area_part, input_dir, neuron_areas, len(areas),
+                                   columns, row_stride, (i, workers), dtype) for i in range(workers)]
+            parts = [future.result() for future in futures]
+    else:
+        parts = [accumulate_area_part(input_dir, neuron_areas, len(areas), columns, row_stride, None, dtype)]
+
+    parts = [acc for acc in parts if acc is not None]
+    if not parts:
+        return None
+    acc = parts[0]
+    for other in parts[1:]:
+        acc = merge_area_accumulators(acc, other)
+
+    # Areas without neurons are dropped; the rest follow the order of their first neuron
+    order = [k for k in np.argsort(acc["first"], kind='stable') if acc["neurons"][k] > 0]
+    stats = {name: values[order] for name, values in area_accumulator_stats(acc).items()}
+    return [areas[k] for k in order], stats
+
+
+def area_labels(neuron_indices, registry, id_offset=MONITOR_ID_OFFSET):
+    """
+    Labels monitor neuron indices with integer area positions.
+    Monitor file 0_<i>.csv belongs to neuron id i + id_offset in the registry.
+    Returns (labels, area_names); unmapped neurons get label -1 and the
+    areas are ordered by first appearance.
+    """
+    areas = registry.area_of(np.asarray(neuron_indices, dtype=np.int64) + id_offset)
+    present, first = np.unique(areas[areas >= 0], return_index=True)
+    present = present[np.argsort(first)]
+
+    area_pos = np.full(len(registry.areas), -1, dtype=np.int64)
+    area_pos[present] = np.arange(len(present))
+    labels = np.where(areas >= 0, area_pos[np.maximum(areas, 0)], -1)
+    return labels, [registry.areas[k] for k in present]
+
+
+def file_order_areas(neuron_indices, registry, id_offset=MONITOR_ID_OFFSET):
+    """
+    Area names by first appearance over the monitor files sorted by name rather than
+    by index (0_10.csv before 0_2.csv), the key order of the original JSON exporters.
+    """
+    neuron_indices = np.asarray(neuron_indices, dtype=np.int64)
+    by_name = np.argsort(neuron_indices.astype(str), kind='stable')
+    areas = registry.area_of(neuron_indices[by_name] + id_offset)
+    present, first = np.unique(areas[areas >= 0], return_index=True)
+    return [registry.areas[k] for k in present[np.argsort(first)]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a monitors directory into a memory-mapped store.")
+    parser.add_argument('input_dir', help='Path to the monitors directory of a simulation')
+    parser.add_argument('--stride', type=int, default=1, help='Keep every n-th row')
+    parser.add_argument('--columns', nargs='+', choices=MONITOR_COLUMNS, help='Columns to store (default: all)')
+    parser.add_argument('--dtype', choices=['float32', 'float64'], default='float32',
+                        help='Value type; the JSON exporters only use a float64 store (default: float32)')
+    parser.add_argument('--step-major', action='store_true',
+                        help='Also write a transposed copy for fast single-step snapshots')
+    args = parser.parse_args()
+
+    manifest = build_monitor_store(args.input_dir, args.columns, args.stride, args.dtype)
+    if manifest is not None and args.step_major:
+        build_step_major_store(manifest["store_dir"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,939 @@
+import io
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from monitors import MONITOR_ID_OFFSET, ROW_STEP, load_monitor_block, monitors_dir_of
+from ranks import area_sort_key, discover_ranks, global_ids, local_ids, map_ranks, rank_offsets
+from registry import NeuronRegistry
+
+
+EDGE_CACHE_VERSION = 1
+
+
+def edge_cache_path(network_file):
+    """Binary cache of <dir>/<name>.txt lives in <dir>/.edge_cache/<name>.npz."""
+    directory, name = os.path.split(os.path.abspath(network_file))
+    return os.path.join(directory, ".edge_cache", os.path.splitext(name)[0] + ".npz")
+
+
+def parse_edge_columns(network_file):
+    """
+    Parses a network text file in one vectorized pass.
+    Returns a dict of typed columns: source_rank, source_id, target_rank, target_id
+    (int32) and weight (float32), holding the five columns of the file in order.
+    Null bytes, comments and malformed lines are dropped.
+    """
+    with open(network_file, 'rb') as f:
+        data = f.read()
+    if b'\x00' in data:
+        data = data.replace(b'\x00', b'')
+
+    try:
+        df = pd.read_csv(io.BytesIO(data), sep=r'\s+', comment='#', header=None,
+                         names=range(5), usecols=range(5), on_bad_lines='skip', engine='c')
+    except pd.errors.EmptyDataError:
+        df = pd.DataFrame(columns=range(5))
+
+    for col in range(5):
+        if not pd.api.types.is_numeric_dtype(df[col]):
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+    valid = df[1].notna() & df[3].notna()
+    if not valid.all():
+        print(f"Warning: Skipping {int((~valid).sum())} malformed lines in {network_file}")
+        df = df[valid]
+
+    return {
+        "source_rank": df[0].fillna(0).to_numpy(dtype=np.int32),
+        "source_id": df[1].to_numpy(dtype=np.int32),
+        "target_rank": df[2].fillna(0).to_numpy(dtype=np.int32),
+        "target_id": df[3].to_numpy(dtype=np.int32),
+        "weight": df[4].fillna(1).to_numpy(dtype=np.float32),
+    }
+
+
+def load_edge_cache(network_file, stat):
+    """Returns the cached columns if the cache matches the file's path, size and mtime, else None."""
+    cache_file = edge_cache_path(network_file)
+    if not os.path.exists(cache_file):
+        return None
+    try:
+        with np.load(cache_file) as cached:
+            key = cached["key"]
+            if (int(key[0]) != EDGE_CACHE_VERSION or int(key[1]) != stat.st_size
+                    or int(key[2]) != stat.st_mtime_ns
+                    or str(cached["path"]) != os.path.abspath(network_file)):
+                return None
+            return {name: cached[name] for name in
+                    ("source_rank", "source_id", "target_rank", "target_id", "weight")}
+    except Exception as e:
+        print(f"Ignoring unreadable edge cache {cache_file}: {e}")
+        return None
+
+
+def save_edge_cache(network_file, stat, columns):
+    """Writes the binary cache next to the network file; failures only print a warning."""
+    cache_file = edge_cache_path(network_file)
+    tmp_file = cache_file + ".tmp"
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        with open(tmp_file, 'wb') as f:
+            np.savez(f, key=np.array([EDGE_CACHE_VERSION, stat.st_size, stat.st_mtime_ns], dtype=np.int64),
+                     path=np.array(os.path.abspath(network_file)), **columns)
+        os.replace(tmp_file, cache_file)
+    except OSError as e:
+        print(f"Could not write edge cache {cache_file}: {e}")
+
+
+def read_edge_columns(network_file, use_cache=True):
+    """
+    Reads all columns of a network file, from its binary cache when one is valid.
+    The first text parse writes the cache. Returns None if the file does not exist.
+    """
+    if not os.path.exists(network_file):
+        print(f"Network file not found: {network_file}")
+        return None
+
+    stat = os.stat(network_file)
+    if use_cache:
+        columns = load_edge_cache(network_file, stat)
+        if columns is not None:
+            return columns
+
+    columns = parse_edge_columns(network_file)
+    if use_cache:
+        save_edge_cache(network_file, stat, columns)
+    return columns
+
+
+def read_edge_list(network_file, use_cache=True):
+    """
+    Reads a rank_<r>_step_<t>_{in,out}_network.txt file.
+
+    Returns (source_ids, target_ids, weights): the neuron ids of the second and
+    fourth column as int32 and the weight column as float32, or None if the
+    file does not exist. Repeat reads load the binary cache instead of the text.
+    """
+    columns = read_edge_columns(network_file, use_cache)
+    if columns is None:
+        return None
+    return columns["source_id"], columns["target_id"], columns["weight"]
+
+
+def build_area_lookup(neuron_ids, neuron_areas):
+    """
+    Builds a dense int32 lookup array so that lookup[neuron_id] is the position of
+    that neuron's area in the returned area list (sorted numerically).
+    Ids without an area map to -1. Returns (lookup, areas).
+    """
+    neuron_ids = np.asarray(neuron_ids, dtype=np.int64)
+    areas, area_index = np.unique(np.asarray(neuron_areas, dtype=str), return_inverse=True)
+    order = sorted(range(len(areas)), key=lambda i: area_sort_key(areas[i]))
+    rank = np.empty(len(areas), dtype=np.int32)
+    rank[order] = np.arange(len(areas), dtype=np.int32)
+
+    lookup = np.full(int(neuron_ids.max()) + 1 if len(neuron_ids) else 0, -1, dtype=np.int32)
+    lookup[neuron_ids] = rank[area_index]
+    return lookup, [str(areas[i]) for i in order]
+
+
+def read_area_lookup(positions_file):
+    """
+    Reads the neuron id and area columns of a positions file in bulk and
+    returns (lookup, areas) as built by build_area_lookup.
+    """
+    df = pd.read_csv(positions_file, sep=r'\s+', comment='#', header=None,
+                     usecols=[0, 4], engine='c')
+    return build_area_lookup(df[0].to_numpy(), df[4].to_numpy())
+
+
+def map_to_areas(neuron_ids, lookup):
+    """Translates neuron ids to area positions; ids outside the lookup give -1."""
+    neuron_ids = np.asarray(neuron_ids)
+    in_range = (neuron_ids >= 0) & (neuron_ids < len(lookup))
+    area_ids = np.full(len(neuron_ids), -1, dtype=np.int32)
+    area_ids[in_range] = lookup[neuron_ids[in_range]]
+    return area_ids
+
+
+def area_pair_counts(source_ids, target_ids, lookup, num_areas):
+    """
+    Counts directed connections between areas with a single bincount.
+    Returns an int64 (num_areas x num_areas) matrix indexed [source area, target area]
+    and the number of edges whose neurons are not in the lookup.
+    """
+    source_areas = map_to_areas(source_ids, lookup)
+    target_areas = map_to_areas(target_ids, lookup)
+    known = (source_areas >= 0) & (target_areas >= 0)
+    pair_index = source_areas[known].astype(np.int64) * num_areas + target_areas[known]
+    counts = np.bincount(pair_index, minlength=num_areas * num_areas).reshape(num_areas, num_areas)
+    return counts, int((~known).sum())
+
+
+def symmetric_counts(counts):
+    """Folds a directed area matrix into undirected counts; self-connections are counted once."""
+    sym = counts + counts.T
+    np.fill_diagonal(sym, np.diag(counts))
+    return sym
+
+
+def area_totals(counts):
+    """
+    Connections touching each area, counting both ends of every edge.
+    Works on a single (areas x areas) matrix or a (timesteps x areas x areas) tensor.
+    """
+    return counts.sum(axis=-2) + counts.sum(axis=-1)
+
+
+NETWORK_STEPS = range(0, 1000001, 10000)  # Network snapshots are written every 10000 steps
+
+
+def network_file_path(simulation_path, step, direction='out', rank=0):
+    """Path of the rank_<r>_step_<t>_<direction>_network.txt snapshot of a simulation."""
+    return os.path.join(simulation_path, "network", f"rank_{rank}_step_{step}_{direction}_network.txt")
+
+
+def read_global_area_lookup(simulation_path, workers=None):
+    """
+    Loads the neuron registry of all ranks and returns (lookup, areas, offsets):
+    the area lookup of build_area_lookup indexed by global neuron id, and the rank offsets.
+    """
+    registry = NeuronRegistry.load(simulation_path, workers=workers)
+    if registry is None:
+        return None, None, None
+    return registry.area_lookup(), registry.areas, registry.offsets
+
+
+def read_global_edges(simulation_path, step, direction='out', offsets=None, workers=None, use_archive=True):
+    """
+    Reads the <direction> network snapshot of every rank in parallel and returns
+    (source_ids, target_ids, weights) with global neuron ids, or None if no rank wrote one.
+    Each edge's rank columns select the offset of its source and target.
+    If the simulation has a snapshot archive holding the step, it is read from there.
+    """
+    archive_file = snapshot_archive_path(simulation_path, direction)
+    if use_archive and os.path.exists(archive_file):
+        if archive_is_current(archive_file, simulation_path, [step]):
+            edges = read_archived_edges(archive_file, step)
+            if edges is not None:
+                return edges
+        else:
+            print(f"Snapshot archive {archive_file} is out of date, reading step {step} from text")
+
+    ranks = discover_ranks(simulation_path) or [0]
+    if offsets is None:
+        offsets = rank_offsets(simulation_path, ranks)
+
+    def read_rank(rank):
+        network_file = network_file_path(simulation_path, step, direction, rank)
+        return read_edge_columns(network_file) if os.path.exists(network_file) else None
+
+    parts = [columns for columns in map_ranks(read_rank, ranks, workers) if columns is not None]
+    if not parts:
+        print(f"Network file not found: {network_file_path(simulation_path, step, direction)}")
+        return None
+    if len(ranks) == 1:
+        return parts[0]["source_id"], parts[0]["target_id"], parts[0]["weight"]
+
+    def joined(name):
+        return np.concatenate([columns[name] for columns in parts])
+    source_ids = global_ids(offsets, joined("source_rank"), joined("source_id"))
+    target_ids = global_ids(offsets, joined("target_rank"), joined("target_id"))
+    return source_ids, target_ids, joined("weight")
+
+
+CONNECTIVITY_TENSOR_VERSION = 1
+
+
+def connectivity_tensor_path(simulation_path):
+    """The precomputed area connectivity of a simulation lives in <sim>/area_connectivity.npz."""
+    return os.path.join(simulation_path, "area_connectivity.npz")
+
+
+def network_sources_key(simulation_path, version, time_steps=NETWORK_STEPS):
+    """
+    version, then the (files, size, newest mtime) of the out_network snapshots of every
+    step (see snapshot_source_key) and the size and mtime of the out snapshot archive, if any.
+    Identifies the sources of the files derived from the out snapshots.
+    """
+    ranks = discover_ranks(simulation_path) or [0]
+    key = [version]
+    for t in time_steps:
+        key += snapshot_source_key(simulation_path, t, 'out', ranks)
+    archive_file = snapshot_archive_path(simulation_path, 'out')
+    if os.path.exists(archive_file):
+        stat = os.stat(archive_file)
+        key += [stat.st_size, stat.st_mtime_ns]
+    return np.array(key, dtype=np.int64)
+
+
+def connectivity_tensor_key(simulation_path, time_steps=NETWORK_STEPS):
+    """The network_sources_key of the connectivity tensor."""
+    return network_sources_key(simulation_path, CONNECTIVITY_TENSOR_VERSION, time_steps)
+
+
+def save_network_cache(output_file, key, registry, data, compressed=False):
+    """Writes data with its source key and the registry digest to output_file, through a temporary file."""
+    tmp_file = output_file + ".tmp"
+    with open(tmp_file, 'wb') as f:
+        (np.savez_compressed if compressed else np.savez)(f, key=key, registry=np.array(registry.digest()), **data)
+    os.replace(tmp_file, output_file)
+
+
+def load_network_cache(cache_file, key, registry, label):
+    """
+    Returns the arrays saved by save_network_cache, or None if the file is missing or unreadable,
+    or its key or registry digest differ from the given ones (it is then out of date).
+    """
+    if not os.path.exists(cache_file):
+        return None
+    try:
+        with np.load(cache_file) as data:
+            if ("key" in data.files and registry is not None and np.array_equal(data["key"], key)
+                    and str(data["registry"]) == registry.digest()):
+                return {name: data[name] for name in data.files if name not in ("key", "registry")}
+        print(f"{label} {cache_file} is out of date")
+    except Exception as e:
+        print(f"Ignoring unreadable {label.lower()} {cache_file}: {e}")
+    return None
+
+
+def build_connectivity_tensor(simulation_path, time_steps=NETWORK_STEPS, output_file=None):
+    """
+    Counts area-to-area connections of every out_network snapshot in one pass,
+    over the snapshots of all ranks.
+
+    Saves and returns a dict with 'steps' (the snapshots found), 'areas' (names in
+    index order), 'directed' as int32[timesteps, areas, areas] indexed
+    [t, source area, target area], 'undirected', its symmetric fold, and 'prefix',
+    the prefix sums of 'undirected' over time (see prefix_sums). The file also stores the
+    connectivity_tensor_key of its sources and the digest of the registry it was counted with.
+    """
+    key = connectivity_tensor_key(simulation_path, time_steps)
+    registry = NeuronRegistry.load(simulation_path)
+    if registry is None:
+        return None
+    area_lookup, areas, offsets = registry.area_lookup(), registry.areas, registry.offsets
+    num_areas = len(areas)
+
+    steps, matrices = [], []
+    for t, edges in iter_global_edges(simulation_path, time_steps, offsets=offsets):
+        counts, _ = area_pair_counts(edges[0], edges[1], area_lookup, num_areas)
+        steps.append(t)
+        matrices.append(counts.astype(np.int32))
+
+    directed = np.stack(matrices) if matrices else np.zeros((0, num_areas, num_areas), dtype=np.int32)
+    undirected = directed + directed.transpose(0, 2, 1)
+    diagonal = np.arange(num_areas)
+    undirected[:, diagonal, diagonal] = directed[:, diagonal, diagonal]
+
+    tensor = {
+        "steps": np.array(steps, dtype=np.int64),
+        "areas": np.array(areas),
+        "directed": directed,
+        "undirected": undirected,
+        "prefix": prefix_sums(undirected),
+    }
+    output_file = output_file or connectivity_tensor_path(simulation_path)
+    save_network_cache(output_file, key, registry, tensor)
+    print(f"Connectivity tensor {directed.shape} saved to {output_file}")
+    return tensor
+
+
+def load_connectivity_tensor(simulation_path, build=True):
+    """
+    Loads the precomputed connectivity tensor of a simulation. It is up to date while the
+    network snapshots (connectivity_tensor_key) and the registry digest match the ones it was
+    built from; a missing or outdated tensor is rebuilt if build is True. Returns None if unavailable.
+    """
+    tensor = load_network_cache(connectivity_tensor_path(simulation_path), connectivity_tensor_key(simulation_path),
+                                NeuronRegistry.load(simulation_path), "Connectivity tensor")
+    if tensor is not None:
+        return tensor
+    return build_connectivity_tensor(simulation_path) if build else None
+
+
+EDGE_KEY_BITS = 32
+
+
+def edge_keys(source_ids, target_ids):
+    """
+    Packs (source, target) neuron id pairs into sorted, unique int64 keys
+    (source << 32 | target), so a snapshot's edge set is one sorted array.
+    """
+    keys = (np.asarray(source_ids, dtype=np.int64) << EDGE_KEY_BITS) | np.asarray(target_ids, dtype=np.int64)
+    return np.unique(keys)
+
+
+def unpack_edge_keys(keys):
+    """Splits packed edge keys back into (source_ids, target_ids)."""
+    keys = np.asarray(keys, dtype=np.int64)
+    return keys >> EDGE_KEY_BITS, keys & ((1 << EDGE_KEY_BITS) - 1)
+
+
+def sorted_difference(a, b):
+    """Keys of the sorted unique array a that are not in the sorted unique array b (merged with searchsorted)."""
+    if len(b) == 0:
+        return a
+    pos = np.minimum(np.searchsorted(b, a), len(b) - 1)
+    return a[b[pos] != a]
+
+
+def edge_delta(previous_keys, current_keys):
+    """(added, removed) edge keys between two snapshots given as sorted key arrays."""
+    return sorted_difference(current_keys, previous_keys), sorted_difference(previous_keys, current_keys)
+
+
+EDGE_CHURN_VERSION = 1
+
+
+def edge_churn_path(simulation_path):
+    """The synapse formation/pruning counts of a simulation live in <sim>/edge_churn.npz."""
+    return os.path.join(simulation_path, "edge_churn.npz")
+
+
+def build_edge_churn(simulation_path, time_steps=NETWORK_STEPS, output_file=None):
+    """
+    Compares every out_network snapshot with the previous one: each snapshot is
+    turned into sorted edge keys once, and the synapses formed and pruned in between
+    are found by sorted set difference. Counts are aggregated per area pair and per neuron.
+
+    Saves and returns a dict with 'steps' (the snapshots found), 'areas' and 'neuron_ids'
+    (the index orders), for every interval i between steps[i] and steps[i + 1]:
+    'formed' and 'pruned' as int32[intervals, areas, areas] indexed [i, source area,
+    target area], 'edges' (the connections at steps[i], same layout) and per neuron
+    'formed_out', 'pruned_out', 'formed_in', 'pruned_in' as int32[intervals, neurons].
+    Like the connectivity tensor, the file also stores the network_sources_key and the
+    registry digest it was built from.
+    """
+    key = network_sources_key(simulation_path, EDGE_CHURN_VERSION, time_steps)
+    registry = NeuronRegistry.load(simulation_path)
+    if registry is None:
+        return None
+    area_lookup, areas = registry.area_lookup(), registry.areas
+    num_areas, num_neurons = len(areas), len(registry)
+
+    def area_counts(keys):
+        source_ids, target_ids = unpack_edge_keys(keys)
+        counts, _ = area_pair_counts(source_ids, target_ids, area_lookup, num_areas)
+        return counts.astype(np.int32)
+
+    def neuron_counts(neuron_ids):
+        rows = registry.rows(neuron_ids)
+        return np.bincount(rows[rows >= 0], minlength=num_neurons).astype(np.int32)
+
+    steps, previous = [], None
+    result = {name: [] for name in ("formed", "pruned", "edges", "formed_out", "pruned_out",
+                                    "formed_in", "pruned_in")}
+    for t, edges in iter_global_edges(simulation_path, time_steps, offsets=registry.offsets):
+        keys = edge_keys(edges[0], edges[1])
+        if previous is not None:
+            added, removed = edge_delta(previous, keys)
+            result["formed"].append(area_counts(added))
+            result["pruned"].append(area_counts(removed))
+            result["edges"].append(area_counts(previous))
+            for name, delta in (("formed", added), ("pruned", removed)):
+                source_ids, target_ids = unpack_edge_keys(delta)
+                result[f"{name}_out"].append(neuron_counts(source_ids))
+                result[f"{name}_in"].append(neuron_counts(target_ids))
+        steps.append(t)
+        previous = keys
+
+    churn = {
+        "steps": np.array(steps, dtype=np.int64),
+        "areas": np.array(areas),
+        "neuron_ids": registry.ids,
+    }
+    for name, values in result.items():
+        shape = (0, num_areas, num_areas) if name in ("formed", "pruned", "edges") else (0, num_neurons)
+        churn[name] = np.stack(values) if values else np.zeros(shape, dtype=np.int32)
+
+    output_file = output_file or edge_churn_path(simulation_path)
+    save_network_cache(output_file, key, registry, churn, compressed=True)
+    print(f"Edge churn over {len(churn['formed'])} intervals saved to {output_file}")
+    return churn
+
+
+def load_edge_churn(simulation_path, build=True):
+    """
+    Loads the edge churn of a simulation. Like the connectivity tensor it is up to date
+    while its network sources and registry digest match; a missing or outdated churn is
+    rebuilt if build is True. Returns None if unavailable.
+    """
+    churn = load_network_cache(edge_churn_path(simulation_path),
+                               network_sources_key(simulation_path, EDGE_CHURN_VERSION),
+                               NeuronRegistry.load(simulation_path), "Edge churn")
+    if churn is not None:
+        return churn
+    return build_edge_churn(simulation_path) if build else None
+
+
+def churn_rates(churn):
+    """
+    Per-interval formation and pruning rates per area pair: synapses formed (pruned)
+    between two snapshots per connection present at the first one, NaN where there
+    were none. Returns {'formation', 'pruning'} as float arrays in the 'formed' layout.
+    """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return {
+            "formation": np.where(churn["edges"] > 0, churn["formed"] / churn["edges"], np.nan),
+            "pruning": np.where(churn["edges"] > 0, churn["pruned"] / churn["edges"], np.nan),
+        }
+
+
+def weighted_edge_keys(source_ids, target_ids, weights):
+    """
+    Sorted unique edge keys of a snapshot with their weights; the weights of
+    repeated (source, target) pairs are summed. Returns (keys, weights).
+    """
+    keys = (np.asarray(source_ids, dtype=np.int64) << EDGE_KEY_BITS) | np.asarray(target_ids, dtype=np.int64)
+    keys, inverse = np.unique(keys, return_inverse=True)
+    summed = np.bincount(inverse, weights=weights, minlength=len(keys)).astype(np.float32)
+    return keys, summed
+
+
+def encode_keys(keys):
+    """Gap encoding of sorted edge keys (first key, then differences), which compresses well."""
+    return np.diff(np.asarray(keys, dtype=np.int64), prepend=np.int64(0))
+
+
+def decode_keys(gaps):
+    """Inverse of encode_keys."""
+    return np.cumsum(gaps, dtype=np.int64)
+
+
+ARCHIVE_KEYFRAME_INTERVAL = 10
+
+
+def snapshot_archive_path(simulation_path, direction='out'):
+    """The delta-encoded snapshots of a simulation live in <sim>/network/<direction>_archive.npz."""
+    return os.path.join(simulation_path, "network", f"{direction}_archive.npz")
+
+
+def snapshot_source_key(simulation_path, step, direction='out', ranks=None):
+    """(files, total size, newest mtime) of the <direction> text snapshots of all ranks at a step."""
+    files = size = mtime_ns = 0
+    for rank in ranks or discover_ranks(simulation_path) or [0]:
+        network_file = network_file_path(simulation_path, step, direction, rank)
+        if os.path.exists(network_file):
+            stat = os.stat(network_file)
+            files, size, mtime_ns = files + 1, size + stat.st_size, max(mtime_ns, stat.st_mtime_ns)
+    return files, size, mtime_ns
+
+
+def archive_is_current(archive_file, simulation_path, steps):
+    """
+    True if the archive holds the given steps as their text snapshots are now: the size and
+    mtime recorded for each step match, and no step it lacks has a text snapshot. Steps whose
+    text files were deleted after archiving are taken from the archive.
+    """
+    try:
+        with np.load(archive_file) as archive:
+            if "sources" not in archive.files:
+                return False
+            direction = str(archive["direction"])
+            recorded = dict(zip(archive["steps"].tolist(), map(tuple, archive["sources"].tolist())))
+    except Exception as e:
+        print(f"Ignoring unreadable snapshot archive {archive_file}: {e}")
+        return False
+    ranks = discover_ranks(simulation_path) or [0]
+    for t in steps:
+        current = snapshot_source_key(simulation_path, t, direction, ranks)
+        if current[0] and recorded.get(t) != current:
+            return False
+    return True
+
+
+def build_snapshot_archive(simulation_path, direction='out', time_steps=NETWORK_STEPS,
+                           keyframe_interval=ARCHIVE_KEYFRAME_INTERVAL, output_file=None):
+    """
+    Converts the <direction> network text snapshots of all ranks into one archive:
+    every keyframe_interval-th snapshot found is stored in full, the others as the
+    sorted edge keys removed and added (with their weights) since the previous one.
+    A weight change is stored as a removal plus an addition. Keys are gap encoded and
+    the archive is zip-compressed, so unchanged synapses cost nothing after a keyframe.
+    Returns a summary dict, or None if no snapshot was found.
+    """
+    registry = NeuronRegistry.load(simulation_path)
+    offsets = registry.offsets if registry is not None else None
+
+    ranks = discover_ranks(simulation_path) or [0]
+    arrays, steps, sources = {}, [], []
+    previous_keys = previous_weights = None
+    for t in time_steps:
+        source_key = snapshot_source_key(simulation_path, t, direction, ranks)
+        edges = read_global_edges(simulation_path, t, direction, offsets, use_archive=False)
+        if edges is None:
+            continue
+        keys, weights = weighted_edge_keys(*edges)
+        i = len(steps)
+        if i % keyframe_interval == 0:
+            arrays[f"keys_{i}"] = encode_keys(keys)
+            arrays[f"weights_{i}"] = weights
+        else:
+            # An edge is unchanged if its key and weight both appear in the previous snapshot
+            pos = np.minimum(np.searchsorted(previous_keys, keys), max(len(previous_keys) - 1, 0))
+            kept = ((previous_keys[pos] == keys) & (previous_weights[pos] == weights)
+                    if len(previous_keys) else np.zeros(len(keys), dtype=bool))
+            pos = np.minimum(np.searchsorted(keys, previous_keys), max(len(keys) - 1, 0))
+            stays = ((keys[pos] == previous_keys) & (weights[pos] == previous_weights)
+                     if len(keys) else np.zeros(len(previous_keys), dtype=bool))
+            arrays[f"removed_{i}"] = encode_keys(previous_keys[~stays])
+            arrays[f"added_{i}"] = encode_keys(keys[~kept])
+            arrays[f"added_weights_{i}"] = weights[~kept]
+        steps.append(t)
+        sources.append(source_key)
+        previous_keys, previous_weights = keys, weights
+
+    if not steps:
+        print(f"No {direction} network snapshots found in {simulation_path}")
+        return None
+
+    text_bytes = sum(size for _, size, _ in sources)
+    output_file = output_file or snapshot_archive_path(simulation_path, direction)
+    with open(output_file, 'wb') as f:
+        np.savez_compressed(f, steps=np.array(steps, dtype=np.int64),
+                            sources=np.array(sources, dtype=np.int64).reshape(-1, 3),
+                            keyframe_interval=np.int64(keyframe_interval), direction=np.array(direction),
+                            offsets=offsets if offsets is not None else np.zeros(1, dtype=np.int64),
+                            **arrays)
+    archive_bytes = os.path.getsize(output_file)
+    print(f"Archived {len(steps)} {direction} snapshots to {output_file}: "
+          f"{text_bytes / 1e6:.1f} MB of text -> {archive_bytes / 1e6:.1f} MB")
+    return {"file": output_file, "snapshots": len(steps), "text_bytes": text_bytes, "bytes": archive_bytes}
+
+
+def apply_edge_delta(keys, weights, removed, added, added_weights):
+    """Replays one archive delta on a sorted (keys, weights) snapshot."""
+    keep = np.ones(len(keys), dtype=bool)
+    if len(removed) and len(keys):
+        pos = np.minimum(np.searchsorted(keys, removed), len(keys) - 1)
+        keep[pos[keys[pos] == removed]] = False
+    keys = np.concatenate([keys[keep], added])
+    weights = np.concatenate([weights[keep], added_weights])
+    order = np.argsort(keys, kind='stable')
+    return keys[order], weights[order]
+
+
+def iter_archived_snapshots(archive_file, steps=None):
+    """
+    Yields (step, keys, weights) for the archived snapshots in step order, or only
+    for the given steps. Each delta is replayed once, starting from the keyframe
+    at or before the first requested step.
+    """
+    with np.load(archive_file) as archive:
+        archived = archive["steps"]
+        interval = int(archive["keyframe_interval"])
+        wanted = set(archived.tolist()) if steps is None else set(steps) & set(archived.tolist())
+        if not wanted:
+            return
+        first = int(np.searchsorted(archived, min(wanted)))
+        last = int(np.searchsorted(archived, max(wanted)))
+
+        keys = weights = None
+        for i in range(first - first % interval, last + 1):
+            if i % interval == 0:
+                keys, weights = decode_keys(archive[f"keys_{i}"]), archive[f"weights_{i}"]
+            else:
+                keys, weights = apply_edge_delta(keys, weights, decode_keys(archive[f"removed_{i}"]),
+                                                 decode_keys(archive[f"added_{i}"]), archive[f"added_weights_{i}"])
+            if int(archived[i]) in wanted:
+                yield int(archived[i]), keys, weights
+
+
+def read_archived_edges(archive_file, step):
+    """
+    Random access to one archived snapshot: replays from the nearest keyframe.
+    Returns (source_ids, target_ids, weights) with global ids, or None if the step is not archived.
+    """
+    for _, keys, weights in iter_archived_snapshots(archive_file, [step]):
+        source_ids, target_ids = unpack_edge_keys(keys)
+        return source_ids, target_ids, weights
+    return None
+
+
+def iter_global_edges(simulation_path, time_steps=NETWORK_STEPS, direction='out', offsets=None):
+    """
+    Yields (step, (source_ids, target_ids, weights)) for every snapshot found, for
+    whole-run sweeps: from the snapshot archive in one replay when it exists and
+    matches the text snapshots (see archive_is_current), otherwise from the text files of all ranks.
+    """
+    archive_file = snapshot_archive_path(simulation_path, direction)
+    if os.path.exists(archive_file):
+        if archive_is_current(archive_file, simulation_path, time_steps):
+            for t, keys, weights in iter_archived_snapshots(archive_file, time_steps):
+                yield t, unpack_edge_keys(keys) + (weights,)
+            return
+        print(f"Snapshot archive {archive_file} is out of date, reading the text snapshots "
+              f"(rebuild it with: python network.py archive)")
+    for t in time_steps:
+        edges = read_global_edges(simulation_path, t, direction, offsets, use_archive=False)
+        if edges is not None:
+            yield t, edges
+
+
+def write_network_text(output_file, source_ids, target_ids, weights, offsets, direction='out'):
+    """
+    Writes edges with global ids back in the rank_<r>_step_<t>_<direction>_network.txt layout.
+    The ids are in file column order, as read_global_edges returns them: an in_network file
+    lists the target of each connection first, so for direction 'in' source_ids are the targets.
+    """
+    first_ranks, first_local = local_ids(offsets, source_ids)
+    second_ranks, second_local = local_ids(offsets, target_ids)
+    table = pd.DataFrame({"first_rank": first_ranks, "first_id": first_local,
+                          "second_rank": second_ranks, "second_id": second_local,
+                          "weight": np.asarray(weights)})
+    first, second = ("source", "target") if direction == 'out' else ("target", "source")
+    with open(output_file, 'w') as f:
+        f.write(f"# <{first} rank> <{first} id> <{second} rank> <{second} id> <weight>\n")
+        table.to_csv(f, sep=' ', header=False, index=False, float_format='%g')
+
+
+def extract_snapshot_archive(archive_file, output_dir, steps=None):
+    """
+    Converts archived snapshots back to text files in output_dir, one
+    rank_0_step_<t>_<direction>_network.txt per step. Returns the files written.
+    """
+    with np.load(archive_file) as archive:
+        direction = str(archive["direction"])
+        offsets = archive["offsets"]
+    os.makedirs(output_dir, exist_ok=True)
+    written = []
+    for t, keys, weights in iter_archived_snapshots(archive_file, steps):
+        source_ids, target_ids = unpack_edge_keys(keys)
+        output_file = os.path.join(output_dir, f"rank_0_step_{t}_{direction}_network.txt")
+        write_network_text(output_file, source_ids, target_ids, weights, offsets, direction)
+        written.append(output_file)
+    return written
+
+
+DEGREE_SERIES_VERSION = 1
+
+
+def degree_series_path(simulation_path):
+    """The per-neuron degrees of every snapshot of a simulation live in <sim>/neuron_degrees.npz."""
+    return os.path.join(simulation_path, "neuron_degrees.npz")
+
+
+def build_degree_series(simulation_path, time_steps=NETWORK_STEPS, output_file=None):
+    """
+    Counts the connections of every neuron in every out_network snapshot with one
+    bincount per snapshot and direction.
+
+    Saves and returns a dict with 'steps' (the snapshots found), 'neuron_ids' (the column
+    order), 'out_degree' and 'in_degree' as int32[timesteps, neurons] (connections) and
+    'out_synapses' and 'in_synapses' (summed absolute weights, comparable to the
+    connected_axons / connected_dendrites monitor columns). Like the connectivity tensor,
+    the file also stores the network_sources_key and the registry digest it was built from.
+    """
+    key = network_sources_key(simulation_path, DEGREE_SERIES_VERSION, time_steps)
+    registry = NeuronRegistry.load(simulation_path)
+    if registry is None:
+        return None
+    num_neurons = len(registry)
+
+    def per_neuron(neuron_ids, weights=None):
+        rows = registry.rows(neuron_ids)
+        known = rows >= 0
+        counts = np.bincount(rows[known], weights=None if weights is None else np.abs(weights[known]),
+                             minlength=num_neurons)
+        return np.rint(counts).astype(np.int32)
+
+    steps = []
+    result = {name: [] for name in ("out_degree", "in_degree", "out_synapses", "in_synapses")}
+    for t, (source_ids, target_ids, weights) in iter_global_edges(simulation_path, time_steps,
+                                                                   offsets=registry.offsets):
+        result["out_degree"].append(per_neuron(source_ids))
+        result["in_degree"].append(per_neuron(target_ids))
+        result["out_synapses"].append(per_neuron(source_ids, weights))
+        result["in_synapses"].append(per_neuron(target_ids, weights))
+        steps.append(t)
+
+    degrees = {"steps": np.array(steps, dtype=np.int64), "neuron_ids": registry.ids}
+    for name, values in result.items():
+        degrees[name] = np.stack(values) if values else np.zeros((0, num_neurons), dtype=np.int32)
+
+    output_file = output_file or degree_series_path(simulation_path)
+    save_network_cache(output_file, key, registry, degrees, compressed=True)
+    print(f"Neuron degrees {degrees['out_degree'].shape} saved to {output_file}")
+    return degrees
+
+
+def load_degree_series(simulation_path, build=True):
+    """
+    Loads the per-neuron degree series of a simulation. Like the connectivity tensor it is
+    up to date while its network sources and registry digest match; a missing or outdated
+    series is rebuilt if build is True. Returns None if unavailable.
+    """
+    degrees = load_network_cache(degree_series_path(simulation_path),
+                                 network_sources_key(simulation_path, DEGREE_SERIES_VERSION),
+                                 NeuronRegistry.load(simulation_path), "Degree series")
+    if degrees is not None:
+        return degrees
+    return build_degree_series(simulation_path) if build else None
+
+
+def degree_snapshot(degrees, step, neuron_ids, name="out_degree"):
+    """Values of one degree series at step for the given neuron ids, as floats; NaN where unknown."""
+    neuron_ids = np.asarray(neuron_ids, dtype=np.int64)
+    values = np.full(len(neuron_ids), np.nan)
+    t = np.flatnonzero(degrees["steps"] == step)
+    if len(t) == 0:
+        return values
+    order = np.argsort(degrees["neuron_ids"])
+    sorted_ids = degrees["neuron_ids"][order]
+    pos = np.minimum(np.searchsorted(sorted_ids, neuron_ids), len(sorted_ids) - 1)
+    found = sorted_ids[pos] == neuron_ids
+    values[found] = degrees[name][t[0], order[pos[found]]]
+    return values
+
+
+def degree_consistency_report(simulation_path, degrees=None, monitors_dir=None, id_offset=MONITOR_ID_OFFSET,
+                              tolerance=0.5, max_listed=50):
+    """
+    Compares the connected_axons / connected_dendrites monitor columns with the synapse
+    counts of the network snapshots at every snapshot step. Monitor file <rank>_<i>.csv
+    belongs to neuron id i + id_offset. Returns a report dict with per-step mismatch counts
+    and the largest mismatches (|monitor - network| > tolerance), or None without data.
+    """
+    degrees = degrees if degrees is not None else load_degree_series(simulation_path)
+    if degrees is None or len(degrees["steps"]) == 0:
+        return None
+    monitors_dir = monitors_dir or monitors_dir_of(simulation_path)
+    # Only the monitor rows of the snapshot steps are read
+    stride = max(int(np.gcd.reduce(degrees["steps"])) // ROW_STEP, 1)
+    neuron_indices, block, _ = load_monitor_block(monitors_dir, ["connected_axons", "connected_dendrites"],
+                                                  row_stride=stride)
+    if block is None:
+        return None
+
+    neuron_ids = neuron_indices + id_offset
+    rows = degrees["steps"] // ROW_STEP // stride
+    in_range = rows < block.shape[1]
+    report = {"simulation": simulation_path, "tolerance": tolerance, "steps": [], "mismatches": []}
+    for column, (name, series) in enumerate((("connected_axons", "out_synapses"),
+                                             ("connected_dendrites", "in_synapses"))):
+        for t, row in zip(degrees["steps"][in_range], rows[in_range]):
+            network_values = degree_snapshot(degrees, t, neuron_ids, series)
+            monitor_values = block[:, row, column]
+            diff = monitor_values - network_values
+            bad = np.abs(diff) > tolerance
+            report["steps"].append({"step": int(t), "column": name, "neurons": int(np.isfinite(diff).sum()),
+                                    "mismatching": int(bad.sum()),
+                                    "max_abs_diff": float(np.nanmax(np.abs(diff))) if np.isfinite(diff).any() else None})
+            for i in np.flatnonzero(bad):
+                report["mismatches"].append({"step": int(t), "column": name, "neuron_id": int(neuron_ids[i]),
+                                             "monitor": float(monitor_values[i]),
+                                             "network": float(network_values[i])})
+
+    report["mismatches"].sort(key=lambda m: -abs(m["monitor"] - m["network"]))
+    report["total_mismatching"] = len(report["mismatches"])
+    report["mismatches"] = report["mismatches"][:max_listed]
+    return report
+
+
+def area_position(areas, area_number):
+    """Index of area 'area_<n>' in a tensor's area list."""
+    return list(areas).index(f"area_{area_number}")
+
+
+def pair_series(tensor, pairs):
+    """Undirected connection counts over time for (area, area) number pairs, as {pair: array}."""
+    return {
+        pair: tensor["undirected"][:, area_position(tensor["areas"], pair[0]), area_position(tensor["areas"], pair[1])]
+        for pair in pairs
+    }
+
+
+def prefix_sums(counts):
+    """Prefix sums over the time axis: int64[timesteps + 1, ...] with prefix[k] = counts[:k].sum(axis=0)."""
+    prefix = np.zeros((len(counts) + 1,) + counts.shape[1:], dtype=np.int64)
+    np.cumsum(counts, axis=0, out=prefix[1:])
+    return prefix
+
+
+def tensor_prefix(tensor):
+    """The 'prefix' sums of a tensor; computed (and kept in the dict) for tensors saved without them."""
+    if "prefix" not in tensor:
+        tensor["prefix"] = prefix_sums(tensor["undirected"])
+    return tensor["prefix"]
+
+
+def window_pair_counts(tensor, pairs, first, last):
+    """
+    Undirected connection counts of (area, area) number pairs summed over the snapshots
+    with first <= step <= last, as {pair: int}: two lookups in the prefix sums per pair.
+    """
+    prefix = tensor_prefix(tensor)
+    start = np.searchsorted(tensor["steps"], first, side='left')
+    stop = np.searchsorted(tensor["steps"], last, side='right')
+    counts = {}
+    for pair in pairs:
+        a, b = area_position(tensor["areas"], pair[0]), area_position(tensor["areas"], pair[1])
+        counts[pair] = int(prefix[stop, a, b] - prefix[start, a, b]) if stop > start else 0
+    return counts
+
+
+def cumulative_pair_counts(tensor, pairs, step):
+    """Undirected connection counts of (area, area) number pairs summed over all snapshots up to step."""
+    return window_pair_counts(tensor, pairs, np.iinfo(np.int64).min, step)
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Precompute network-derived data for simulations.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    tensor_parser = subparsers.add_parser('tensor', help='Build the area x area x time connectivity tensor')
+    tensor_parser.add_argument('simulations', nargs='+', help='Simulation directories (viz-<name>)')
+
+    churn_parser = subparsers.add_parser('churn', help='Count synapses formed and pruned between consecutive snapshots')
+    churn_parser.add_argument('simulations', nargs='+', help='Simulation directories (viz-<name>)')
+
+    archive_parser = subparsers.add_parser('archive', help='Convert the network text snapshots into a delta-encoded archive')
+    archive_parser.add_argument('simulations', nargs='+', help='Simulation directories (viz-<name>)')
+    archive_parser.add_argument('--direction', nargs='+', choices=['out', 'in'], default=['out', 'in'],
+                                help='Snapshot directions to archive (default: both)')
+    archive_parser.add_argument('--keyframe-interval', type=int, default=ARCHIVE_KEYFRAME_INTERVAL,
+                                help=f'Store every n-th snapshot in full (default: {ARCHIVE_KEYFRAME_INTERVAL})')
+
+    extract_parser = subparsers.add_parser('extract', help='Write archived snapshots back as text files')
+    extract_parser.add_argument('archive', help='Archive file (<sim>/network/<direction>_archive.npz)')
+    extract_parser.add_argument('output_dir', help='Directory for the text files')
+    extract_parser.add_argument('--steps', type=int, nargs='+', help='Steps to extract (default: all)')
+
+    degrees_parser = subparsers.add_parser('degrees', help='Per-neuron in/out degrees of every snapshot, checked against the monitors')
+    degrees_parser.add_argument('simulations', nargs='+', help='Simulation directories (viz-<name>)')
+    degrees_parser.add_argument('--tolerance', type=float, default=0.5,
+                                help='Largest accepted |monitor - network| difference (default: 0.5)')
+
+    args = parser.parse_args()
+    if args.command == 'tensor':
+        for simulation_path in args.simulations:
+            build_connectivity_tensor(simulation_path)
+    elif args.command == 'churn':
+        for simulation_path in args.simulations:
+            build_edge_churn(simulation_path)
+    elif args.command == 'degrees':
+        for simulation_path in args.simulations:
+            degrees = build_degree_series(simulation_path)
+            report = degree_consistency_report(simulation_path, degrees, tolerance=args.tolerance)
+            if report is None:
+                continue
+            report_file = os.path.join(simulation_path, "degree_consistency.json")
+            with open(report_file, 'w') as f:
+                json.dump(report, f, indent=2)
+            print(f"{report['total_mismatching']} neuron/step values differ between monitors and network; report saved to {report_file}")
+    elif args.command == 'archive':
+        for simulation_path in args.simulations:
+            for direction in args.direction:
+                build_snapshot_archive(simulation_path, direction, keyframe_interval=args.keyframe_interval)
+    elif args.command == 'extract':
+        written = extract_snapshot_archive(args.archive, args.output_dir, args.steps)
+        print(f"Wrote {len(written)} network files to {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,111 +2,59 @@
 
 import os
 import pandas as pd
-from tqdm import tqdm
 
-import pandas as pd
-import os
-from tqdm import tqdm  
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 
+from monitors import snapshot_frame
+from network import degree_snapshot, load_degree_series
+from registry import NeuronRegistry
 
 
-def read_csv_safely(file_path):
-    """
-    Reads a CSV file with predefined column names and adds a global step column.
-    """
-    column_names = [
-        "step", "fired", "fired_fraction", "activity", "dampening", 
-        "current_calcium", "target_calcium", "synaptic_input", 
-        "background_input", "grown_axons", "connected_axons", 
-        "grown_dendrites", "connected_dendrites"
-    ]
-
-    try:
-        df = pd.read_csv(file_path, delimiter=';', header=None, names=column_names, engine='python')
-        df['step'] = df['step'].astype(int)
-        df['global_step'] = df.index * 100
-
-        return df
-    except Exception as e:
-        print(f"Error reading file {file_path}: {e}")
-        return None
-
-def parse_positions_file(positions_file):
-    """
-    Parses the positions file to map neuron IDs to their corresponding areas.
-    """
-    neuron_area_map = {}
-    with open(positions_file, "r") as file:
-        for line in file:
-            if line.startswith("#") or not line.strip():
-                continue
-            parts = line.split()
-            neuron_id = parts[0]  # Local ID
-            area = parts[4]       # Area
-            neuron_area_map[neuron_id] = area
-    return neuron_area_map
-
-def extract_neuron_properties(data_dir, target_step, neuron_area_map):
+
+def extract_neuron_properties(data_dir, target_step, registry, degrees=None):
     """
-    Extracts calcium, growth, and connectivity properties for each neuron, with a progress bar.
+    Extracts calcium, growth, and connectivity properties for each neuron at the target step.
+    With a precomputed degree series (network.py degrees), the real in/out degree of each
+    neuron in the network snapshot is added.
+    Only one row per neuron is read.
     """
-    records = []
-
-    # Use tqdm to create a progress bar for the loop
-    for neuron_id, area in tqdm(neuron_area_map.items(), desc="Processing Neurons", unit="neuron"):
-        file_path = os.path.join(data_dir, f"0_{neuron_id}.csv")
-        if not os.path.exists(file_path):
-            print(f"File not found: {file_path}")
-            continue
-
-        df = read_csv_safely(file_path)
-        if df is None or df.empty:
-            print(f"No data found in file for Neuron {neuron_id}")
-            continue
-        
-        
-        # Debugging global_step availability
-        if target_step not in df['global_step'].values:
-            print(f"No data for Neuron {neuron_id} at global_step {target_step}")
-            continue
-
-        # Filter for the target global step
-        step_data = df[df['global_step'] == target_step]
+    columns = ["current_calcium", "fired_fraction", "grown_axons", "connected_axons",
+               "grown_dendrites", "connected_dendrites"]
+    step_data = snapshot_frame(data_dir, target_step, registry, columns)
 
-        if step_data.empty:
-            print(f"No data for Neuron {neuron_id} at global_step {target_step}")
-            continue
-
-        # Extract the row for the target step
-        row = step_data.iloc[0]
-        records.append({
-            'Area': int(area.split('_')[1]),
-            'Neuron_ID': neuron_id,
-            'Global Step': target_step,
-            'Calcium': row['current_calcium'],
-            'Firing Rate': row['fired_fraction'],
-            'Grown Axons': row['grown_axons'],
-            'Connected Axons': row['connected_axons'],
-            'Grown Dendrites': row['grown_dendrites'],
-            'Connected Dendrites': row['connected_dendrites'],
-            'Total Growth': float(row['grown_axons']) + float(row['grown_dendrites']),
-            'Total Connections': float(row['connected_axons']) + float(row['connected_dendrites'])
-        })
-
-    if not records:
+    if step_data.empty:
         print("No data found for the specified global step.")
-    return pd.DataFrame(records)
-
-
-
-
-def plot_combined_parallel_and_box(neuron_df, target_step, simulation,output_dir="plots"):
+        return pd.DataFrame()
+
+    neuron_df = pd.DataFrame({
+        'Area': step_data['Area'].str.split('_').str[1].astype(int),
+        'Neuron_ID': step_data['Neuron_ID'],
+        'Global Step': target_step,
+        'Calcium': step_data['current_calcium'],
+        'Firing Rate': step_data['fired_fraction'],
+        'Grown Axons': step_data['grown_axons'],
+        'Connected Axons': step_data['connected_axons'],
+        'Grown Dendrites': step_data['grown_dendrites'],
+        'Connected Dendrites': step_data['connected_dendrites'],
+        'Total Growth': step_data['grown_axons'] + step_data['grown_dendrites'],
+        'Total Connections': step_data['connected_axons'] + step_data['connected_dendrites']
+    }).reset_index(drop=True)
+
+    if degrees is not None and target_step in degrees['steps']:
+        neuron_df['Out Degree'] = degree_snapshot(degrees, target_step, neuron_df['Neuron_ID'], 'out_degree')
+        neuron_df['In Degree'] = degree_snapshot(degrees, target_step, neuron_df['Neuron_ID'], 'in_degree')
+    return neuron_df
+
+
+
+def plot_combined_parallel_and_box(neuron_df, target_step, simulation,output_dir="plots", output_file=None,
+                                   include_plotlyjs=True):
     """
     Combines a box plot for Calcium levels by Area and a parallel coordinates plot for averages per Area
     with normalized column scales and interactive filtering using buttons.
+    Written to output_file, by default Box_plot_<simulation>_step_<step>.html in output_dir.
     """
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
@@ -119,6 +67,8 @@ def plot_combined_parallel_and_box(neuron_df, target_step, simulation,output_dir
 
     # Select only numeric columns for averaging
     numeric_columns = ['Calcium', 'Firing Rate', 'Grown Axons', 'Grown Dendrites']
+    degree_columns = [col for col in ('Out Degree', 'In Degree') if col in neuron_df]
+    numeric_columns += degree_columns
     avg_df = neuron_df.groupby('Area', as_index=False)[numeric_columns].mean()
 
     # Create the box plot
@@ -159,6 +109,13 @@ def plot_combined_parallel_and_box(neuron_df, target_step, simulation,output_dir
                 values=avg_df['Grown Dendrites'],
                 range=[0, avg_df['Grown Dendrites'].max()]  # Scale between 0 and max
             ),
+        ] + [
+            dict(
+                label=col,
+                values=avg_df[col],
+                range=[0, avg_df[col].max()]  # Scale between 0 and max
+            )
+            for col in degree_columns
         ]
     )
 
@@ -271,38 +228,47 @@ def plot_combined_parallel_and_box(neuron_df, target_step, simulation,output_dir
 
 
     # Save the plot as an HTML file
-    output_file = os.path.join(output_dir, f"Box_plot_{simulation}_step_{target_step}.html")
-    combined_fig.write_html(output_file)
+    if output_file is None:
+        output_file = os.path.join(output_dir, f"Box_plot_{simulation}_step_{target_step}.html")
+    combined_fig.write_html(output_file, include_plotlyjs=include_plotlyjs)
     print(f"Interactive Combined Plot saved to {output_file}")
 
 
-simType = 'no-network'  # Change to your simulation type
-data_dir = f'/Users/joanacostaesilva/Desktop/Scientific Visualization and Virtual Reality /Project SVVR/viz-{simType}/monitors'
-positions_file = f'/Users/joanacostaesilva/Desktop/Scientific Visualization and Virtual Reality /Project SVVR/viz-{simType}/positions/rank_0_positions.txt'
 
+def main():
+    simType = 'no-network'  # Change to your simulation type
+    data_dir = f'/Users/joanacostaesilva/Desktop/Scientific Visualization and Virtual Reality /Project SVVR/viz-{simType}/monitors'
+    simulation_path = f'/Users/joanacostaesilva/Desktop/Scientific Visualization and Virtual Reality /Project SVVR/viz-{simType}'
+
+
+    base_dir = f"/Users/joanacostaesilva/Desktop/Scientific Visualization and Virtual Reality /Plasticity-brain-SVVR/visualisation_app/backend/uploads/{simType}"
+    plots_dir = os.path.join(base_dir, "plots")
 
-base_dir = f"/Users/joanacostaesilva/Desktop/Scientific Visualization and Virtual Reality /Plasticity-brain-SVVR/visualisation_app/backend/uploads/{simType}"
-plots_dir = os.path.join(base_dir, "plots")
+    # Create the directories if they don't exist
+    os.makedirs(plots_dir, exist_ok=True)
 
-# Create the directories if they don't exist
-os.makedirs(plots_dir, exist_ok=True)
+    # Load the neuron registry (cached after the first parse of the positions)
+    registry = NeuronRegistry.load(simulation_path)
+    # Real network degrees, if precomputed with "network.py degrees"
+    degrees = load_degree_series(simulation_path, build=False)
+
+    # Generate plots from 0 to 1,000,000 in steps of 10,000
+    for target_step in [0, 10000]:
+        neuron_df = extract_neuron_properties(data_dir, target_step, registry, degrees)
+
+        # Skip if no data found
+        if neuron_df is None or neuron_df.empty:
+            print(f"No data for step {target_step}. Skipping.")
+            continue
 
-# Parse positions file to create neuron-to-area mapping
-neuron_area_map = parse_positions_file(positions_file)
+        # Plot filename
+        output_file = os.path.join(plots_dir, f"plot1_{target_step}.html")
 
-# Generate plots from 0 to 1,000,000 in steps of 10,000
-for target_step in [0, 10000]:
-    neuron_df = extract_neuron_properties(data_dir, target_step, neuron_area_map)
+        plot_combined_parallel_and_box(neuron_df, target_step, simType, output_file=output_file)
 
-    # Skip if no data found
-    if neuron_df is None or neuron_df.empty:
-        print(f"No data for step {target_step}. Skipping.")
-        continue
 
-    # Plot filename
-    output_file = os.path.join(plots_dir, f"plot1_{target_step}.html")
-    
-    plot_combined_parallel_and_box(neuron_df, target_step, simType, output_dir=os.path.dirname(output_file))
+        print(f"Plot 1 generated for step {target_step}: {output_file}")
 
 
-    print(f"Plot 1 generated for step {target_step}: {output_file}")
+if __name__ == "__main__":
+    main()
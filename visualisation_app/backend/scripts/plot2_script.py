@@ -1,116 +1,60 @@
 # plot2_script.py
 
 import os
-from tqdm import tqdm
 import pandas as pd
 import numpy as np
 import matplotlib.colors as mcolors
 import plotly.graph_objects as go
-from tqdm import tqdm
 
-def parse_positions_file(positions_file):
-    """
-    Parses the positions file to map neuron IDs to their corresponding areas.
-    """
-    neuron_area_map = {}
-    with open(positions_file, "r") as file:
-        for line in file:
-            if line.startswith("#") or not line.strip():
-                continue
-            parts = line.split()
-            neuron_id = parts[0]  # Local neuron ID
-            area = parts[4]       # Area name
-            neuron_area_map[neuron_id] = area
-    return neuron_area_map
-
-def parse_network_file(network_file, neuron_area_map):
+from network import load_connectivity_tensor
+
+def connection_matrix_at(tensor, index):
     """
-    Parses the network_out file to count the number of connections between areas.
-    This version makes the connection matrix symmetrical.
+    Returns the symmetrical area connection matrix of one timestep of the
+    precomputed connectivity tensor as a DataFrame.
     """
-    from collections import defaultdict
-    area_connections = defaultdict(int)
-
-    with open(network_file, "r") as f:
-        for line in tqdm(f, desc="Parsing network file", unit="line"):
-            if line.startswith("#") or not line.strip():
-                continue
-            parts = line.split()
-            target_id = parts[1]  # Extract target neuron ID directly
-            source_id = parts[3]  # Extract source neuron ID directly
-
-            if target_id not in neuron_area_map:
-                print(f"Warning: Target neuron ID {target_id} is not in the area map.")
-            if source_id not in neuron_area_map:
-                print(f"Warning: Source neuron ID {source_id} is not in the area map.")
-
-            target_area = neuron_area_map.get(target_id)
-            source_area = neuron_area_map.get(source_id)
-
-            if target_area and source_area:
-                # Create a key that doesn't depend on direction
-                def area_key(a):
-                    return int(a.split('_')[1]) if '_' in a and a.split('_')[1].isdigit() else a
-
-                if area_key(source_area) < area_key(target_area):
-                    key = (source_area, target_area)
-                else:
-                    key = (target_area, source_area)
-                area_connections[key] += 1
-
-    # Sort the areas
-    areas = sorted(
-        set(neuron_area_map.values()),
-        key=lambda x: int(x.split('_')[1]) if '_' in x and x.split('_')[1].isdigit() else x
-    )
+    areas = [str(area) for area in tensor["areas"]]
+    return pd.DataFrame(tensor["undirected"][index], index=areas, columns=areas)
 
-    connection_matrix = pd.DataFrame(0, index=areas, columns=areas, dtype=int)
 
-    # Fill the matrix symmetrically
-    for (a1, a2), count in area_connections.items():
-        connection_matrix.loc[a1, a2] = count
-        connection_matrix.loc[a2, a1] = count
-
-    return connection_matrix
-
-
-def plot_correlation_matrix_ordered(connection_matrix, time_step, simulation, output_file=None):
-    """
-    Plots the correlation matrix as an interactive heatmap with Plotly.
-    Only displays the lower triangular part (excluding diagonal).
-    Ensures square cells by linking axis scales.
-    """
-    # Ensure correct ordering of areas
+def ordered_labels(areas):
+    """Area order (numeric part) and the numeric axis labels of a list of area names."""
     ordered_areas = sorted(
-        connection_matrix.index,
+        areas,
         key=lambda x: int(x.split('_')[1]) if '_' in x and x.split('_')[1].isdigit() else x
     )
-    connection_matrix = connection_matrix.reindex(index=ordered_areas, columns=ordered_areas, fill_value=0)
-
     # Format area labels to show only the numeric part
     formatted_labels = [f"{int(area.split('_')[1])}" if '_' in area else area for area in ordered_areas]
+    return ordered_areas, formatted_labels
+
+
+def lower_triangle(matrices):
+    """
+    Float copy of one (areas x areas) or a stack of (steps x areas x areas) matrices with
+    the upper triangle including the diagonal set to NaN, plus the max of the rest (per matrix).
+    """
+    values = np.asarray(matrices)
+    upper = np.triu(np.ones(values.shape[-2:], dtype=bool))
+    masked = values.astype(float)
+    masked[..., upper] = np.nan
+    # Synapse counts are never negative, so 0 is also the max of an empty lower triangle
+    vmax = values.max(axis=(-2, -1), where=~upper, initial=0).astype(float)
+    return masked, vmax
 
-    # Create a mask for upper triangle including diagonal
-    import numpy as np
-    mask = np.triu(np.ones_like(connection_matrix, dtype=bool))
-    masked_values = connection_matrix.where(~mask, np.nan)
 
-    # Define a color scale suitable for a dark theme
-    colors = ["#000000", "#003f5c", "#2c7fb8", "#7fcdbb"]  # dark to lighter tealish-blue
-    colorscale = [[i/(len(colors)-1), c] for i, c in enumerate(colors)]
+def heatmap_title(simulation, time_step):
+    return f'{simulation.capitalize()} Simulation @ Time Step {time_step}'
 
-    # Determine vmin, vmax excluding NaNs
-    valid_values = masked_values.stack()
-    vmin = 0
-    vmax = valid_values.max() if not valid_values.empty else 0
 
+def heatmap_figure(z, labels, zmax, title):
+    """The plot 2 heatmap figure: lower-triangle synapse counts between areas on a dark theme."""
     fig = go.Figure(data=go.Heatmap(
-        z=masked_values.values,
-        x=formatted_labels,
-        y=formatted_labels,
+        z=z,
+        x=labels,
+        y=labels,
         colorscale='YlOrRd',
-        zmin=vmin,
-        zmax=vmax,
+        zmin=0,
+        zmax=zmax,
         hoverongaps=False,
         colorbar=dict(
             title="Number of Synapses",
@@ -125,7 +69,7 @@ def plot_correlation_matrix_ordered(connection_matrix, time_step, simulation, ou
 
     fig.update_layout(
         title=dict(
-            text=f'{simulation.capitalize()} Simulation @ Time Step {time_step}',
+            text=title,
             font=dict(color='white', size=24)
         ),
         xaxis=dict(
@@ -155,42 +99,135 @@ def plot_correlation_matrix_ordered(connection_matrix, time_step, simulation, ou
         margin=dict(l=50, r=50, t=80, b=50),
         font=dict(size=20)
     )
+    return fig
+
+
+def plot_correlation_matrix_ordered(connection_matrix, time_step, simulation, output_file=None):
+    """
+    Plots the correlation matrix as an interactive heatmap with Plotly.
+    Only displays the lower triangular part (excluding diagonal).
+    Ensures square cells by linking axis scales.
+    """
+    # Ensure correct ordering of areas
+    ordered_areas, formatted_labels = ordered_labels(connection_matrix.index)
+    connection_matrix = connection_matrix.reindex(index=ordered_areas, columns=ordered_areas, fill_value=0)
+
+    # Mask the upper triangle including diagonal; colors run from 0 to the max of the rest
+    masked_values, vmax = lower_triangle(connection_matrix.values)
+    fig = heatmap_figure(masked_values, formatted_labels, vmax.item(), heatmap_title(simulation, time_step))
 
     if output_file:
         fig.write_html(output_file)
         print(f"Interactive correlation plot saved to {output_file}")
 
 
+def tensor_heatmaps(tensor):
+    """Area labels and the masked lower-triangle matrices and color maxima of every tensor step."""
+    areas = [str(area) for area in tensor["areas"]]
+    ordered_areas, formatted_labels = ordered_labels(areas)
+    order = [areas.index(area) for area in ordered_areas]
+    masked, vmax = lower_triangle(tensor["undirected"][:, order][:, :, order])
+    return formatted_labels, masked, vmax
+
+
+def render_batch(tensor, simulation, plots_dir, include_plotlyjs='directory', steps=None):
+    """
+    Writes plot2_<step>.html for every tensor step (or only those in steps) from one
+    figure whose heatmap data and title are swapped per step. include_plotlyjs='directory'
+    writes plotly.min.js once next to the files, 'cdn' loads it from the Plotly CDN.
+    Returns the files written.
+    """
+    labels, masked, vmax = tensor_heatmaps(tensor)
+    if len(masked) == 0:
+        return []
+    fig = heatmap_figure(masked[0], labels, vmax[0].item(), heatmap_title(simulation, tensor["steps"][0]))
+    heatmap = fig.data[0]
+
+    written = []
+    for index, time_step in enumerate(tensor["steps"]):
+        if steps is not None and time_step not in steps:
+            continue
+        heatmap.z = masked[index]
+        heatmap.zmax = vmax[index].item()
+        fig.layout.title.text = heatmap_title(simulation, time_step)
+        output_file = os.path.join(plots_dir, f"plot2_{time_step}.html")
+        fig.write_html(output_file, include_plotlyjs=include_plotlyjs)
+        written.append(output_file)
+    return written
+
+
+def render_animation(tensor, simulation, output_file, include_plotlyjs='cdn'):
+    """
+    Writes all tensor steps into one HTML file: one heatmap with an animation frame
+    per step and a slider (plus play button) to move through the steps.
+    """
+    labels, masked, vmax = tensor_heatmaps(tensor)
+    if len(masked) == 0:
+        return None
+    steps = [int(t) for t in tensor["steps"]]
+    fig = heatmap_figure(masked[0], labels, vmax[0].item(), heatmap_title(simulation, steps[0]))
+    fig.frames = [
+        go.Frame(name=str(t), data=[go.Heatmap(z=masked[i], zmax=vmax[i].item())],
+                 layout=dict(title_text=heatmap_title(simulation, t)))
+        for i, t in enumerate(steps)
+    ]
+    frame_args = dict(mode='immediate', frame=dict(duration=0, redraw=True), transition=dict(duration=0))
+    fig.update_layout(
+        sliders=[dict(
+            active=0,
+            currentvalue=dict(prefix="Time Step: ", font=dict(color='white')),
+            pad=dict(t=50),
+            steps=[dict(label=str(t), method='animate', args=[[str(t)], frame_args]) for t in steps]
+        )],
+        updatemenus=[dict(
+            type='buttons',
+            showactive=False,
+            x=0, y=0, xanchor='right', yanchor='top', pad=dict(t=50, r=10),
+            buttons=[dict(label='Play', method='animate',
+                          args=[None, dict(frame_args, frame=dict(duration=200, redraw=True), fromcurrent=True)])]
+        )]
+    )
+    fig.write_html(output_file, include_plotlyjs=include_plotlyjs)
+    return output_file
 
 
+def main():
+    simType = 'no-network'  # Change to your simulation type
+    simulation_path = f'/Volumes/Extreme SSD/SciVis Project 2023/SciVisContest23/viz-{simType}'
 
 
-simType = 'no-network'  # Change to your simulation type
-positions_file = f'/Volumes/Extreme SSD/SciVis Project 2023/SciVisContest23/viz-{simType}/positions/rank_0_positions.txt'
-network_dir = f'/Volumes/Extreme SSD/SciVis Project 2023/SciVisContest23/viz-{simType}/network'
+    base_dir = f"/Users/sandor/dev/Computational Science/scientific-visualisation-and-virtual-reality/Plasticity-brain-SVVR/visualisation_app/backend/uploads/{simType}"
+    plots_dir = os.path.join(base_dir, "plots")
 
+    # Create the directories if they don't exist
+    os.makedirs(plots_dir, exist_ok=True)
 
-base_dir = f"/Users/sandor/dev/Computational Science/scientific-visualisation-and-virtual-reality/Plasticity-brain-SVVR/visualisation_app/backend/uploads/{simType}"
-plots_dir = os.path.join(base_dir, "plots")
+    # Load the area x area x time connectivity tensor (built from the network files on first use)
+    tensor = load_connectivity_tensor(simulation_path)
 
-# Create the directories if they don't exist
-os.makedirs(plots_dir, exist_ok=True)
+    # 'batch': plot2_<step>.html per snapshot sharing one plotly.min.js in the plots directory
+    # 'animation': a single plot2_animation.html with a time step slider
+    # 'single': a standalone HTML file per snapshot (plotly.js embedded in every file)
+    render_mode = 'batch'
 
-# Parse positions file
-neuron_area_map = parse_positions_file(positions_file)
+    # Generate plots for every network snapshot (0 to 1,000,000 in steps of 10,000)
+    if render_mode == 'batch':
+        written = render_batch(tensor, simType, plots_dir)
+        print(f"Plot 2 generated for {len(written)} steps in {plots_dir}")
+    elif render_mode == 'animation':
+        output_file = render_animation(tensor, simType, os.path.join(plots_dir, "plot2_animation.html"))
+        print(f"Plot 2 animation generated: {output_file}")
+    else:
+        for index, time_step in enumerate(tensor["steps"]):
+            connection_matrix = connection_matrix_at(tensor, index)
 
-# Generate plots from 0 to 1,000,000 in steps of 10,000
-for time_step in range(0, 1000001, 10000):
-    network_file = os.path.join(network_dir, f"rank_0_step_{time_step}_out_network.txt")
-    if not os.path.exists(network_file):
-        print(f"No network file for step {time_step}. Skipping.")
-        continue
+            # Output filename in the 'plots' directory
+            output_file = os.path.join(plots_dir, f"plot2_{time_step}.html")
 
-    connection_matrix = parse_network_file(network_file, neuron_area_map)
+            plot_correlation_matrix_ordered(connection_matrix, time_step, simType, output_file=output_file)
 
-    # Output filename in the 'plots' directory
-    output_file = os.path.join(plots_dir, f"plot2_{time_step}.html")
+            print(f"Plot 2 generated for step {time_step}: {output_file}")
 
-    plot_correlation_matrix_ordered(connection_matrix, time_step, simType, output_file=output_file)
 
-    print(f"Plot 2 generated for step {time_step}: {output_file}")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+
+from plotly.offline import get_plotlyjs
+
+from build_manifest import (code_version, input_fingerprints, is_stale, load_build_manifest, record_build,
+                            save_build_manifest)
+from export_area_data import DEFAULT_CONFIG, load_simulation_config
+from monitors import default_store_dir, monitors_dir_of
+from network import (NETWORK_STEPS, connectivity_tensor_path, degree_series_path, load_connectivity_tensor,
+                     load_degree_series)
+from plot1_script import extract_neuron_properties, plot_combined_parallel_and_box
+from plot2_script import render_batch
+from plot3_script import AREAS_OF_INTEREST, generate_connectivity_plot_per_timestep
+from registry import NeuronRegistry, registry_sources
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+PLOT_KINDS = ["plot1", "plot2", "plot3"]
+# Source files whose code shapes each plot type, part of its build version
+PLOT_SOURCES = {
+    "plot1": ["plot1_script.py", "monitors.py", "registry.py", "network.py"],
+    "plot2": ["plot2_script.py"],
+    "plot3": ["plot3_script.py", "network.py"],
+}
+
+
+def simulation_dir(sim_config):
+    """Simulation directory (viz-<name>) of a config entry: 'simulation', else the parent of 'monitors'."""
+    return sim_config.get("simulation") or os.path.dirname(os.path.normpath(sim_config["monitors"]))
+
+
+def plot_output_path(plots_dir, kind, step):
+    """The <kind>_<step>.html file the frontend loads for a timestep."""
+    return os.path.join(plots_dir, f"{kind}_{step}.html")
+
+
+def plot_inputs(kind, simulation_path):
+    """
+    Files and directories a plot of this kind is derived from. plot2 and plot3 read the
+    connectivity tensor and plot1 the degree series, which prepare_simulation rebuilds first
+    if the network snapshots changed; the network directory (snapshots and archives) is tracked as well.
+    """
+    if kind == "plot1":
+        monitors_dir = monitors_dir_of(simulation_path)
+        return registry_sources(simulation_path) + [
+            monitors_dir, os.path.join(default_store_dir(monitors_dir), "manifest.json"),
+            degree_series_path(simulation_path)
+        ]
+    return [connectivity_tensor_path(simulation_path), os.path.join(simulation_path, "network")]
+
+
+def plot_version(kind, name):
+    """Build version of a plot type: its source code and the simulation name shown in the titles."""
+    return code_version([os.path.join(SCRIPTS_DIR, source) for source in PLOT_SOURCES[kind]],
+                        {"kind": kind, "simulation": name})
+
+
+# Inputs shared by all jobs of a simulation, loaded once per worker process
+
+@lru_cache(maxsize=None)
+def shared_registry(simulation_path):
+    return NeuronRegistry.load(simulation_path)
+
+
+@lru_cache(maxsize=None)
+def shared_degrees(simulation_path):
+    return load_degree_series(simulation_path, build=False)
+
+
+@lru_cache(maxsize=None)
+def shared_tensor(simulation_path):
+    return load_connectivity_tensor(simulation_path, build=False)
+
+
+def render_plot1(name, simulation_path, plots_dir, steps):
+    registry = shared_registry(simulation_path)
+    if registry is None:
+        return []
+    written = []
+    for step in steps:
+        neuron_df = extract_neuron_properties(simulation_path, step, registry, shared_degrees(simulation_path))
+        if neuron_df is None or neuron_df.empty:
+            continue
+        output_file = plot_output_path(plots_dir, "plot1", step)
+        plot_combined_parallel_and_box(neuron_df, step, name, output_file=output_file, include_plotlyjs='directory')
+        written.append(output_file)
+    return written
+
+
+def render_plot2(name, simulation_path, plots_dir, steps):
+    tensor = shared_tensor(simulation_path)
+    if tensor is None:
+        return []
+    return render_batch(tensor, name, plots_dir, include_plotlyjs='directory', steps=set(steps))
+
+
+def render_plot3(name, simulation_path, plots_dir, steps):
+    tensor = shared_tensor(simulation_path)
+    if tensor is None:
+        return []
+    return generate_connectivity_plot_per_timestep(name, tensor, AREAS_OF_INTEREST, steps, plots_dir,
+                                                   include_plotlyjs='directory')
+
+
+RENDERERS = {"plot1": render_plot1, "plot2": render_plot2, "plot3": render_plot3}
+
+
+def run_job(kind, name, simulation_path, plots_dir, steps):
+    """Renders the plots of one job. Returns (kind, name, files written, seconds)."""
+    start = time.perf_counter()
+    written = RENDERERS[kind](name, simulation_path, plots_dir, steps)
+    return kind, name, written, time.perf_counter() - start
+
+
+def plan_jobs(simulations, names, manifests, kinds, steps, chunk_size, force=False, content_hash=False):
+    """
+    Splits the work into (kind, name, simulation_path, plots_dir, steps) jobs of up to
+    chunk_size timesteps, leaving out the steps whose plot the build manifest of its
+    plots directory (manifests[name]) records as built from the current inputs and
+    version (see build_manifest.py).
+    Returns (jobs, skipped plots per kind, {(kind, name): (fingerprints, version)}).
+    """
+    jobs, skipped, builds = [], {kind: 0 for kind in kinds}, {}
+    for name in names:
+        simulation_path = simulation_dir(simulations[name])
+        plots_dir = os.path.join(simulations[name]["output_dir"], "plots")
+        manifest = manifests[name]
+        for kind in kinds:
+            fingerprints = input_fingerprints(plot_inputs(kind, simulation_path), content_hash, manifest)
+            version = plot_version(kind, name)
+            builds[kind, name] = (fingerprints, version)
+            stale = [step for step in steps if force or
+                     is_stale(manifest, plots_dir, plot_output_path(plots_dir, kind, step), fingerprints, version)]
+            skipped[kind] += len(steps) - len(stale)
+            for i in range(0, len(stale), chunk_size):
+                jobs.append((kind, name, simulation_path, plots_dir, stale[i:i + chunk_size]))
+    return jobs, skipped, builds
+
+
+def prepare_simulation(sim_config, kinds):
+    """
+    Creates the plots directory with the plotly.min.js all plots load, and builds the
+    connectivity tensor (plot2, plot3) and the degree series (plot1) once here rather than
+    in every worker. False if the tensor is missing; plot1 is drawn without the degree
+    columns if the series is.
+    """
+    plots_dir = os.path.join(sim_config["output_dir"], "plots")
+    os.makedirs(plots_dir, exist_ok=True)
+    bundle = os.path.join(plots_dir, "plotly.min.js")
+    if not os.path.exists(bundle):
+        with open(bundle, 'w', encoding='utf-8') as f:
+            f.write(get_plotlyjs())
+    if "plot1" in kinds and load_degree_series(simulation_dir(sim_config)) is None:
+        print(f"No degree series for {simulation_dir(sim_config)}, plot1 omits the degree columns")
+    if {"plot2", "plot3"} & set(kinds):
+        return load_connectivity_tensor(simulation_dir(sim_config)) is not None
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate the plot1/plot2/plot3 HTML of all simulations and timesteps on a process pool."
+    )
+    parser.add_argument('--config', default=DEFAULT_CONFIG, help='Simulation config (default: simulations.json)')
+    parser.add_argument('--sim', nargs='+', help='Simulations to process (default: all in the config)')
+    parser.add_argument('--plots', nargs='+', choices=PLOT_KINDS, default=PLOT_KINDS,
+                        help='Plot kinds to generate (default: all)')
+    parser.add_argument('--steps', type=int, nargs=3, metavar=('FIRST', 'LAST', 'STEP'),
+                        help='Timestep range, inclusive (default: the network snapshots 0 to 1000000 by 10000)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Worker processes (default: all cores)')
+    parser.add_argument('--chunk-size', type=int, default=10, help='Timesteps per job (default: 10)')
+    parser.add_argument('--force', action='store_true', help='Regenerate plots that are up to date')
+    parser.add_argument('--hash', action='store_true',
+                        help='Compare input files by content digest instead of size and modification time')
+    args = parser.parse_args()
+
+    config = load_simulation_config(args.config)
+    if config is None:
+        return
+    simulations = config["simulations"]
+    names = args.sim or list(simulations)
+    unknown = [name for name in names if name not in simulations]
+    if unknown:
+        print(f"Unknown simulation(s): {unknown}. Available: {list(simulations)}")
+        return
+    steps = list(range(args.steps[0], args.steps[1] + 1, args.steps[2]) if args.steps else NETWORK_STEPS)
+
+    names = [name for name in names if prepare_simulation(simulations[name], args.plots)]
+    plots_dirs = {name: os.path.join(simulations[name]["output_dir"], "plots") for name in names}
+    manifests = {name: load_build_manifest(plots_dirs[name]) for name in names}
+    jobs, skipped, builds = plan_jobs(simulations, names, manifests, args.plots, steps, max(1, args.chunk_size),
+                                      args.force, args.hash)
+    print(f"{len(jobs)} jobs for {len(names)} simulations, {sum(skipped.values())} plots up to date")
+
+    start = time.perf_counter()
+    written = {kind: 0 for kind in args.plots}
+    seconds = {kind: 0.0 for kind in args.plots}
+    failed = {kind: 0 for kind in args.plots}
+    try:
+        with ProcessPoolExecutor(max_workers=max(1, args.workers)) as pool:
+            futures = {pool.submit(run_job, *job): job for job in jobs}
+            for future in as_completed(futures):
+                kind, name, _, plots_dir, job_steps = futures[future]
+                try:
+                    _, _, files, job_seconds = future.result()
+                except Exception as e:
+                    print(f"Error generating {kind} of {name} for steps {job_steps[0]}-{job_steps[-1]}: {e}")
+                    failed[kind] += len(job_steps)
+                    continue
+                fingerprints, version = builds[kind, name]
+                for output_file in files:
+                    record_build(manifests[name], plots_dir, output_file, fingerprints, version)
+                written[kind] += len(files)
+                seconds[kind] += job_seconds
+    finally:
+        # Keep the record of every finished job, even if the run is interrupted
+        for name, manifest in manifests.items():
+            save_build_manifest(plots_dirs[name], manifest)
+    wall = time.perf_counter() - start
+
+    print("\nPlot generation complete!")
+    for kind in args.plots:
+        rate = written[kind] / seconds[kind] if seconds[kind] else 0.0
+        print(f"{kind}: {written[kind]} written, {skipped[kind]} up to date, {failed[kind]} failed, "
+              f"{seconds[kind]:.1f}s in workers ({rate:.1f} plots/s per worker)")
+    total = sum(written.values())
+    print(f"Total: {total} plots in {wall:.1f}s with {args.workers} workers ({total / wall if wall else 0:.1f} plots/s)")
+
+
+if __name__ == "__main__":
+    main()
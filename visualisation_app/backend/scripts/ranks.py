@@ -0,0 +1,244 @@
+import glob
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# Every MPI rank of the simulator writes its own rank_<r>_* files with local neuron ids.
+# A neuron's global id is offsets[rank] + local id, where offsets[rank] is the sum of the
+# largest local ids of all lower ranks; for single-rank runs the global id is the local id.
+
+POSITIONS_COLUMNS = ["id", "x", "y", "z", "area", "type"]
+OVERVIEW_STATISTICS = ["average", "minimum", "maximum", "overall", "std"]
+# Properties of the neurons overview, in file order; further ones are named property_<k>
+OVERVIEW_PROPERTIES = ["calcium", "axons", "connected_axons", "excitatory_dendrites",
+                       "connected_excitatory_dendrites", "inhibitory_dendrites", "connected_inhibitory_dendrites"]
+OVERVIEW_CACHE_VERSION = 1
+
+
+def area_sort_key(area):
+    """Sort key ordering 'area_<n>' names by their numeric part."""
+    parts = area.split('_')
+    return (0, int(parts[1]), area) if len(parts) > 1 and parts[1].isdigit() else (1, 0, area)
+
+
+def positions_file_path(simulation_path, rank=0):
+    """Path of the rank_<r>_positions.txt file of a simulation."""
+    return os.path.join(simulation_path, "positions", f"rank_{rank}_positions.txt")
+
+
+def overview_file_path(simulation_path, rank=0):
+    """Path of the rank_<r>_neurons_overview.txt file of a simulation."""
+    return os.path.join(simulation_path, f"rank_{rank}_neurons_overview.txt")
+
+
+def discover_ranks(simulation_path):
+    """Sorted ranks that wrote a positions file; empty if the simulation has none."""
+    ranks = []
+    for positions_file in glob.glob(os.path.join(simulation_path, "positions", "rank_*_positions.txt")):
+        match = re.search(r"rank_(\d+)_positions\.txt$", positions_file)
+        if match:
+            ranks.append(int(match.group(1)))
+    return sorted(ranks)
+
+
+def map_ranks(func, ranks, workers=None):
+    """Runs func(rank) for every rank in a thread pool; results keep the order of ranks."""
+    if len(ranks) <= 1:
+        return [func(rank) for rank in ranks]
+    with ThreadPoolExecutor(max_workers=workers or min(len(ranks), os.cpu_count() or 1)) as pool:
+        return list(pool.map(func, ranks))
+
+
+def read_positions_table(positions_file, usecols=None):
+    """Parses one positions file into a DataFrame with the POSITIONS_COLUMNS (or the usecols subset)."""
+    usecols = usecols or POSITIONS_COLUMNS
+    df = pd.read_csv(positions_file, sep=r'\s+', comment='#', header=None, engine='c',
+                     usecols=[POSITIONS_COLUMNS.index(c) for c in usecols])
+    df.columns = [c for c in POSITIONS_COLUMNS if c in usecols]
+    return df
+
+
+def offsets_from_max_ids(ranks, max_ids):
+    """
+    Global id offset per rank number (array indexed by rank) from the largest local id of each rank.
+    A rank number missing from ranks holds no neurons: it gets the offset of the next rank found,
+    so the offsets never decrease and local_ids stays the inverse of global_ids.
+    """
+    offsets = np.zeros(max(ranks) + 1 if len(ranks) else 1, dtype=np.int64)
+    missing = sorted(set(range(len(offsets))) - set(ranks))
+    if missing:
+        print(f"Warning: no positions for rank(s) {missing}; their neurons get no global ids")
+    running, previous = 0, -1
+    for rank, max_id in sorted(zip(ranks, max_ids)):
+        offsets[previous + 1:rank + 1] = running
+        running += int(max_id)
+        previous = rank
+    return offsets
+
+
+def rank_offsets(simulation_path, ranks=None, workers=None):
+    """
+    Global id offsets of a simulation, indexed by rank number. Reads only the id
+    column of every rank's positions file, in parallel; single-rank runs read nothing.
+    """
+    ranks = discover_ranks(simulation_path) if ranks is None else ranks
+    if len(ranks) <= 1:
+        return np.zeros(max(ranks) + 1 if ranks else 1, dtype=np.int64)
+    max_ids = map_ranks(
+        lambda rank: read_positions_table(positions_file_path(simulation_path, rank), ["id"])["id"].max(),
+        ranks, workers
+    )
+    return offsets_from_max_ids(ranks, max_ids)
+
+
+def global_ids(offsets, ranks, local_ids):
+    """Vectorized (rank, local id) -> global id."""
+    return np.asarray(offsets)[np.asarray(ranks)] + np.asarray(local_ids)
+
+
+def local_ids(offsets, ids):
+    """
+    Vectorized global id -> (rank, local id), the inverse of global_ids for the non-decreasing
+    offsets of offsets_from_max_ids: the rank is the last one whose offset lies below the id.
+    """
+    offsets = np.asarray(offsets)
+    if np.any(np.diff(offsets) < 0):
+        raise ValueError("Rank offsets must be non-decreasing (see offsets_from_max_ids)")
+    ids = np.asarray(ids, dtype=np.int64)
+    ranks = np.maximum(np.searchsorted(offsets, ids, side='left') - 1, 0)
+    return ranks, ids - offsets[ranks]
+
+
+def read_global_positions(simulation_path, workers=None):
+    """
+    Reads the positions file of every rank in parallel and merges them into one table.
+    Returns (positions, offsets): a DataFrame with the global 'id' plus 'rank' and
+    'local_id' next to the other POSITIONS_COLUMNS, and the per-rank id offsets.
+    Returns (None, None) if the simulation has no positions file.
+    """
+    ranks = discover_ranks(simulation_path)
+    if not ranks:
+        print(f"No positions files found in {os.path.join(simulation_path, 'positions')}")
+        return None, None
+
+    tables = map_ranks(lambda rank: read_positions_table(positions_file_path(simulation_path, rank)),
+                       ranks, workers)
+    offsets = offsets_from_max_ids(ranks, [t["id"].max() if len(t) else 0 for t in tables])
+    for rank, table in zip(ranks, tables):
+        table.insert(0, "rank", rank)
+        table.insert(1, "local_id", table["id"])
+        table["id"] = table["local_id"] + offsets[rank]
+    return pd.concat(tables, ignore_index=True), offsets
+
+
+def read_overview_table(overview_file):
+    """Parses a neurons overview file: 'step' followed by five statistics (OVERVIEW_STATISTICS) per property."""
+    df = pd.read_csv(overview_file, sep=r'\s+', comment='#', header=None, engine='c')
+    df.columns = ["step"] + list(range(1, df.shape[1]))
+    return df
+
+
+def read_global_overview(simulation_path, workers=None):
+    """
+    Reads the neurons overview of every rank in parallel and merges them into the
+    overview of the whole network, in the same column layout. Averages are weighted
+    by the neurons per rank, overall values summed and standard deviations pooled.
+    Returns None if no overview file exists.
+    """
+    ranks = [r for r in (discover_ranks(simulation_path) or [0])
+             if os.path.exists(overview_file_path(simulation_path, r))]
+    if not ranks:
+        print(f"File {overview_file_path(simulation_path)} not found.")
+        return None
+
+    tables = map_ranks(lambda rank: read_overview_table(overview_file_path(simulation_path, rank)),
+                       ranks, workers)
+    if len(tables) == 1:
+        return tables[0]
+
+    counts = map_ranks(lambda rank: len(read_positions_table(positions_file_path(simulation_path, rank), ["id"])),
+                       ranks, workers)
+    steps = tables[0]["step"].to_numpy()
+    tables = [t.set_index("step").reindex(steps) for t in tables]
+    weights = np.asarray(counts, dtype=np.float64)[:, None] / sum(counts)
+
+    merged = pd.DataFrame({"step": steps})
+    num_stats = len(OVERVIEW_STATISTICS)
+    for first in range(1, tables[0].shape[1] - num_stats + 2, num_stats):
+        avg, low, high, total, std = (np.stack([t[first + k].to_numpy() for t in tables])
+                                      for k in range(num_stats))
+        mean = (weights * avg).sum(axis=0)
+        merged[first] = mean
+        merged[first + 1] = low.min(axis=0)
+        merged[first + 2] = high.max(axis=0)
+        merged[first + 3] = total.sum(axis=0)
+        merged[first + 4] = np.sqrt((weights * (std ** 2 + (avg - mean) ** 2)).sum(axis=0))
+    return merged
+
+
+def overview_column_names(num_columns):
+    """Named overview columns: 'step', then <property>_<statistic> for every property."""
+    names = ["step"]
+    for k in range((num_columns - 1) // len(OVERVIEW_STATISTICS)):
+        prop = OVERVIEW_PROPERTIES[k] if k < len(OVERVIEW_PROPERTIES) else f"property_{k}"
+        names += [f"{prop}_{stat}" for stat in OVERVIEW_STATISTICS]
+    return names + [f"column_{c}" for c in range(len(names), num_columns)]
+
+
+def overview_cache_path(simulation_path):
+    """Binary cache of the merged neurons overview: <sim>/.neurons_overview.npz."""
+    return os.path.join(simulation_path, ".neurons_overview.npz")
+
+
+def read_overview(simulation_path, step_range=None, workers=None, use_cache=True):
+    """
+    Typed neurons overview of a simulation (all ranks merged, see read_global_overview)
+    as a DataFrame with an int64 'step' and float64 <property>_<statistic> columns,
+    e.g. 'calcium_average' or 'axons_std'. step_range=(first, last) keeps only the
+    steps in that inclusive range. The parsed table is cached in binary form next to
+    the overview files and reused while they are unchanged. Returns None if missing.
+    """
+    ranks = [r for r in (discover_ranks(simulation_path) or [0])
+             if os.path.exists(overview_file_path(simulation_path, r))]
+    if not ranks:
+        print(f"File {overview_file_path(simulation_path)} not found.")
+        return None
+    key = [OVERVIEW_CACHE_VERSION]
+    for rank in ranks:
+        stat = os.stat(overview_file_path(simulation_path, rank))
+        key += [stat.st_size, stat.st_mtime_ns]
+    key = np.array(key, dtype=np.int64)
+    cache_file = overview_cache_path(simulation_path)
+
+    table = None
+    if use_cache and os.path.exists(cache_file):
+        try:
+            with np.load(cache_file) as cached:
+                if np.array_equal(cached["key"], key):
+                    table = pd.DataFrame(cached["values"], columns=cached["columns"].tolist())
+        except Exception as e:
+            print(f"Ignoring unreadable overview cache {cache_file}: {e}")
+
+    if table is None:
+        merged = read_global_overview(simulation_path, workers)
+        if merged is None:
+            return None
+        table = pd.DataFrame(merged.to_numpy(dtype=np.float64), columns=overview_column_names(merged.shape[1]))
+        if use_cache:
+            tmp_file = cache_file + ".tmp"
+            try:
+                with open(tmp_file, 'wb') as f:
+                    np.savez(f, key=key, values=table.to_numpy(), columns=np.array(list(table.columns), dtype=str))
+                os.replace(tmp_file, cache_file)
+            except OSError as e:
+                print(f"Could not write overview cache {cache_file}: {e}")
+
+    table["step"] = table["step"].astype(np.int64)
+    if step_range is not None:
+        steps = table["step"].to_numpy()
+        first, last = np.searchsorted(steps, step_range[0]), np.searchsorted(steps, step_range[1], side='right')
+        table = table.iloc[first:last].reset_index(drop=True)
+    return table
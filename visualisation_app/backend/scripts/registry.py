@@ -0,0 +1,167 @@
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+from ranks import area_sort_key, discover_ranks, positions_file_path, read_global_positions, read_positions_table
+
+REGISTRY_CACHE_VERSION = 1
+
+
+def registry_cache_path(source):
+    """
+    Binary sidecar of a registry: <simulation>/positions/.neuron_registry.npz for a
+    simulation directory, <dir>/.<name>.registry.npz for a single positions or area-info file.
+    """
+    if os.path.isdir(source):
+        return os.path.join(source, "positions", ".neuron_registry.npz")
+    directory, name = os.path.split(os.path.abspath(source))
+    return os.path.join(directory, f".{os.path.splitext(name)[0]}.registry.npz")
+
+
+def registry_sources(source):
+    """The text files a registry is parsed from: every rank's positions file, or the file itself."""
+    if os.path.isdir(source):
+        return [positions_file_path(source, rank) for rank in discover_ranks(source)]
+    return [source] if os.path.exists(source) else []
+
+
+def registry_cache_key(sources):
+    """Cache version followed by the size and mtime of every source file."""
+    key = [REGISTRY_CACHE_VERSION]
+    for source in sources:
+        stat = os.stat(source)
+        key += [stat.st_size, stat.st_mtime_ns]
+    return np.array(key, dtype=np.int64)
+
+
+class NeuronRegistry:
+    """
+    Compact table of the neurons of a simulation: global ids (int64), positions
+    (float32 N x 3), an area index (uint16) into the areas table and an excitatory
+    flag (bool), plus the per-rank id offsets. A dense id -> row array makes id to
+    area lookups vectorized.
+    """
+
+    def __init__(self, ids, positions, area_index, excitatory, areas, offsets=None):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.positions = np.ascontiguousarray(positions, dtype=np.float32)
+        self.area_index = np.asarray(area_index, dtype=np.uint16)
+        self.excitatory = np.asarray(excitatory, dtype=bool)
+        self.areas = [str(area) for area in areas]
+        self.offsets = np.zeros(1, dtype=np.int64) if offsets is None else np.asarray(offsets, dtype=np.int64)
+
+        self._rows = np.full(int(self.ids.max()) + 1 if len(self.ids) else 0, -1, dtype=np.int32)
+        self._rows[self.ids] = np.arange(len(self.ids), dtype=np.int32)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_table(cls, positions, offsets=None):
+        """Builds a registry from a DataFrame with the ranks.POSITIONS_COLUMNS (global 'id')."""
+        areas = sorted(positions["area"].astype(str).unique(), key=area_sort_key)
+        if len(areas) > np.iinfo(np.uint16).max:
+            raise ValueError(f"Too many areas for a uint16 area index: {len(areas)}")
+        area_index = pd.Categorical(positions["area"].astype(str), categories=areas).codes
+        return cls(positions["id"].to_numpy(), positions[["x", "y", "z"]].to_numpy(),
+                   area_index, positions["type"].astype(str).to_numpy() == "ex", areas, offsets)
+
+    @classmethod
+    def parse(cls, source, workers=None):
+        """
+        Parses a simulation directory (positions of all ranks, see ranks.py) or a single
+        positions / area-info file. Returns None if there is nothing to read.
+        """
+        if os.path.isdir(source):
+            positions, offsets = read_global_positions(source, workers)
+            return None if positions is None else cls.from_table(positions, offsets)
+        if not os.path.exists(source):
+            print(f"File {source} not found.")
+            return None
+        return cls.from_table(read_positions_table(source))
+
+    @classmethod
+    def load(cls, source, use_cache=True, workers=None):
+        """
+        Loads the registry of a simulation directory or positions / area-info file,
+        from its binary sidecar when that matches the source files. The first text
+        parse writes the sidecar. Returns None if the source cannot be read.
+        """
+        sources = registry_sources(source)
+        if not sources:
+            print(f"No positions found for {source}")
+            return None
+        key = registry_cache_key(sources)
+        cache_file = registry_cache_path(source)
+
+        if use_cache and os.path.exists(cache_file):
+            try:
+                with np.load(cache_file) as cached:
+                    if np.array_equal(cached["key"], key):
+                        return cls(cached["ids"], cached["positions"], cached["area_index"],
+                                   cached["excitatory"], cached["areas"].tolist(), cached["offsets"])
+            except Exception as e:
+                print(f"Ignoring unreadable registry cache {cache_file}: {e}")
+
+        registry = cls.parse(source, workers)
+        if registry is not None and use_cache:
+            registry.save(cache_file, key)
+        return registry
+
+    def save(self, cache_file, key):
+        """Writes the registry arrays to cache_file; failures only print a warning."""
+        tmp_file = cache_file + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            with open(tmp_file, 'wb') as f:
+                np.savez(f, key=key, ids=self.ids, positions=self.positions, area_index=self.area_index,
+                         excitatory=self.excitatory, areas=np.array(self.areas), offsets=self.offsets)
+            os.replace(tmp_file, cache_file)
+        except OSError as e:
+            print(f"Could not write registry cache {cache_file}: {e}")
+
+    def rows(self, ids):
+        """Row of every neuron id in the registry arrays; unknown ids give -1."""
+        ids = np.asarray(ids, dtype=np.int64)
+        in_range = (ids >= 0) & (ids < len(self._rows))
+        rows = np.full(ids.shape, -1, dtype=np.int32)
+        rows[in_range] = self._rows[ids[in_range]]
+        return rows
+
+    def area_of(self, ids):
+        """Area position (index into areas) of every neuron id; unknown ids give -1."""
+        rows = self.rows(ids)
+        area = np.full(rows.shape, -1, dtype=np.int32)
+        area[rows >= 0] = self.area_index[rows[rows >= 0]]
+        return area
+
+    def area_lookup(self):
+        """Dense int32 array with lookup[id] = area position (-1 for unknown ids), as network.build_area_lookup."""
+        return self.area_of(np.arange(len(self._rows)))
+
+    def area_names(self):
+        """Area name of every neuron, as a pandas Categorical over the areas table."""
+        return pd.Categorical.from_codes(self.area_index.astype(np.int32), categories=self.areas)
+
+    def select_areas(self, keep):
+        """New registry with only the neurons whose area name passes keep(name), areas renumbered."""
+        kept = [k for k, area in enumerate(self.areas) if keep(area)]
+        remap = np.full(len(self.areas), -1, dtype=np.int32)
+        remap[kept] = np.arange(len(kept), dtype=np.int32)
+        mask = remap[self.area_index] >= 0
+        return NeuronRegistry(self.ids[mask], self.positions[mask], remap[self.area_index[mask]],
+                              self.excitatory[mask], [self.areas[k] for k in kept], self.offsets)
+
+    def digest(self):
+        """Content digest of the ids, positions, areas and types, e.g. to version outputs built from them."""
+        digest = hashlib.blake2b(digest_size=16)
+        for array in (self.ids, self.positions, self.area_index, self.excitatory, self.offsets):
+            digest.update(np.ascontiguousarray(array).tobytes())
+        digest.update("\n".join(self.areas).encode())
+        return digest.hexdigest()
+
+    def nbytes(self):
+        """Memory held by the registry arrays."""
+        return sum(a.nbytes for a in (self.ids, self.positions, self.area_index, self.excitatory, self._rows))
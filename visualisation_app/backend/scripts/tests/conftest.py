@@ -0,0 +1,114 @@
+import csv
+import glob
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from monitors import MONITOR_COLUMNS, ROW_STEP  # noqa: E402
+
+# A small synthetic simulation in the layout the simulator writes: one rank, monitor
+# file 0_<i>.csv for neuron id i + 1, and network snapshots every 10000 steps
+NUM_NEURONS = 40
+NUM_AREAS = 12
+NUM_ROWS = 301
+NETWORK_STEPS = [0, 10000, 20000, 30000]
+COUNT_COLUMNS = {"step", "fired", "grown_axons", "connected_axons", "grown_dendrites", "connected_dendrites"}
+
+
+def write_positions(simulation_path, rng):
+    areas = rng.integers(0, NUM_AREAS, NUM_NEURONS)
+    os.makedirs(os.path.join(simulation_path, "positions"), exist_ok=True)
+    with open(os.path.join(simulation_path, "positions", "rank_0_positions.txt"), 'w') as f:
+        f.write("# <local id> <pos x> <pos y> <pos z> <area> <type>\n")
+        for i, area in enumerate(areas):
+            x, y, z = rng.uniform(0, 100, 3)
+            f.write(f"{i + 1} {x:.6f} {y:.6f} {z:.6f} area_{area} {'ex' if i % 5 else 'in'}\n")
+    return {i + 1: f"area_{area}" for i, area in enumerate(areas)}
+
+
+def write_monitors(simulation_path, rng):
+    monitors_dir = os.path.join(simulation_path, "monitors")
+    os.makedirs(monitors_dir, exist_ok=True)
+    for i in range(NUM_NEURONS):
+        with open(os.path.join(monitors_dir, f"0_{i}.csv"), 'w') as f:
+            for r in range(NUM_ROWS):
+                cells = []
+                for name in MONITOR_COLUMNS:
+                    if name == "step":
+                        cells.append(str(r * ROW_STEP))
+                    elif name in COUNT_COLUMNS:
+                        cells.append(str(int(rng.integers(0, 12))))
+                    else:
+                        cells.append(f"{rng.uniform(0, 1):.6f}")
+                f.write(";".join(cells) + "\n")
+    return monitors_dir
+
+
+def write_network(simulation_path, rng):
+    network_dir = os.path.join(simulation_path, "network")
+    os.makedirs(network_dir, exist_ok=True)
+    edges = set()
+    snapshots = {}
+    for step in NETWORK_STEPS:
+        # Prune some synapses, form new ones
+        edges = {e for e in edges if rng.uniform() > 0.3}
+        while len(edges) < 3 * NUM_NEURONS:
+            source, target = (int(v) for v in rng.integers(1, NUM_NEURONS + 1, 2))
+            if source != target:
+                edges.add((source, target))
+        weighted = sorted((s, t, int(rng.choice([-1, 1, 2]))) for s, t in edges)
+        snapshots[step] = weighted
+        with open(os.path.join(network_dir, f"rank_0_step_{step}_out_network.txt"), 'w') as f:
+            f.write("# <source rank> <source id> <target rank> <target id> <weight>\n")
+            for s, t, w in weighted:
+                f.write(f"0 {s} 0 {t} {w}\n")
+        with open(os.path.join(network_dir, f"rank_0_step_{step}_in_network.txt"), 'w') as f:
+            f.write("# <target rank> <target id> <source rank> <source id> <weight>\n")
+            for s, t, w in sorted(weighted, key=lambda e: (e[1], e[0])):
+                f.write(f"0 {t} 0 {s} {w}\n")
+    return snapshots
+
+
+def write_simulation(simulation_path, seed=0):
+    """Writes the synthetic simulation; returns {'path', 'areas' (id -> area), 'snapshots' (step -> edges)}."""
+    rng = np.random.default_rng(seed)
+    areas = write_positions(simulation_path, rng)
+    write_monitors(simulation_path, rng)
+    snapshots = write_network(simulation_path, rng)
+    return {"path": str(simulation_path), "areas": areas, "snapshots": snapshots}
+
+
+@pytest.fixture
+def simulation(tmp_path):
+    return write_simulation(tmp_path / "viz-test")
+
+
+# Reference implementations in the style of the original per-line scripts
+
+def reference_area_means(monitors_dir, area_of_id, column, step_size=10000):
+    """Per-area means of a column every step_size steps, as calcium_levels.py computed them."""
+    sums, counts = {}, {}
+    for csv_file in sorted(glob.glob(os.path.join(monitors_dir, "*.csv"))):
+        neuron_id = int(os.path.basename(csv_file)[:-4].split('_')[1]) + 1
+        area = area_of_id.get(neuron_id)
+        if area is None:
+            continue
+        with open(csv_file) as f:
+            rows = list(csv.reader(f, delimiter=';'))
+        values = [float(rows[r][MONITOR_COLUMNS.index(column)]) for r in range(0, len(rows), step_size // ROW_STEP)]
+        if area not in sums:
+            sums[area], counts[area] = [0.0] * len(values), 0
+        sums[area] = [a + b for a, b in zip(sums[area], values)]
+        counts[area] += 1
+    return {area: [round(v / counts[area], 4) for v in sums[area]] for area in sums}
+
+
+def reference_network_lines(network_file):
+    """(first id, second id, weight) of every data line of a network file."""
+    with open(network_file) as f:
+        return [(int(p[1]), int(p[3]), float(p[4])) for p in (line.split() for line in f)
+                if p and not p[0].startswith('#')]
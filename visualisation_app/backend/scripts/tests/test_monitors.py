@@ -0,0 +1,79 @@
+import numpy as np
+
+from export_area_data import build_area_data, scan_simulation
+from monitors import (MONITOR_COLUMNS, ROW_STEP, build_monitor_store, default_store_dir, load_monitor_block,
+                      open_monitor_store, open_store_for, read_monitor_file, stream_area_stats)
+from registry import NeuronRegistry
+
+from conftest import NUM_ROWS, reference_area_means
+
+SERIES = {"calcium_levels": "current_calcium", "activity_levels": "activity"}
+
+
+def area_data(simulation, streaming, workers=1):
+    registry = NeuronRegistry.load(simulation["path"])
+    scan = scan_simulation(simulation["path"] + "/monitors", registry, 10000, streaming, workers)
+    return build_area_data(*scan, {"series": SERIES})
+
+
+def test_read_monitor_file_matches_csv_module(simulation):
+    monitors_dir = simulation["path"] + "/monitors"
+    values = read_monitor_file(monitors_dir + "/0_3.csv", dtype=np.float64)
+    with open(monitors_dir + "/0_3.csv") as f:
+        expected = np.array([[float(v) for v in line.split(';')] for line in f])
+    assert np.array_equal(values, expected)
+    assert np.array_equal(read_monitor_file(monitors_dir + "/0_3.csv", ["activity"], row_stride=7,
+                                            dtype=np.float64)[:, 0],
+                          expected[::7, MONITOR_COLUMNS.index("activity")])
+
+
+def test_block_and_streaming_exports_match_the_per_line_parser(simulation):
+    block = area_data(simulation, streaming=False)
+    for data in (block, area_data(simulation, streaming=True), area_data(simulation, streaming=True, workers=3)):
+        assert list(data["areas"]) == list(block["areas"])
+        for key, column in SERIES.items():
+            expected = reference_area_means(simulation["path"] + "/monitors", simulation["areas"], column)
+            assert list(expected) == list(data["areas"])
+            for area, series in expected.items():
+                assert data["areas"][area][key] == series
+
+
+def test_streaming_statistics_match_the_block(simulation):
+    monitors_dir = simulation["path"] + "/monitors"
+    registry = NeuronRegistry.load(simulation["path"])
+    neuron_indices, block, _ = load_monitor_block(monitors_dir, ["activity", "connected_axons"], row_stride=3,
+                                                  dtype=np.float64)
+    areas, stats = stream_area_stats(monitors_dir, registry, ["activity", "connected_axons"], row_stride=3,
+                                     workers=2, dtype=np.float64)
+    area_of = registry.area_of(neuron_indices + 1)
+    for k, area in enumerate(areas):
+        members = block[area_of == registry.areas.index(area)]
+        assert stats["count"][k] == len(members)
+        assert np.allclose(stats["mean"][k], members.mean(axis=0))
+        assert np.allclose(stats["std"][k], members.std(axis=0))
+        assert np.array_equal(stats["min"][k], members.min(axis=0))
+        assert np.array_equal(stats["max"][k], members.max(axis=0))
+
+
+def test_monitor_store_round_trip(simulation):
+    monitors_dir = simulation["path"] + "/monitors"
+    csv_block = load_monitor_block(monitors_dir, dtype=np.float64)
+
+    assert build_monitor_store(monitors_dir)["dtype"] == "float32"
+    indices, block, num_rows = load_monitor_block(monitors_dir, ["activity"], row_stride=2)
+    assert np.array_equal(indices, csv_block[0])
+    assert np.array_equal(block, csv_block[1][:, ::2, [MONITOR_COLUMNS.index("activity")]].astype(np.float32))
+    # A float32 store cannot serve the float64 exporters
+    assert open_store_for(monitors_dir, np.float64) is None
+
+    manifest = build_monitor_store(monitors_dir, dtype=np.float64)
+    assert open_store_for(monitors_dir, np.float64)["store_dir"] == default_store_dir(monitors_dir)
+    indices, block, num_rows = load_monitor_block(monitors_dir, dtype=np.float64)
+    assert np.array_equal(indices, csv_block[0]) and num_rows == csv_block[2]
+    assert np.array_equal(block, csv_block[1])
+    assert area_data(simulation, streaming=True) == area_data(simulation, streaming=False)
+
+    # Changed CSVs make the readers fall back to them
+    with open(monitors_dir + "/0_0.csv", 'a') as f:
+        f.write(f"{NUM_ROWS * ROW_STEP};0" + ";0.5" * (len(MONITOR_COLUMNS) - 2) + "\n")
+    assert open_monitor_store(manifest["store_dir"], monitors_dir) is None
@@ -0,0 +1,127 @@
+import os
+
+import numpy as np
+
+from monitors import MONITOR_COLUMNS, ROW_STEP, snapshot_frame
+from network import (archive_is_current, build_connectivity_tensor, build_degree_series, build_edge_churn,
+                     build_snapshot_archive, degree_snapshot, extract_snapshot_archive, iter_global_edges,
+                     load_connectivity_tensor, load_degree_series, load_edge_churn, read_archived_edges,
+                     snapshot_archive_path)
+from registry import NeuronRegistry
+
+from conftest import NETWORK_STEPS, NUM_NEURONS, reference_network_lines
+
+
+def append_edge(simulation, step, source, target, weight=1):
+    with open(os.path.join(simulation["path"], "network", f"rank_0_step_{step}_out_network.txt"), 'a') as f:
+        f.write(f"0 {source} 0 {target} {weight}\n")
+    simulation["snapshots"][step].append((source, target, weight))
+
+
+def test_snapshot_frame_reads_neuron_id_from_the_previous_monitor_index(simulation):
+    registry = NeuronRegistry.load(simulation["path"])
+    frame = snapshot_frame(simulation["path"], 20000, registry, ["current_calcium"])
+    assert list(frame["Neuron_ID"]) == list(range(1, NUM_NEURONS + 1))
+    for neuron_id, value in zip(frame["Neuron_ID"], frame["current_calcium"]):
+        with open(os.path.join(simulation["path"], "monitors", f"0_{neuron_id - 1}.csv")) as f:
+            row = f.readlines()[20000 // ROW_STEP].split(';')
+        assert value == np.float32(row[MONITOR_COLUMNS.index("current_calcium")])
+        assert frame["Area"][neuron_id - 1] == simulation["areas"][neuron_id]
+
+
+def test_degree_series_counts_every_snapshot(simulation):
+    degrees = build_degree_series(simulation["path"], NETWORK_STEPS)
+    assert list(degrees["steps"]) == NETWORK_STEPS
+    for step, edges in simulation["snapshots"].items():
+        ids = np.arange(1, NUM_NEURONS + 1)
+        for name, side in (("out", 0), ("in", 1)):
+            expected_degree = [sum(1 for e in edges if e[side] == i) for i in ids]
+            expected_synapses = [sum(abs(e[2]) for e in edges if e[side] == i) for i in ids]
+            assert list(degree_snapshot(degrees, step, ids, f"{name}_degree")) == expected_degree
+            assert list(degree_snapshot(degrees, step, ids, f"{name}_synapses")) == expected_synapses
+
+
+def test_degree_series_is_rebuilt_when_the_network_changes(simulation):
+    build_degree_series(simulation["path"])
+    assert load_degree_series(simulation["path"], build=False) is not None
+
+    append_edge(simulation, 10000, 1, 2, 2)
+    assert load_degree_series(simulation["path"], build=False) is None
+    degrees = load_degree_series(simulation["path"])
+    assert degree_snapshot(degrees, 10000, [1])[0] == sum(1 for e in simulation["snapshots"][10000] if e[0] == 1)
+    assert load_degree_series(simulation["path"], build=False) is not None
+
+
+def area_pairs(edges, areas, area_names):
+    counts = np.zeros((len(area_names), len(area_names)), dtype=np.int64)
+    for source, target in edges:
+        counts[area_names.index(areas[source]), area_names.index(areas[target])] += 1
+    return counts
+
+
+def test_edge_churn_matches_set_differences(simulation):
+    churn = build_edge_churn(simulation["path"], NETWORK_STEPS)
+    area_names = list(churn["areas"])
+    assert list(churn["steps"]) == NETWORK_STEPS
+    for i, (previous, current) in enumerate(zip(NETWORK_STEPS, NETWORK_STEPS[1:])):
+        before = {e[:2] for e in simulation["snapshots"][previous]}
+        after = {e[:2] for e in simulation["snapshots"][current]}
+        formed, pruned = after - before, before - after
+        assert np.array_equal(churn["formed"][i], area_pairs(formed, simulation["areas"], area_names))
+        assert np.array_equal(churn["pruned"][i], area_pairs(pruned, simulation["areas"], area_names))
+        assert np.array_equal(churn["edges"][i], area_pairs(before, simulation["areas"], area_names))
+        for k, neuron_id in enumerate(churn["neuron_ids"]):
+            assert churn["formed_out"][i, k] == sum(1 for e in formed if e[0] == neuron_id)
+            assert churn["pruned_in"][i, k] == sum(1 for e in pruned if e[1] == neuron_id)
+
+
+def test_edge_churn_is_rebuilt_when_the_network_changes(simulation):
+    build_edge_churn(simulation["path"])
+    assert load_edge_churn(simulation["path"], build=False) is not None
+
+    os.remove(os.path.join(simulation["path"], "network", "rank_0_step_30000_out_network.txt"))
+    assert load_edge_churn(simulation["path"], build=False) is None
+    assert list(load_edge_churn(simulation["path"])["steps"]) == NETWORK_STEPS[:-1]
+
+
+def test_connectivity_tensor_matches_the_per_line_counts(simulation):
+    tensor = build_connectivity_tensor(simulation["path"], NETWORK_STEPS)
+    area_names = list(tensor["areas"])
+    for t, step in enumerate(NETWORK_STEPS):
+        lines = reference_network_lines(os.path.join(simulation["path"], "network",
+                                                     f"rank_0_step_{step}_out_network.txt"))
+        expected = area_pairs([line[:2] for line in lines], simulation["areas"], area_names)
+        assert np.array_equal(tensor["directed"][t], expected)
+        assert np.array_equal(tensor["undirected"][t], expected + expected.T - np.diag(np.diag(expected)))
+
+    # Archived snapshots give the same tensor; a changed snapshot makes the stored one outdated
+    build_snapshot_archive(simulation["path"], 'out', NETWORK_STEPS, keyframe_interval=2)
+    assert np.array_equal(build_connectivity_tensor(simulation["path"], NETWORK_STEPS)["directed"],
+                          tensor["directed"])
+    append_edge(simulation, 0, 3, 4)
+    assert load_connectivity_tensor(simulation["path"], build=False) is None
+    assert load_connectivity_tensor(simulation["path"])["directed"][0].sum() == tensor["directed"][0].sum() + 1
+
+
+def test_snapshot_archive_replays_the_text_snapshots(simulation, tmp_path):
+    for direction in ('out', 'in'):
+        summary = build_snapshot_archive(simulation["path"], direction, NETWORK_STEPS, keyframe_interval=3)
+        assert summary["snapshots"] == len(NETWORK_STEPS)
+        for step in NETWORK_STEPS:
+            text_file = os.path.join(simulation["path"], "network", f"rank_0_step_{step}_{direction}_network.txt")
+            expected = sorted(reference_network_lines(text_file))
+            first, second, weights = read_archived_edges(summary["file"], step)
+            assert list(zip(first.tolist(), second.tolist(), weights.tolist())) == expected
+
+        written = extract_snapshot_archive(summary["file"], str(tmp_path / direction))
+        assert len(written) == len(NETWORK_STEPS)
+        for output_file in written:
+            text_file = os.path.join(simulation["path"], "network", os.path.basename(output_file))
+            assert reference_network_lines(output_file) == sorted(reference_network_lines(text_file))
+
+    # A changed text snapshot is read from the text files instead of the archive
+    append_edge(simulation, 20000, 5, 6)
+    assert not archive_is_current(snapshot_archive_path(simulation["path"], 'out'), simulation["path"],
+                                  NETWORK_STEPS)
+    edges = dict(iter_global_edges(simulation["path"], NETWORK_STEPS))
+    assert len(edges[20000][0]) == len(simulation["snapshots"][20000])
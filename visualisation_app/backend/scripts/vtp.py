@@ -0,0 +1,114 @@
+import os
+import time
+
+import numpy as np
+import vtk
+from vtk.util.numpy_support import numpy_to_vtk, numpy_to_vtkIdTypeArray
+
+
+VTP_DATA_MODES = ('ascii', 'binary', 'appended')
+VTP_COMPRESSORS = ('none', 'zlib', 'lz4', 'lzma')
+
+
+def export_to_vtp(polydata, filename, data_mode='binary', compressor='zlib', compression_level=5):
+    """
+    Export polydata to a VTP file and return {'file', 'bytes', 'seconds'}.
+
+    data_mode is 'ascii' (human-readable, uncompressed), 'binary' (base64 arrays
+    inline) or 'appended' (raw bytes at the end of the file). The binary modes are
+    compressed with compressor at compression_level (1-9). The viewer reads zlib.
+    """
+    writer = vtk.vtkXMLPolyDataWriter()
+    writer.SetFileName(filename)
+    writer.SetInputData(polydata)
+
+    if data_mode == 'ascii':
+        writer.SetDataModeToAscii()
+    elif data_mode == 'binary':
+        writer.SetDataModeToBinary()
+    elif data_mode == 'appended':
+        writer.SetDataModeToAppended()
+        writer.SetEncodeAppendedData(0)
+    else:
+        raise ValueError(f"Unknown VTP data mode '{data_mode}', expected one of {VTP_DATA_MODES}")
+
+    if compressor == 'none' or data_mode == 'ascii':
+        writer.SetCompressorTypeToNone()
+    elif compressor == 'zlib':
+        writer.SetCompressorTypeToZLib()
+    elif compressor == 'lz4':
+        writer.SetCompressorTypeToLZ4()
+    elif compressor == 'lzma':
+        writer.SetCompressorTypeToLZMA()
+    else:
+        raise ValueError(f"Unknown VTP compressor '{compressor}', expected one of {VTP_COMPRESSORS}")
+    if compressor != 'none':
+        writer.SetCompressionLevel(compression_level)
+
+    start = time.perf_counter()
+    if not writer.Write():
+        print(f"Failed to write {filename}")
+    seconds = time.perf_counter() - start
+
+    size = os.path.getsize(filename) if os.path.exists(filename) else 0
+    return {'file': filename, 'bytes': size, 'seconds': seconds}
+
+
+def points_from_array(coordinates):
+    """vtkPoints wrapping a float32 (N, 3) coordinate array without per-point inserts."""
+    points = vtk.vtkPoints()
+    points.SetData(numpy_to_vtk(np.ascontiguousarray(coordinates, dtype=np.float32)))
+    return points
+
+
+def cells_from_array(point_ids, points_per_cell):
+    """
+    vtkCellArray of equally sized cells (1 for vertices, 2 for lines) built in one
+    call from offset and connectivity buffers. point_ids lists the points of all
+    cells back to back.
+    """
+    connectivity = np.ascontiguousarray(point_ids, dtype=np.int64).ravel()
+    offsets = np.arange(0, len(connectivity) + 1, points_per_cell, dtype=np.int64)
+    cells = vtk.vtkCellArray()
+    cells.SetData(numpy_to_vtkIdTypeArray(offsets), numpy_to_vtkIdTypeArray(connectivity))
+    return cells
+
+
+def data_array(values, name):
+    """Named VTK data array sharing the memory of a NumPy array; the dtype picks the VTK type."""
+    array = numpy_to_vtk(np.ascontiguousarray(values))
+    array.SetName(name)
+    return array
+
+
+def add_area_table(polydata, areas, colors):
+    """
+    Stores the area lookup table in the field data: 'AreaNames' (string per area) and
+    'AreaColors' (uint8 RGB per area), indexed by the integer 'AreaId' point array.
+    """
+    names = vtk.vtkStringArray()
+    names.SetName("AreaNames")
+    names.SetNumberOfValues(len(areas))
+    for i, area in enumerate(areas):
+        names.SetValue(i, area)
+    polydata.GetFieldData().AddArray(names)
+    polydata.GetFieldData().AddArray(data_array(np.asarray(colors, dtype=np.uint8), "AreaColors"))
+
+
+def add_vtp_arguments(parser):
+    """Adds the --encoding, --compressor and --compression-level options to an argparse parser."""
+    parser.add_argument('--encoding', choices=VTP_DATA_MODES, default='binary',
+                        help='VTP data mode (default: binary)')
+    parser.add_argument('--compressor', choices=VTP_COMPRESSORS, default='zlib',
+                        help='Compression of the binary data modes (default: zlib)')
+    parser.add_argument('--compression-level', type=int, default=5, choices=range(1, 10),
+                        metavar='1-9', help='Compression level (default: 5)')
+
+
+def vtp_options(args):
+    """The export_to_vtp keyword arguments selected on the command line."""
+    return {
+        'data_mode': args.encoding,
+        'compressor': args.compressor,
+        'compression_level': args.compression_level,
+    }